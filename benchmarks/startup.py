@@ -0,0 +1,51 @@
+"""CLI startup benchmark.
+
+Imports `netlas.__main__` in fresh interpreters with `python -X importtime` and
+reports the median import time and the slowest modules.
+
+Usage: python benchmarks/startup.py [--runs 20] [--top 15] [--module netlas.__main__]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+def import_times(module: str) -> dict:
+    """Self and cumulative import time in microseconds of every module loaded by `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="Number of interpreter runs")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list")
+    parser.add_argument("--module", default="netlas.__main__", help="Module to import")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    totals = [times[args.module][1] for times in runs]
+    print(f"{args.module}: median {statistics.median(totals) / 1000:.1f} ms, "
+          f"min {min(totals) / 1000:.1f} ms, max {max(totals) / 1000:.1f} ms ({args.runs} runs)")
+
+    modules = set().union(*runs)
+    self_times = {name: statistics.median(times.get(name, (0, 0))[0] for times in runs) for name in modules}
+    print("\nslowest modules by median self time:")
+    for name, self_us in sorted(self_times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{self_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,98 @@
+import subprocess
+import sys
+
 import pytest
 from click.testing import CliRunner
-from netlas.__main__ import host, query
+from netlas.__main__ import host, search
+
+# Import time `netlas` adds on top of requests and click, as a share of their own import time,
+# in a fresh interpreter, see benchmarks/startup.py
+STARTUP_BUDGET_RATIO = 0.25
+LAZY_MODULES = ["rich", "yaml", "pygments", "asyncio", "aiohttp", "pyarrow", "appdirs",
+                "netlas.async_client", "netlas.datastore", "netlas.discovery", "netlas.download",
+                "netlas.export", "netlas.index"]
 
 @pytest.fixture(scope="module")
 def runner():
     return CliRunner()
 
+def test_startup_budget():
+    code = ("import sys, requests, click, netlas.__main__; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            _, total, name = line.split("|")
+            cumulative[name.strip()] = int(total)
+    baseline = cumulative["requests"] + cumulative["click"]
+    assert cumulative["netlas.__main__"] < baseline * STARTUP_BUDGET_RATIO
+
 def test_host(runner):
     result = runner.invoke(host, ['-f', 'json'])
     assert result.exit_code == 0
     assert '"type": "ip"' in result.output
 
+def test_host_stdin(runner):
+    result = runner.invoke(host, ['-f', 'json', '-'], input='1.1.1.1\n8.8.8.8\n')
+    assert result.exit_code == 0
+    assert '"ip": "1.1.1.1"' in result.output
+    assert '"ip": "8.8.8.8"' in result.output
+
 def test_query_response(runner):
-    result = runner.invoke(query, ['-f', 'json', 'port:222'])
+    result = runner.invoke(search, ['-f', 'json', 'port:222'])
     assert result.exit_code == 0
     assert '"port": 222' in result.output
 
 def test_query_response_field_exclude(runner):
-    result = runner.invoke(query, ['-f', 'json', '-e', 'port', 'port:222'])
+    result = runner.invoke(search, ['-f', 'json', '-e', 'port', 'port:222'])
     assert result.exit_code == 0
     assert '"ip": ' in result.output
     assert '"port": 222' not in result.output
 
 def test_query_response_field_include(runner):
-    result = runner.invoke(query, ['-f', 'json', '-i', 'port', 'port:222'])
+    result = runner.invoke(search, ['-f', 'json', '-i', 'port', 'port:222'])
     assert result.exit_code == 0
     assert '"ip": ' not in result.output
     assert '"port": 222' in result.output
 
+def test_query_response_unknown_field(runner):
+    result = runner.invoke(search, ['-f', 'json', '-i', 'port,no_such_field', 'port:222'])
+    assert result.exit_code == 0
+    assert 'Warning: unknown response fields: no_such_field' in result.output
+
 def test_query_domain(runner):
-    result = runner.invoke(query, ['-f', 'json', '-d', 'domain', 'domain:netlas.io'])
+    result = runner.invoke(search, ['-f', 'json', '-d', 'domain', 'domain:netlas.io'])
     assert result.exit_code == 0
     assert '"domain": "netlas.io"' in result.output
 
 def test_query_domain_field_exclude(runner):
-    result = runner.invoke(query, ['-f', 'json', '-d', 'domain', '-e', 'domain', 'domain:netlas.io'])
+    result = runner.invoke(search, ['-f', 'json', '-d', 'domain', '-e', 'domain', 'domain:netlas.io'])
     assert result.exit_code == 0
     assert '"zone": "io"' in result.output
     assert '"domain": "netlas.io"' not in result.output
 
 def test_query_domain_field_include(runner):
-    result = runner.invoke(query, ['-f', 'json', '-d', 'domain', '-i', 'domain', 'domain:netlas.io'])
+    result = runner.invoke(search, ['-f', 'json', '-d', 'domain', '-i', 'domain', 'domain:netlas.io'])
     assert result.exit_code == 0
     assert '"zone": "io"' not in result.output
     assert '"domain": "netlas.io"' in result.output
 
 def test_query_whoisip(runner):
-    result = runner.invoke(query, ['-f', 'json', '-d', 'whois-ip', 'ip:8.8.8.8'])
+    result = runner.invoke(search, ['-f', 'json', '-d', 'whois-ip', 'ip:8.8.8.8'])
     assert result.exit_code == 0
     assert '"net": ' in result.output
 
 def test_query_whoisip_field_exclude(runner):
-    result = runner.invoke(query, ['-f', 'json', '-d', 'whois-ip', '-e', 'net', 'ip:8.8.8.8'])
+    result = runner.invoke(search, ['-f', 'json', '-d', 'whois-ip', '-e', 'net', 'ip:8.8.8.8'])
     assert result.exit_code == 0
     assert '"ip": ' in result.output
     assert '"net": {' not in result.output
 
 def test_query_whoisip_field_include(runner):
-    result = runner.invoke(query, ['-f', 'json', '-d', 'whois-ip', '-i', 'net', 'ip:8.8.8.8'])
+    result = runner.invoke(search, ['-f', 'json', '-d', 'whois-ip', '-i', 'net', 'ip:8.8.8.8'])
     assert result.exit_code == 0
     assert '"ip": ' not in result.output
     assert '"net": {' in result.output
@@ -1,3 +1,17 @@
 from netlas.client import Netlas
 from netlas.exception import APIError
 from netlas.exception import ThrottlingError
+from netlas.ratelimit import RateLimiter
+from netlas.retry import RetryPolicy
+from netlas.cache import ResponseCache, MemoryCache, SQLiteCache, MetadataCache
+
+
+def __getattr__(name):
+    # asyncio is slow to import, the async client and the index are loaded on first use
+    if name == "AsyncNetlas":
+        from netlas.async_client import AsyncNetlas
+        return AsyncNetlas
+    if name == "NDJSONIndex":
+        from netlas.index import NDJSONIndex
+        return NDJSONIndex
+    raise AttributeError(f"module 'netlas' has no attribute '{name}'")
@@ -1,13 +1,11 @@
 import netlas
 import click
-import appdirs
 import os
-from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn, MofNCompleteColumn, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn
-from rich.style import Style
-from rich.console import Console
-from netlas.helpers import ClickAliasedGroup, MutuallyExclusiveOption, dump_object, get_api_key
+import sys
+from netlas.cache import MetadataCache
+from netlas.helpers import ClickAliasedGroup, MutuallyExclusiveOption, complete_fields, dump_object, dump_records, get_api_key
 from netlas.exception import APIError, ThrottlingError
-from time import sleep
+from threading import Event, Lock, Thread
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
@@ -30,6 +28,7 @@ def main():
 )
 def savekey(api_key, server):
     """Save API key to the local system."""
+    import appdirs
     config_path = appdirs.user_config_dir(appname="netlas")
     key_file = "netlas.key"
     if not os.path.isdir(config_path):
@@ -97,12 +96,14 @@ def savekey(api_key, server):
               required=False,
               cls=MutuallyExclusiveOption,
               mutually_exclusive=["exclude", "-e"],
+              shell_complete=complete_fields,
               help="Specify comma-separated fields that will be in the output")
 @click.option("-e",
               "--exclude",
               required=False,
               cls=MutuallyExclusiveOption,
               mutually_exclusive=["include", "-i"],
+              shell_complete=complete_fields,
               help="Specify comma-separated fields that will be excluded from the output")
 @click.option("-p",
               "--page",
@@ -110,15 +111,31 @@ def savekey(api_key, server):
               default=0,
               show_default=True,
               help="Specify data page")
+@click.option("--pages",
+              type=int,
+              default=1,
+              show_default=True,
+              help="Number of pages to fetch starting from `--page`")
 @click.option("--no-color",
               "disable_colors",
               is_flag=True,
               default=False,
               help="Disable output colors")
-def search(datatype, apikey, format, querystring, server, indices, include, exclude, page, disable_colors):
+def search(datatype, apikey, format, querystring, server, indices, include, exclude, page, pages, disable_colors):
     """Search query."""
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, metadata_cache=MetadataCache())
+        warn_unknown_fields(ns_con, include or exclude, datatype)
+        if pages > 1:
+            items = list(ns_con.search_iter(query=querystring,
+                                            datatype=datatype,
+                                            page=page,
+                                            indices=indices,
+                                            fields=include if include else exclude,
+                                            exclude_fields=True if exclude else False,
+                                            max_results=pages * 20))
+            print(dump_object(data={"items": items}, format=format, disable_colors=disable_colors))
+            return
         query_res = ns_con.search(query=querystring,
                                   datatype=datatype,
                                   page=page,
@@ -423,17 +440,42 @@ def counters_profile(apikey, server, format, disable_colors):
               required=False,
               cls=MutuallyExclusiveOption,
               mutually_exclusive=["exclude", "-e"],
+              shell_complete=complete_fields,
               help="Specify comma-separated fields that will be in the output")
 @click.option("-e",
               "--exclude",
               required=False,
               cls=MutuallyExclusiveOption,
               mutually_exclusive=["include", "-i"],
+              shell_complete=complete_fields,
               help="Specify comma-separated fields that will be excluded from the output")
-def host(apikey, format, host, server, include, exclude, disable_colors):
+@click.option("--from-file",
+              "from_file",
+              type=click.File("r"),
+              required=False,
+              help="Read hosts from file, one per line (use `-` as HOST to read from stdin)")
+@click.option("-w",
+              "--workers",
+              type=int,
+              default=8,
+              show_default=True,
+              help="Number of concurrent lookups for multiple hosts")
+def host(apikey, format, host, server, include, exclude, disable_colors, from_file, workers):
     """Host (ip or domain) information."""
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, pool_maxsize=max(workers, 10))
+        if host == "-" or from_file is not None:
+            source = from_file if from_file is not None else click.get_text_stream("stdin")
+            hosts = (line.strip() for line in source if line.strip())
+            for _, query_res in ns_con.host_many(hosts=hosts,
+                                                 workers=workers,
+                                                 ordered=True,
+                                                 fields=include if include else exclude,
+                                                 exclude_fields=True if exclude else False):
+                if isinstance(query_res, Exception) and not isinstance(query_res, APIError):
+                    query_res = APIError(str(query_res))
+                print(dump_object(data=query_res, format=format, disable_colors=disable_colors), flush=True)
+            return
         query_res = ns_con.host(host=host,
                                 fields=include if include else exclude,
                                 exclude_fields=True if exclude else False)
@@ -464,12 +506,14 @@ def host(apikey, format, host, server, include, exclude, disable_colors):
               required=False,
               cls=MutuallyExclusiveOption,
               mutually_exclusive=["exclude", "-e"],
+              shell_complete=complete_fields,
               help="Specify comma-separated fields that will be in the output")
 @click.option("-e",
               "--exclude",
               required=False,
               cls=MutuallyExclusiveOption,
               mutually_exclusive=["include", "-i"],
+              shell_complete=complete_fields,
               help="Specify comma-separated fields that will be excluded from the output")
 @click.option("-c",
               "--count",
@@ -503,6 +547,48 @@ def host(apikey, format, host, server, include, exclude, disable_colors):
 )
 @click.option("--indices",
               help="Specify comma-separated data index collections")
+@click.option("--resume",
+              is_flag=True,
+              default=False,
+              help="Download `--all` data in parts, saving progress to `OUTPUT_FILE.checkpoint`, "
+                   "and continue an interrupted download from the last saved part")
+@click.option("--parallel",
+              type=int,
+              default=1,
+              show_default=True,
+              help="Download `--all` data in N concurrent parts")
+@click.option("--partition-by",
+              "partition_by",
+              type=click.Choice(["ip", "indices", "time"], case_sensitive=False),
+              default=None,
+              help="Split `--all` download into parts by IPv4 ranges (default for responses), "
+                   "by `--indices` or by `--time-field` ranges")
+@click.option("--time-field",
+              "time_field",
+              default="last_updated",
+              show_default=True,
+              help="Time field for `--partition-by time`")
+@click.option("--time-range",
+              "time_range",
+              help="Comma-separated ISO 8601 start and end for `--partition-by time`, e.g. 2024-01-01,2024-07-01")
+@click.option("--raw",
+              is_flag=True,
+              default=False,
+              help="Write NDJSON stream as is in large blocks without splitting it into documents")
+@click.option("--compress",
+              type=click.Choice(["gzip", "zstd", "lz4", "none"], case_sensitive=False),
+              default=None,
+              help="Compress output (by default chosen by output file extension: .gz, .zst, .lz4)")
+@click.option("--compress-level",
+              "compress_level",
+              type=int,
+              default=None,
+              help="Compression level (codec default if not set)")
+@click.option("--output-format",
+              "output_format",
+              type=click.Choice(["ndjson", "parquet"], case_sensitive=False),
+              default=None,
+              help="Output file format (by default parquet for .parquet files, otherwise ndjson)")
 def download(
     apikey,
     datatype,
@@ -513,11 +599,62 @@ def download(
     server,
     indices,
     include,
-    exclude
+    exclude,
+    resume,
+    parallel,
+    partition_by,
+    time_field,
+    time_range,
+    raw,
+    compress,
+    compress_level,
+    output_format
 ):
     """Download data of specific query."""
+    from netlas.download import compress_writer, copy_chunks, detect_compression
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        if output_format is None:
+            output_format = "parquet" if output_file.name.lower().endswith(".parquet") else "ndjson"
+        if output_format == "parquet":
+            if resume or parallel > 1 or partition_by or raw or output_file.name in ["-", "<stdout>"]:
+                raise APIError("Parquet output requires --output_file and can't be combined with "
+                               "--resume, --parallel, --partition-by and --raw")
+            ns_con = netlas.Netlas(api_key=apikey, apibase=server, metadata_cache=MetadataCache())
+            warn_unknown_fields(ns_con, include or exclude, datatype)
+            download_parquet(ns_con,
+                             path=output_file.name,
+                             query=querystring,
+                             datatype=datatype,
+                             size=None if all_ else count,
+                             indices=indices,
+                             fields=include if include else exclude,
+                             exclude_fields=True if exclude else False,
+                             compression=compress if compress else "zstd")
+            return
+        if compress is None:
+            compress = detect_compression(output_file.name)
+        elif compress == "none":
+            compress = None
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, pool_maxsize=max(parallel, 10),
+                               metadata_cache=MetadataCache())
+        warn_unknown_fields(ns_con, include or exclude, datatype)
+        if resume or parallel > 1 or partition_by:
+            if not all_ or output_file.name in ["-", "<stdout>"]:
+                raise APIError("Options --resume, --parallel and --partition-by require --all and --output_file")
+            download_partitioned(ns_con,
+                                 path=output_file.name,
+                                 query=querystring,
+                                 datatype=datatype,
+                                 indices=indices,
+                                 fields=include if include else exclude,
+                                 exclude_fields=True if exclude else False,
+                                 resume=resume,
+                                 parallel=parallel,
+                                 compress=compress,
+                                 compress_level=compress_level,
+                                 partitions=download_partitions(querystring, indices, partition_by,
+                                                                time_field, time_range, parallel))
+            return
         if all_:
             count_res = ns_con.count(
                 query=querystring, datatype=datatype, indices=indices)
@@ -525,38 +662,45 @@ def download(
                 count = count_res["count"]
         progress = None
         downloaded_docs_count = 0
+        output = output_file
+        if compress:
+            output = compress_writer(output_file, compress, compress_level)
         if output_file.name != "<stdout>":
-            bar_style = Style(color="bright_white", blink=False, bold=True)
-            bar_complete_style = Style(
-                color="dodger_blue1", blink=False, bold=True)
-            bar_finished_style = Style(
-                color="dodger_blue2", blink=False, bold=True)
-            progress = Progress(SpinnerColumn(style=bar_finished_style),
-                                TextColumn(
-                                    "[progress.description]{task.description}"),
-                                BarColumn(
-                                    style=bar_style, finished_style=bar_finished_style, complete_style=bar_complete_style),
-                                TaskProgressColumn(),
-                                TimeRemainingColumn(),
-                                MofNCompleteColumn())
+            progress = download_progress_bar()
             pg_bar = progress.add_task(
                 "[dodger_blue1]Downloading...", total=count)
             progress.start()
-        for i, query_res in enumerate(
-                ns_con.download(
+        if raw:
+            downloaded_docs_count = copy_chunks(
+                ns_con.download_raw(
                     query=querystring,
                     datatype=datatype,
                     size=count,
                     indices=indices,
                     fields=include if include else exclude,
                     exclude_fields=True if exclude else False,
-                )):
-            if i > 0:
-                output_file.write(b"\n")
-            output_file.write(query_res)
-            downloaded_docs_count = i + 1
-            if progress:
-                progress.update(pg_bar, advance=1)
+                ),
+                output,
+                on_progress=lambda docs: progress.update(pg_bar, advance=docs) if progress else None)
+        else:
+            for i, query_res in enumerate(
+                    ns_con.download(
+                        query=querystring,
+                        datatype=datatype,
+                        size=count,
+                        indices=indices,
+                        fields=include if include else exclude,
+                        exclude_fields=True if exclude else False,
+                    )):
+                if i > 0:
+                    output.write(b"\n")
+                output.write(query_res)
+                downloaded_docs_count = i + 1
+                # refreshing progress bar per document is slower than the download itself
+                if progress and downloaded_docs_count % 1000 == 0:
+                    progress.update(pg_bar, completed=downloaded_docs_count)
+        if output is not output_file:
+            output.close()
 
         if progress:
             progress.update(pg_bar,
@@ -571,6 +715,226 @@ def download(
         print(dump_object(ex))
 
 
+def warn_unknown_fields(ns_con, fields, datatype):
+    """Print a warning for `--include`/`--exclude` fields missing from the mapping of `datatype`.
+
+    The mapping is kept in the metadata cache of `ns_con`, which also feeds shell completion.
+    """
+    if not fields:
+        return
+    try:
+        unknown = ns_con.unknown_fields(fields, datatype)
+    except APIError:
+        return  # the search itself reports API errors
+    if unknown:
+        print(f"Warning: unknown {datatype} fields: {', '.join(unknown)}", file=sys.stderr)
+
+
+def download_progress_bar():
+    from rich.progress import Progress, SpinnerColumn, MofNCompleteColumn, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn
+    from rich.style import Style
+    bar_style = Style(color="bright_white", blink=False, bold=True)
+    bar_complete_style = Style(
+        color="dodger_blue1", blink=False, bold=True)
+    bar_finished_style = Style(
+        color="dodger_blue2", blink=False, bold=True)
+    return Progress(SpinnerColumn(style=bar_finished_style),
+                    TextColumn(
+                        "[progress.description]{task.description}"),
+                    BarColumn(
+                        style=bar_style, finished_style=bar_finished_style, complete_style=bar_complete_style),
+                    TaskProgressColumn(),
+                    TimeRemainingColumn(),
+                    MofNCompleteColumn())
+
+
+def transfer_progress_bar():
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+    from rich.style import Style
+    bar_style = Style(color="bright_white", blink=False, bold=True)
+    bar_complete_style = Style(color="dodger_blue1", blink=False, bold=True)
+    bar_finished_style = Style(color="dodger_blue2", blink=False, bold=True)
+    return Progress(SpinnerColumn(style=bar_finished_style),
+                    TextColumn("[progress.description]{task.description}"),
+                    BarColumn(style=bar_style, finished_style=bar_finished_style, complete_style=bar_complete_style),
+                    DownloadColumn(),
+                    TransferSpeedColumn(),
+                    TimeRemainingColumn())
+
+
+def status_progress_bar():
+    from rich.console import Console
+    from rich.progress import Progress, SpinnerColumn, TimeElapsedColumn, TextColumn, BarColumn, TaskProgressColumn
+    from rich.style import Style
+    bar_style = Style(color="bright_white", blink=False, bold=True)
+    bar_complete_style = Style(color="dodger_blue1", blink=False, bold=True)
+    bar_finished_style = Style(color="dodger_blue2", blink=False, bold=True)
+    return Progress(
+        SpinnerColumn(style=bar_finished_style),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(
+            style=bar_style,
+            finished_style=bar_finished_style,
+            complete_style=bar_complete_style,
+        ),
+        TaskProgressColumn(),
+        TimeElapsedColumn(),
+        console=Console(stderr=True),
+        transient=True,
+    )
+
+
+def discovery_stage_progress(progress, task_id):
+    def on_progress(percentage, message, status_data):
+        progress.update(
+            task_id,
+            completed=percentage,
+            description=f"[dodger_blue1]{message}",
+            refresh=True,
+        )
+
+    return on_progress
+
+
+def wait_discovery_stage(ns_con, x_stream_id, progress, task_id):
+    try:
+        ns_con.wait_discovery(x_stream_id=x_stream_id, on_progress=discovery_stage_progress(progress, task_id))
+    except APIError:
+        progress.stop()
+        raise
+
+
+def watch_discovery_stage(ns_con, x_stream_id, progress, task_id, stop) -> Thread:
+    """Show progress of a discovery stage from a background thread until it ends or `stop` is set."""
+    def watch():
+        try:
+            ns_con.wait_discovery(x_stream_id=x_stream_id, on_progress=discovery_stage_progress(progress, task_id),
+                                  cancel=stop)
+        except APIError:
+            pass  # failures of the stage end its result stream, which reports them
+
+    thread = Thread(target=watch, daemon=True)
+    thread.start()
+    return thread
+
+
+def download_parquet(ns_con, path, query, datatype, size, indices, fields, exclude_fields, compression):
+    progress = download_progress_bar()
+    total = size if size is not None else ns_con.count(query=query, datatype=datatype, indices=indices)["count"]
+    pg_bar = progress.add_task("[dodger_blue1]Downloading...", total=total)
+    progress.start()
+    try:
+        downloaded = ns_con.download_to_parquet(path,
+                                                query=query,
+                                                fields=fields,
+                                                exclude_fields=exclude_fields,
+                                                datatype=datatype,
+                                                size=size,
+                                                indices=indices,
+                                                compression=compression,
+                                                on_progress=lambda docs: progress.update(pg_bar, advance=docs))
+        progress.update(pg_bar,
+                        total=downloaded,
+                        description="[dodger_blue2]Completed     ",
+                        completed=downloaded,
+                        refresh=True)
+    finally:
+        progress.stop()
+
+
+def download_report(ns_con, id, output_file, output_format, key, compress, compress_level):
+    from netlas.download import detect_compression
+    name = getattr(output_file, "name", "<stdout>")
+    if compress is None:
+        compress = detect_compression(name)
+    elif compress == "none":
+        compress = None
+    progress = None
+    if name != "<stdout>":
+        progress = download_progress_bar()
+        pg_bar = progress.add_task("[dodger_blue1]Downloading...", total=None)
+        progress.start()
+    try:
+        ns_con.scan_report_to_file(id,
+                                   output_file,
+                                   format=output_format,
+                                   key=key,
+                                   compress=compress,
+                                   compress_level=compress_level,
+                                   on_progress=lambda size: progress.update(pg_bar, advance=size) if progress else None)
+        if progress:
+            progress.update(pg_bar, description="[dodger_blue2]Completed     ", refresh=True)
+    finally:
+        if progress:
+            progress.stop()
+
+
+def download_partitions(query, indices, partition_by, time_field, time_range, parallel):
+    from netlas.download import index_partitions, ip_partitions, time_partitions
+    if partition_by == "ip":
+        return ip_partitions(query, parts=max(16, parallel))
+    if partition_by == "indices":
+        if not indices or "," not in indices:
+            raise APIError("Option --partition-by indices requires several comma-separated --indices")
+        return index_partitions(query, indices)
+    if partition_by == "time":
+        if not time_range or "," not in time_range:
+            raise APIError("Option --partition-by time requires --time-range START,END")
+        start, end = time_range.split(",", 1)
+        return time_partitions(query, time_field, start.strip(), end.strip(), parts=max(8, parallel))
+    return None
+
+
+def download_partitioned(ns_con, path, query, datatype, indices, fields, exclude_fields, resume, parallel, partitions,
+                         compress, compress_level):
+    from netlas.download import PartitionedDownload
+    job = PartitionedDownload(ns_con,
+                              query=query,
+                              fields=fields if fields else "*",
+                              exclude_fields=exclude_fields,
+                              datatype=datatype,
+                              indices=indices,
+                              partitions=partitions,
+                              checkpoint=f"{path}.checkpoint" if resume else None,
+                              parallel=parallel,
+                              compress=compress,
+                              compress_level=compress_level)
+    plan = job.prepare(path)
+    counts = {p["key"]: p["count"] for p in plan}
+    total = sum(counts.values())
+    completed = sum(p["docs"] if p["done"] else (p.get("cursor") or {}).get("docs", 0) for p in plan)
+    if total == 0:
+        raise APIError("No data is available")
+    progress = download_progress_bar()
+    pg_bar = progress.add_task("[dodger_blue1]Downloading...", total=total, completed=completed)
+    part_bars = {}
+    lock = Lock()
+
+    def on_progress(key, docs):
+        progress.update(pg_bar, advance=docs)
+        if parallel > 1:
+            with lock:
+                if key not in part_bars:
+                    part_bars[key] = progress.add_task(f"[bright_white]  {key}", total=counts[key])
+            progress.update(part_bars[key], advance=docs)
+
+    def on_complete(key, docs):
+        with lock:
+            if key in part_bars:
+                progress.remove_task(part_bars.pop(key))
+
+    progress.start()
+    try:
+        downloaded = job.run(path, on_progress=on_progress, on_complete=on_complete)
+        progress.update(pg_bar,
+                        total=downloaded,
+                        description="[dodger_blue2]Completed     ",
+                        completed=downloaded,
+                        refresh=True)
+    finally:
+        progress.stop()
+
+
 @main.command()
 @click.option(
     "-a",
@@ -600,10 +964,17 @@ def download(
     default=False,
     help="Disable output colors",
 )
-def indices(apikey, server, format, disable_colors):
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="Revalidate cached indices with the server",
+)
+def indices(apikey, server, format, disable_colors, refresh):
     """Get available data indices."""
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server,
+                               metadata_cache=MetadataCache(max_age=0 if refresh else 3600))
         query_res = ns_con.indices()
         print(dump_object(data=query_res, format=format, disable_colors=disable_colors))
     except APIError as ex:
@@ -703,6 +1074,175 @@ def get_dataset(apikey, server, format, id, disable_colors):
         print(dump_object(ex))
 
 
+@datastore.command("download")
+@click.option(
+    "-a",
+    "--apikey",
+    help="User API key (can be saved to system using command `netlas savekey`)",
+    required=False,
+    default=lambda: get_api_key(),
+)
+@click.option(
+    "--server",
+    help="Netlas API server",
+    default="https://app.netlas.io",
+    show_default=True,
+)
+@click.argument(
+    'id',
+    type=int,
+    required=True
+)
+@click.option(
+    "-o",
+    "--output",
+    help="Output file or directory (dataset file name in the current directory by default)",
+    default=None,
+)
+@click.option("--parallel",
+              type=int,
+              default=4,
+              show_default=True,
+              help="Number of concurrent Range requests")
+@click.option("--segment-size",
+              "segment_size",
+              type=int,
+              default=64,
+              show_default=True,
+              help="Segment size in MiB, an interrupted download continues from completed segments")
+@click.option("--checksum",
+              default=None,
+              help="Expected checksum `algorithm:hexdigest` (by default provided by the server, if any)")
+def download_dataset(apikey, server, id, output, parallel, segment_size, checksum):
+    """Download a dataset by its ID."""
+    try:
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, pool_maxsize=max(parallel, 10))
+        progress = transfer_progress_bar()
+        pg_bar = progress.add_task("[dodger_blue1]Downloading...", total=None)
+        progress.start()
+        try:
+            path = ns_con.download_dataset(
+                id,
+                path=output,
+                parallel=parallel,
+                segment_size=segment_size << 20,
+                checksum=checksum,
+                on_progress=lambda completed, total: progress.update(pg_bar, completed=completed, total=total))
+            progress.update(pg_bar, description="[dodger_blue2]Completed     ", refresh=True)
+        finally:
+            progress.stop()
+        print(path)
+    except APIError as ex:
+        print(dump_object(ex))
+
+
+@datastore.command("sync")
+@click.option(
+    "-a",
+    "--apikey",
+    help="User API key (can be saved to system using command `netlas savekey`)",
+    required=False,
+    default=lambda: get_api_key(),
+)
+@click.option(
+    "-f",
+    "--format",
+    help="Output format",
+    default="yaml",
+    type=click.Choice(["json", "yaml"], case_sensitive=False),
+    show_default=True,
+)
+@click.option(
+    "--server",
+    help="Netlas API server",
+    default="https://app.netlas.io",
+    show_default=True,
+)
+@click.option(
+    "--no-color",
+    "disable_colors",
+    is_flag=True,
+    default=False,
+    help="Disable output colors",
+)
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--id",
+              "ids",
+              type=int,
+              multiple=True,
+              help="Dataset ID to hold, may be repeated (all available datasets by default)")
+@click.option("--parallel",
+              type=int,
+              default=2,
+              show_default=True,
+              help="Number of datasets downloaded concurrently")
+@click.option("--segments",
+              type=int,
+              default=4,
+              show_default=True,
+              help="Number of concurrent Range requests per dataset")
+@click.option("--prune",
+              is_flag=True,
+              default=False,
+              help="Remove held datasets that are no longer available or not selected with --id")
+@click.option("--verify",
+              is_flag=True,
+              default=False,
+              help="Re-hash held files and download them again on mismatch")
+@click.option("--dry-run",
+              "dry_run",
+              is_flag=True,
+              default=False,
+              help="Only show what would be downloaded and pruned")
+def sync_datasets(apikey, server, format, disable_colors, directory, ids, parallel, segments, prune, verify, dry_run):
+    """Mirror datastore to DIRECTORY, downloading only new and changed datasets."""
+    try:
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, pool_maxsize=max(parallel * segments, 10))
+        progress = None
+        tasks = {}
+        if not dry_run:
+            progress = transfer_progress_bar()
+            progress.start()
+
+        def on_progress(id, completed, total):
+            if id not in tasks:
+                tasks[id] = progress.add_task(f"[dodger_blue1]Dataset {id}", total=total)
+            progress.update(tasks[id], completed=completed, total=total)
+
+        def on_complete(id, entry):
+            if id in tasks:
+                status = "failed" if isinstance(entry, Exception) else "done"
+                progress.update(tasks[id], description=f"[dodger_blue2]Dataset {id} {status}", refresh=True)
+
+        try:
+            res = ns_con.sync_datastore(directory,
+                                        ids=list(ids) or None,
+                                        parallel=parallel,
+                                        segment_parallel=segments,
+                                        prune=prune,
+                                        verify=verify,
+                                        dry_run=dry_run,
+                                        on_progress=on_progress if progress else None,
+                                        on_complete=on_complete if progress else None)
+        finally:
+            if progress:
+                progress.stop()
+        print(dump_object(data=res, format=format, disable_colors=disable_colors))
+    except APIError as ex:
+        print(dump_object(ex))
+
+
+def read_lines(source) -> list:
+    return [line.strip() for line in source if line.strip()]
+
+
+def print_results(results, format, disable_colors):
+    for _, res in results:
+        if isinstance(res, Exception) and not isinstance(res, APIError):
+            res = APIError(str(res))
+        print(dump_object(data=res, format=format, disable_colors=disable_colors), flush=True)
+
+
 @main.group()
 def scanner():
     """Manage scans."""
@@ -773,7 +1313,7 @@ def list_scans(apikey, server, format, disable_colors):
 @click.argument(
     'id',
     type=int,
-    required=True
+    required=False
 )
 @click.option(
     "--no-color",
@@ -782,10 +1322,26 @@ def list_scans(apikey, server, format, disable_colors):
     default=False,
     help="Disable output colors",
 )
-def scan_get(apikey, server, format, id, disable_colors):
+@click.option("--from-file",
+              "from_file",
+              type=click.File("r"),
+              required=False,
+              help="Read scan IDs from file, one per line")
+@click.option("-w",
+              "--workers",
+              type=int,
+              default=8,
+              show_default=True,
+              help="Number of concurrent requests for multiple scans")
+def scan_get(apikey, server, format, id, disable_colors, from_file, workers):
     """Get info about scan."""
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, pool_maxsize=max(workers, 10))
+        if from_file is not None:
+            print_results(ns_con.scan_get_many(ids=read_lines(from_file), workers=workers), format, disable_colors)
+            return
+        if id is None:
+            raise click.UsageError("Missing argument 'ID' or option '--from-file'.")
         res = ns_con.scan_get(id=id)
         print(dump_object(data=res, format=format, disable_colors=disable_colors))
     except APIError as ex:
@@ -817,7 +1373,7 @@ def scan_get(apikey, server, format, id, disable_colors):
 @click.option(
     "--targets",
     help="Targets to scan.",
-    required=True,
+    required=False,
     type=str
 )
 @click.option(
@@ -832,12 +1388,40 @@ def scan_get(apikey, server, format, id, disable_colors):
     default=False,
     help="Disable output colors",
 )
-def create_scan(apikey, server, format, targets, name, disable_colors):
+@click.option("--from-file",
+              "from_file",
+              type=click.File("r"),
+              required=False,
+              help="Read targets from file, one per line")
+@click.option("--chunk-size",
+              "chunk_size",
+              type=int,
+              default=None,
+              help="Maximum number of targets in one scan, more targets are split into several scans "
+                   "[default with --from-file: 1000]")
+@click.option("-w",
+              "--workers",
+              type=int,
+              default=4,
+              show_default=True,
+              help="Number of concurrent requests for multiple scans")
+def create_scan(apikey, server, format, targets, name, disable_colors, from_file, chunk_size, workers):
     """Create scan."""
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
-        res = ns_con.scan_create(targets=targets, name=name)
-        print(dump_object(data=res, format=format, disable_colors=disable_colors))
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, pool_maxsize=max(workers, 10))
+        if from_file is None and chunk_size is None:
+            # targets are split into several scans only with --from-file or --chunk-size
+            if not targets:
+                raise click.UsageError("Missing option '--targets' or '--from-file'.")
+            res = ns_con.scan_create(targets=targets, name=name)
+            print(dump_object(data=res, format=format, disable_colors=disable_colors))
+            return
+        targets = (targets.split(",") if targets else []) + (read_lines(from_file) if from_file else [])
+        if not targets:
+            raise click.UsageError("Missing option '--targets' or '--from-file'.")
+        print_results(ns_con.scan_create_many(targets=targets, name=name, chunk_size=chunk_size or 1000,
+                                              workers=workers),
+                      format, disable_colors)
     except APIError as ex:
         print(dump_object(ex))
 
@@ -916,7 +1500,7 @@ def rename_scan(apikey, server, format, id, name, disable_colors):
 @click.option(
     "--id",
     help="ID/IDs of scan, comma-separated",
-    required=True,
+    required=False,
 )
 @click.option(
     "--no-color",
@@ -925,10 +1509,17 @@ def rename_scan(apikey, server, format, id, name, disable_colors):
     default=False,
     help="Disable output colors",
 )
-def delete_scan(apikey, server, format, id, disable_colors):
+@click.option("--from-file",
+              "from_file",
+              type=click.File("r"),
+              required=False,
+              help="Read scan IDs from file, one per line")
+def delete_scan(apikey, server, format, id, disable_colors, from_file):
     """Delete scan of `id`."""
     try:
-        ids = id.split(',')
+        ids = (id.split(',') if id else []) + (read_lines(from_file) if from_file else [])
+        if not ids:
+            raise click.UsageError("Missing option '--id' or '--from-file'.")
         ns_con = netlas.Netlas(api_key=apikey, apibase=server)
         if len(ids) > 1:
             res = ns_con.scan_bulk_delete(ids=ids)
@@ -965,13 +1556,13 @@ def delete_scan(apikey, server, format, id, disable_colors):
     "--id",
     help="ID of scan",
     type=int,
-    required=True
+    required=False
 )
 @click.option(
     "--shift",
     help="Priority number",
     type=int,
-    required=True
+    required=False
 )
 @click.option(
     "--no-color",
@@ -980,10 +1571,25 @@ def delete_scan(apikey, server, format, id, disable_colors):
     default=False,
     help="Disable output colors",
 )
-def priority_scan(apikey, server, format, id, shift, disable_colors):
+@click.option("--from-file",
+              "from_file",
+              type=click.File("r"),
+              required=False,
+              help="Read `ID SHIFT` pairs from file, one per line, applied in file order")
+def priority_scan(apikey, server, format, id, shift, disable_colors, from_file):
     """Change priority scan of `id`."""
     try:
         ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        if from_file is not None:
+            try:
+                shifts = [(int(scan_id), int(scan_shift))
+                          for scan_id, scan_shift in (line.replace(",", " ").split() for line in read_lines(from_file))]
+            except ValueError:
+                raise click.UsageError("Each line of '--from-file' must be `ID SHIFT`.")
+            print_results(ns_con.scan_priority_many(shifts=shifts), format, disable_colors)
+            return
+        if id is None or shift is None:
+            raise click.UsageError("Missing option '--id' and '--shift' or '--from-file'.")
         res = ns_con.scan_priority(id=id, shift=shift)
         print(dump_object(data=res, format=format, disable_colors=disable_colors))
     except APIError as ex:
@@ -1015,7 +1621,7 @@ def priority_scan(apikey, server, format, id, shift, disable_colors):
 @click.option(
     "--id",
     help="ID of scan",
-    required=True,
+    required=False,
     type=int,
 )
 @click.option(
@@ -1025,16 +1631,132 @@ def priority_scan(apikey, server, format, id, shift, disable_colors):
     default=False,
     help="Disable output colors",
 )
-def report_scan(apikey, server, format, id, disable_colors):
+@click.option("--from-file",
+              "from_file",
+              type=click.File("r"),
+              required=False,
+              help="Read scan IDs from file, one per line")
+@click.option("-w",
+              "--workers",
+              type=int,
+              default=4,
+              show_default=True,
+              help="Number of concurrent requests for multiple scans")
+@click.option(
+    "-o",
+    "--output_file",
+    help="Stream report to file (`-` for stdout) instead of printing it, memory use does not grow with report size",
+    default=None,
+    type=click.File("wb"),
+)
+@click.option("--output-format",
+              "output_format",
+              type=click.Choice(["json", "ndjson"], case_sensitive=False),
+              default="json",
+              show_default=True,
+              help="Report file format: JSON as is or one record per line")
+@click.option("--key",
+              default=None,
+              help="Report member with records for `--output-format ndjson` (first array member by default)")
+@click.option("--compress",
+              type=click.Choice(["gzip", "zstd", "lz4", "none"], case_sensitive=False),
+              default=None,
+              help="Compress report file (by default chosen by output file extension: .gz, .zst, .lz4)")
+@click.option("--compress-level",
+              "compress_level",
+              type=int,
+              default=None,
+              help="Compression level (codec default if not set)")
+def report_scan(apikey, server, format, id, disable_colors, from_file, workers, output_file, output_format, key,
+                compress, compress_level):
     """Get report scan of `id`."""
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server, pool_maxsize=max(workers, 10))
+        if output_file is not None:
+            if id is None:
+                raise click.UsageError("Option '--output_file' requires '--id'.")
+            download_report(ns_con, id, output_file, output_format, key, compress, compress_level)
+            return
+        if from_file is not None:
+            print_results(ns_con.scan_report_many(ids=read_lines(from_file), workers=workers), format, disable_colors)
+            return
+        if id is None:
+            raise click.UsageError("Missing option '--id' or '--from-file'.")
         res = ns_con.get_scan_report(id=id)
         print(dump_object(data=res, format=format, disable_colors=disable_colors))
     except APIError as ex:
         print(dump_object(ex))
 
 
+@scanner.command("watch")
+@click.option(
+    "-a",
+    "--apikey",
+    help="User API key (can be saved to system using command `netlas savekey`)",
+    required=False,
+    default=lambda: get_api_key(),
+)
+@click.option(
+    "-f",
+    "--format",
+    help="Output format",
+    default="yaml",
+    type=click.Choice(["json", "yaml"], case_sensitive=False),
+    show_default=True,
+)
+@click.option(
+    "--server",
+    help="Netlas API server",
+    default="https://app.netlas.io",
+    show_default=True,
+)
+@click.option(
+    "--no-color",
+    "disable_colors",
+    is_flag=True,
+    default=False,
+    help="Disable output colors",
+)
+@click.option("--from-file",
+              "from_file",
+              type=click.File("r"),
+              required=False,
+              help="Read scan IDs from file, one per line")
+@click.option("--timeout",
+              type=float,
+              default=None,
+              help="Maximum wait in seconds  [default: unlimited]")
+@click.option("--report/--no-report",
+              default=True,
+              show_default=True,
+              help="Print report of each finished scan instead of its info")
+@click.option("--max-interval",
+              "max_interval",
+              type=float,
+              default=60.0,
+              show_default=True,
+              help="Longest delay between status checks in seconds")
+@click.argument("ids", nargs=-1, type=int)
+def watch_scan(apikey, server, format, disable_colors, from_file, timeout, report, max_interval, ids):
+    """Wait for scans `ids` and print their reports as soon as they are finished."""
+    try:
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        ids = list(ids) + (read_lines(from_file) if from_file is not None else [])
+        if not ids:
+            raise click.UsageError("Missing argument 'IDS...' or option '--from-file'.")
+
+        def on_complete(id, scan, res):
+            if scan is None:
+                res = APIError(f"Scan {id} not found", "scan_not_found")
+            elif not report or res is None:
+                res = scan
+            print(dump_object(data=res, format=format, disable_colors=disable_colors), flush=True)
+
+        ns_con.wait_scans(ids, timeout=timeout, on_complete=on_complete, reports=report, max_interval=max_interval)
+    except APIError as ex:
+        print(dump_object(ex))
+
+
 @main.command()
 @click.option(
     "-a",
@@ -1080,10 +1802,17 @@ def report_scan(apikey, server, format, id, disable_colors):
     default="response",
     show_default=True,
 )
-def mapping(apikey, server, format, disable_colors, is_facet, datatype):
+@click.option(
+    "--refresh",
+    is_flag=True,
+    default=False,
+    help="Revalidate cached mapping with the server",
+)
+def mapping(apikey, server, format, disable_colors, is_facet, datatype, refresh):
     """Get mapping of index type."""
     try:
-        ns_con = netlas.Netlas(api_key=apikey, apibase=server)
+        ns_con = netlas.Netlas(api_key=apikey, apibase=server,
+                               metadata_cache=MetadataCache(max_age=0 if refresh else 3600))
         res = ns_con.mapping(datatype=datatype, is_facet=is_facet)
         print(dump_object(data=res, format=format, disable_colors=disable_colors))
     except APIError as ex:
@@ -1156,54 +1885,12 @@ def discovery_searches(apikey, server, format, disable_colors, node_value, node_
         x_stream_id = query_res.get("x_stream_id")
 
         if x_stream_id and not disable_status:
-            bar_style = Style(color="bright_white", blink=False, bold=True)
-            bar_complete_style = Style(color="dodger_blue1", blink=False, bold=True)
-            bar_finished_style = Style(color="dodger_blue2", blink=False, bold=True)
-
-            progress = Progress(
-                SpinnerColumn(style=bar_finished_style),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(
-                    style=bar_style,
-                    finished_style=bar_finished_style,
-                    complete_style=bar_complete_style,
-                ),
-                TaskProgressColumn(),
-                TimeElapsedColumn(),
-                console=Console(stderr=True),
-                transient=True,
-            )
+            progress = status_progress_bar()
 
             task_id = progress.add_task("[dodger_blue1]Preparing searches...", total=100)
             progress.start()
 
-            last_percentage = -1
-
-            while True:
-                status_res = ns_con.discovery_status(x_stream_id=x_stream_id)
-                status_data = status_res.get("data", {})
-
-                percentage = status_data.get("percentage", 0) or 0
-                message = status_data.get("message", "Processing")
-                status = (status_data.get("status") or "").lower()
-
-                if percentage != last_percentage:
-                    progress.update(
-                        task_id,
-                        completed=percentage,
-                        description=f"[dodger_blue1]{message}",
-                        refresh=True,
-                    )
-                    last_percentage = percentage
-
-                if status in {"done", "completed", "success", "finished"} or percentage >= 100:
-                    break
-
-                if status in {"failed", "error"}:
-                    progress.stop()
-                    raise APIError(message)
-
-                sleep(0.5)
+            wait_discovery_stage(ns_con, x_stream_id, progress, task_id)
 
             progress.update(
                 task_id,
@@ -1292,55 +1979,13 @@ def discovery_fetch(apikey, server, format, disable_colors, node_value, search_i
         task_id = None
 
         if not disable_status:
-            bar_style = Style(color="bright_white", blink=False, bold=True)
-            bar_complete_style = Style(color="dodger_blue1", blink=False, bold=True)
-            bar_finished_style = Style(color="dodger_blue2", blink=False, bold=True)
-
-            progress = Progress(
-                SpinnerColumn(style=bar_finished_style),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(
-                    style=bar_style,
-                    finished_style=bar_finished_style,
-                    complete_style=bar_complete_style,
-                ),
-                TaskProgressColumn(),
-                TimeElapsedColumn(),
-                console=Console(stderr=True),
-                transient=True,
-            )
+            progress = status_progress_bar()
 
             task_id = progress.add_task("[dodger_blue1]Preparing search...", total=100)
             progress.start()
 
         if x_stream_id and not disable_status:
-            last_percentage = -1
-
-            while True:
-                status_res = ns_con.discovery_status(x_stream_id=x_stream_id)
-                status_data = status_res.get("data", {})
-
-                percentage = status_data.get("percentage", 0) or 0
-                message = status_data.get("message", "Processing")
-                status = (status_data.get("status") or "").lower()
-
-                if percentage != last_percentage:
-                    progress.update(
-                        task_id,
-                        completed=percentage,
-                        description=f"[dodger_blue1]{message}",
-                        refresh=True,
-                    )
-                    last_percentage = percentage
-
-                if status in {"done", "completed", "success", "finished"} or percentage >= 100:
-                    break
-
-                if status in {"failed", "error"}:
-                    progress.stop()
-                    raise APIError(message)
-
-                sleep(0.5)
+            wait_discovery_stage(ns_con, x_stream_id, progress, task_id)
 
         if len(records) > 1:
             result_res = ns_con.discovery_group_result(
@@ -1348,6 +1993,7 @@ def discovery_fetch(apikey, server, format, disable_colors, node_value, search_i
                 node_type=node_type,
                 node_value=records,
                 search_field_id=search_id,
+                stream=True,
             )
         else:
             result_res = ns_con.discovery_node_result(
@@ -1355,10 +2001,13 @@ def discovery_fetch(apikey, server, format, disable_colors, node_value, search_i
                 node_type=node_type,
                 node_value=node_value,
                 search_field_id=search_id,
+                stream=True,
             )
 
         x_stream_id = result_res.get("x_stream_id")
 
+        stop = Event()
+        watcher = None
         if x_stream_id and not disable_status:
             progress.update(
                 task_id,
@@ -1366,45 +2015,100 @@ def discovery_fetch(apikey, server, format, disable_colors, node_value, search_i
                 description="[dodger_blue1]Executing search...",
                 refresh=True,
             )
+            # the result is read while the stage runs, an unread stream would stall the server
+            watcher = watch_discovery_stage(ns_con, x_stream_id, progress, task_id, stop)
 
-            last_percentage = -1
-
-            while True:
-                status_res = ns_con.discovery_status(x_stream_id=x_stream_id)
-                status_data = status_res.get("data", {})
-
-                percentage = status_data.get("percentage", 0) or 0
-                message = status_data.get("message", "Processing")
-                status = (status_data.get("status") or "").lower()
-
-                if percentage != last_percentage:
-                    progress.update(
-                        task_id,
-                        completed=percentage,
-                        description=f"[dodger_blue1]{message}",
-                        refresh=True,
-                    )
-                    last_percentage = percentage
+        try:
+            # records are written as they arrive instead of collecting the whole result
+            for piece in dump_records(result_res["data"], format=format, disable_colors=disable_colors):
+                sys.stdout.write(piece)
+                sys.stdout.flush()
+            if progress is not None:
+                progress.update(
+                    task_id,
+                    completed=100,
+                    description="[dodger_blue2]Completed     ",
+                    refresh=True,
+                )
+        finally:
+            result_res["data"].close()
+            stop.set()
+            if watcher is not None:
+                watcher.join()
+            if progress is not None:
+                progress.stop()
+        print()
+    except APIError as ex:
+        print(dump_object(ex))
 
-                if status in {"done", "completed", "success", "finished"} or percentage >= 100:
-                    break
 
-                if status in {"failed", "error"}:
-                    progress.stop()
-                    raise APIError(message)
+@main.group("index")
+def index_group():
+    """Local lookup index over downloaded NDJSON files."""
+    pass
 
-                sleep(0.5)
 
-        if progress is not None:
-            progress.update(
-                task_id,
-                completed=100,
-                description="[dodger_blue2]Completed     ",
-                refresh=True,
-            )
+@index_group.command("build")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option("-k",
+              "--field",
+              default="ip",
+              show_default=True,
+              help="Dotted document field to index, e.g. ip, domain or certificate.fingerprint_sha256")
+@click.option("--index-file",
+              "index_file",
+              default=None,
+              help="Index file path (FILE.idx by default)")
+def build_index(file, field, index_file):
+    """Build offset index of NDJSON FILE by a document field."""
+    try:
+        progress = transfer_progress_bar()
+        pg_bar = progress.add_task("[dodger_blue1]Indexing...", total=None)
+        progress.start()
+        try:
+            entries = netlas.NDJSONIndex.build(
+                file,
+                field,
+                index_path=index_file,
+                on_progress=lambda position, size: progress.update(pg_bar, completed=position, total=size))
+            progress.update(pg_bar, description="[dodger_blue2]Completed     ", refresh=True)
+        finally:
             progress.stop()
+        print(f"Indexed {entries} values of '{field}' in {index_file or file + '.idx'}")
+    except APIError as ex:
+        print(dump_object(ex))
+
 
-        print(dump_object(data=result_res["data"], format=format, disable_colors=disable_colors))
+@index_group.command("get")
+@click.option(
+    "-f",
+    "--format",
+    help="Output format",
+    default="json",
+    type=click.Choice(["json", "yaml"], case_sensitive=False),
+    show_default=True,
+)
+@click.option(
+    "--no-color",
+    "disable_colors",
+    is_flag=True,
+    default=False,
+    help="Disable output colors",
+)
+@click.option("--index-file",
+              "index_file",
+              default=None,
+              help="Index file path (FILE.idx by default)")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("keys", nargs=-1, required=True)
+def get_index(format, disable_colors, index_file, file, keys):
+    """Print documents of indexed NDJSON FILE with the indexed field equal to KEYS."""
+    try:
+        with netlas.NDJSONIndex(file, index_path=index_file) as index:
+            for key in keys:
+                for piece in dump_records(index.get(key), format=format, disable_colors=disable_colors):
+                    sys.stdout.write(piece)
+                print()
     except APIError as ex:
         print(dump_object(ex))
 
@@ -0,0 +1,431 @@
+import asyncio
+
+from netlas.exception import APIError, ThrottlingError
+from netlas.helpers import build_api_error, datatype_endpoint, decode_response, mapping_endpoint, stat_endpoint
+
+
+class AsyncNetlas:
+    """Asyncio version of :class:`netlas.client.Netlas`.
+
+    All API methods are coroutines, `download` and `download_all` are async generators.
+    Requires `aiohttp` (`pip install netlas[async]`).
+    """
+
+    def __init__(
+        self,
+        api_key: str = "",
+        apibase: str = "https://app.netlas.io",
+        debug: bool = False,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 15.0,
+    ) -> None:
+        """AsyncNetlas class constructor
+
+        :param api_key: Personal API key
+        :param apibase: Netlas API server address
+        :param debug: Debug flag
+        :param limit: Total number of simultaneous connections in the pool, defaults to 100
+        :param limit_per_host: Number of simultaneous connections to one host, 0 for no limit, defaults to 0
+        :param keepalive_timeout: Seconds to keep idle connections alive, defaults to 15.0
+        """
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("AsyncNetlas requires aiohttp, install it with `pip install netlas[async]`")
+        self._aiohttp = aiohttp
+        self.api_key: str = api_key
+        self.apibase: str = apibase.rstrip("/")
+        self.debug: bool = debug
+        self.verify_ssl: bool = True
+        if self.apibase != "https://app.netlas.io":
+            self.verify_ssl = False
+        self.headers = {"Content-Type": "application/json",
+                        "X-Api-Key": self.api_key}
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.session = None
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = self._aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ssl=None if self.verify_ssl else False,
+            )
+            self.session = self._aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def close(self) -> None:
+        """Close pooled connections of the client session."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @staticmethod
+    def _query_params(params: dict) -> dict:
+        # aiohttp does not drop None values from query strings the way requests does
+        return {k: str(v) for k, v in params.items() if v is not None}
+
+    async def _request(self, endpoint: str = "/api/", params: object = {}, throttling: bool = True, retry: int = 1, method: str = 'get', ext_headers: dict = {}, return_headers: bool = False) -> dict:
+        """Private requests wrapper.
+        Sends a request to Netlas API endpoint and process result.
+
+        :param endpoint: API endpoint
+        :param params: HTTP parameters for request
+        :param throttling: Wait and retry request if 429 error (Too many requests) occured, defaults to True
+        :param retry: Retry count, defaults to 1
+        :param method: HTTP method, defaults to GET
+        :raises APIError: Failed to parse JSON response
+        :raises APIError: Other HTTP error
+        :raises ThrottlingError: Request throttled, rate-limit exceeded
+        :return: parsed JSON response
+        """
+        method = method.lower()
+        if method not in ['get', 'patch', 'delete', 'post']:
+            raise APIError(f"HTTP method '{method}' is not supported")
+        kwargs = {"headers": self.headers | ext_headers}
+        if method in ['get', 'delete']:
+            kwargs["params"] = self._query_params(params)
+        else:
+            kwargs["json"] = params
+
+        session = self._get_session()
+        async with session.request(method, f"{self.apibase}{endpoint}", **kwargs) as r:
+            content = await r.read()
+            headers = dict(r.headers)
+            status, reason = r.status, r.reason
+
+        if status >= 400:
+            api_ex = build_api_error(status, reason, content.decode(errors="replace"))
+            if api_ex.type == "request_was_throttled":
+                throttling_time = int(headers.get('Retry-After', 0))
+                if throttling == True and retry > 0:
+                    if self.debug:
+                        print(f"Throttling request for {throttling_time} seconds", flush=True)
+                    await asyncio.sleep(throttling_time)
+                    return await self._request(endpoint=endpoint, params=params, throttling=throttling, retry=retry-1, method=method, ext_headers=ext_headers, return_headers=return_headers)
+                raise ThrottlingError(retry_after=throttling_time)
+            raise api_ex
+
+        try:
+            response_data = decode_response(content, headers.get("Content-Type", ""))
+        except ValueError:
+            error = "Failed to parse response data to JSON"
+            if self.debug:
+                error += "\nDescription: " + str(reason)
+                error += "\nData: " + content.decode(errors="replace")
+            raise APIError(error)
+
+        if return_headers:
+            return {
+                "data": response_data,
+                "headers": headers,
+            }
+        return response_data
+
+    async def _stream_request(self, endpoint: str = "/api/", params: object = {}, ext_headers: dict = {}):
+        """Private stream requests wrapper.
+        Sends a request to Netlas API endpoint and yield lines from stream.
+
+        :param endpoint: API endpoint
+        :param params: POST parameters for request
+        :raises APIError: Other HTTP or connection error
+        :return: Async iterator of raw lines from response
+        """
+        session = self._get_session()
+        try:
+            async with session.post(
+                f"{self.apibase}{endpoint}",
+                json=params,
+                headers=self.headers | ext_headers,
+                timeout=self._aiohttp.ClientTimeout(sock_read=60.0),
+            ) as r:
+                if r.status >= 400:
+                    raise build_api_error(r.status, r.reason, await r.text())
+                # documents may exceed aiohttp's readline limit, so split lines manually;
+                # only new chunks are split, parts of an unfinished line are joined once it ends
+                pending = []
+                async for chunk in r.content.iter_chunked(65536):
+                    lines = chunk.split(b"\n")
+                    if len(lines) == 1:
+                        pending.append(chunk)
+                        continue
+                    if pending:
+                        pending.append(lines[0])
+                        lines[0] = b"".join(pending)
+                    pending = [lines.pop()]
+                    for line in lines:
+                        line = line.rstrip(b"\r")
+                        if line:
+                            yield line
+                rest = b"".join(pending)
+                if rest.strip():
+                    yield rest
+        except (self._aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            raise APIError(str(ex) or "Unexpected Stream error")
+
+    async def search(
+        self,
+        query: str,
+        datatype: str = "response",
+        page: int = 0,
+        indices: str = "",
+        fields: str = None,
+        exclude_fields: bool = False,
+        throttling: bool = True,
+        retry: int = 1
+    ) -> dict:
+        """Send search query to Netlas API. See :meth:`netlas.client.Netlas.search`."""
+        return await self._request(
+            endpoint=datatype_endpoint(datatype, "/"),
+            params={
+                "q": query,
+                "indices": indices,
+                "start": page * 20,
+                "fields": fields,
+                "source_type": "exclude" if exclude_fields else "include"
+            },
+            throttling=throttling,
+            retry=retry
+        )
+
+    query = search  # for backward compatibility
+
+    async def count(
+        self,
+        query: str,
+        datatype: str = "response",
+        indices: str = "",
+        throttling: bool = True,
+        retry: int = 1
+    ) -> dict:
+        """Calculate total count of query string results. See :meth:`netlas.client.Netlas.count`."""
+        return await self._request(
+            endpoint=datatype_endpoint(datatype, "_count/"),
+            params={
+                "q": query,
+                "indices": indices
+            },
+            throttling=throttling,
+            retry=retry
+        )
+
+    async def stat(
+        self,
+        query: str,
+        facets: str,
+        indices: str = "",
+        size: int = 100,
+        index_type: str = "responses",
+        throttling: bool = True,
+        retry: int = 1,
+    ) -> dict:
+        """Get statistics of responses query string results. See :meth:`netlas.client.Netlas.stat`."""
+        return await self._request(
+            endpoint=stat_endpoint(index_type),
+            params={
+                "q": query,
+                "facets": facets,
+                "size": size,
+                "indices": indices,
+            },
+            throttling=throttling,
+            retry=retry
+        )
+
+    async def profile(self) -> dict:
+        """Get user profile data."""
+        return await self._request(endpoint="/api/users/current/")
+
+    async def update_profile(self, first_name, last_name) -> dict:
+        params = {
+            "first_name": f"{first_name}",
+        }
+        if last_name != None:
+            params["last_name"] = f"{last_name}"
+        return await self._request(endpoint="/api/users/current/", method='patch', params=params)
+
+    async def profile_data(self) -> dict:
+        return await self._request(endpoint="/api/users/profile_data/")
+
+    async def host(
+        self,
+        host: str,
+        fields: str = None,
+        exclude_fields: bool = False,
+        throttling: bool = True,
+        retry: int = 1
+    ) -> dict:
+        """Get full information about a host (IP or domain). See :meth:`netlas.client.Netlas.host`."""
+        endpoint = f"/api/host/{host}" if host else "/api/host/"
+        return await self._request(
+            endpoint=endpoint,
+            params={
+                "fields": fields,
+                "source_type": "exclude" if exclude_fields else "include"
+            },
+            throttling=throttling,
+            retry=retry
+        )
+
+    async def download(
+        self,
+        query: str,
+        fields: str = None,
+        exclude_fields: bool = False,
+        datatype: str = "response",
+        size: int = 10,
+        indices: str = "",
+    ):
+        """Download data from Netlas. See :meth:`netlas.client.Netlas.download`.
+
+        :return: Async iterator of raw documents.
+        """
+        if fields == None:  # for non-params cli download
+            fields = "*"
+
+        async for ret in self._stream_request(
+            endpoint=datatype_endpoint(datatype, "/download/"),
+            params={
+                "q": query,
+                "size": size,
+                "indices": indices,
+                "raw": True,
+                "fields": fields,
+                "source_type": "exclude" if exclude_fields else "include",
+            },
+        ):
+            yield ret
+
+    async def download_all(
+        self,
+        query: str,
+        fields: str = None,
+        exclude_fields: bool = False,
+        datatype: str = "response",
+        indices: str = "",
+    ):
+        """Download all available data for a given query. See :meth:`netlas.client.Netlas.download_all`.
+
+        :return: Async iterator of raw documents.
+        """
+        count_res = await self.count(query=query, datatype=datatype, indices=indices)
+        if count_res["count"] <= 0:
+            raise APIError({
+                "error": "No data is available"
+            })
+        async for ret in self.download(
+            query=query,
+            fields=fields,
+            exclude_fields=exclude_fields,
+            datatype=datatype,
+            size=count_res["count"],
+            indices=indices,
+        ):
+            yield ret
+
+    async def indices(self) -> list:
+        """Get available data indices."""
+        return await self._request(endpoint="/api/indices/")
+
+    async def datasets(self) -> list:
+        """Get available datasets."""
+        return await self._request(endpoint="/api/datastore/products/")
+
+    async def dataset_info(self, id) -> list:
+        """Get info about product by `id`"""
+        return await self._request(endpoint=f"/api/datastore/products/{id}/")
+
+    async def get_dataset_link(self, id) -> list:
+        """Get the link of a dataset by its ID."""
+        return await self._request(endpoint=f"/api/datastore/get_dataset_link/{id}/")
+
+    async def scans(self) -> list:
+        return await self._request(endpoint="/api/scanner/")
+
+    async def scan_get(self, id: int):
+        return await self._request(endpoint=f"/api/scanner/{id}/")
+
+    async def scan_create(self, targets: list, name: str):
+        params = {
+            "targets": targets.split(','),
+            "name": name
+        }
+        return await self._request(endpoint="/api/scanner/", params=params, method='post')
+
+    async def scan_rename(self, id: int, name: str):
+        return await self._request(endpoint=f"/api/scanner/{id}/", params={"name": name}, method='patch')
+
+    async def scan_delete(self, id: int):
+        return await self._request(endpoint=f"/api/scanner/{id}/", method='delete')
+
+    async def scan_bulk_delete(self, ids: list):
+        return await self._request(endpoint="/api/scanner/bulk_delete/", method='post', params={"ids": ids})
+
+    async def scan_priority(self, id: int, shift: int):
+        params = {
+            "id": id,
+            "shift": shift
+        }
+        return await self._request(endpoint="/api/scanner/change_priority/", params=params, method='post')
+
+    async def get_scan_report(self, id: int):
+        return await self._request(endpoint=f"/api/scanner/{id}/report", method='get')
+
+    async def mapping(self, datatype: str, is_facet: bool):
+        """Get mapping of facet or default search."""
+        return await self._request(endpoint=mapping_endpoint(datatype, is_facet), method='get')
+
+    async def _discovery_request(self, endpoint, params, ext_headers: dict = {}, with_count_id: bool = True):
+        resp = await self._request(endpoint=endpoint, params=params, method='post', ext_headers=ext_headers, return_headers=True)
+        headers = {k.lower(): v for k, v in resp.get("headers", {}).items()}
+        ret = {"x_stream_id": headers.get("x-stream-id"), "data": resp.get("data")}
+        if with_count_id:
+            ret["x_count_id"] = headers.get("x-count-id")
+        return ret
+
+    async def discovery_node_count(self, node_type, node_value):
+        params = {
+            "node_type": node_type,
+            "node_value": node_value
+        }
+        return await self._discovery_request("/api/discovery/node_count/", params)
+
+    async def discovery_node_result(self, x_count_id, node_type, node_value, search_field_id):
+        params = {
+            "node_type": node_type,
+            "node_value": node_value,
+            "search_field_id": search_field_id
+        }
+        return await self._discovery_request("/api/discovery/node_result/", params, ext_headers={'X-Count-Id': x_count_id}, with_count_id=False)
+
+    async def discovery_group_count(self, node_type, node_value):
+        if isinstance(node_value, str):
+            node_value = [v.strip() for v in node_value.split(",") if v.strip()]
+        params = {
+            "node_type": node_type,
+            "node_value": node_value,
+        }
+        return await self._discovery_request("/api/discovery/group_of_nodes_count/", params)
+
+    async def discovery_group_result(self, x_count_id, node_type, node_value, search_field_id):
+        if isinstance(node_value, str):
+            node_value = [v.strip() for v in node_value.split(",") if v.strip()]
+        params = {
+            "node_type": node_type,
+            "node_value": node_value,
+            "search_field_id": search_field_id,
+        }
+        return await self._discovery_request("/api/discovery/group_of_nodes_result/", params, ext_headers={"X-Count-Id": x_count_id}, with_count_id=False)
+
+    async def discovery_status(self, x_stream_id):
+        return await self._request(endpoint=f"/api/discovery/status/{x_stream_id}/")
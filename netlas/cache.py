@@ -0,0 +1,287 @@
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from netlas import jsonlib
+
+
+class MemoryCache:
+    """Thread-safe in-memory LRU storage for :class:`ResponseCache`."""
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        """MemoryCache constructor
+
+        :param maxsize: Maximum number of stored responses, least recently used are evicted first, defaults to 1024
+        """
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.items = collections.OrderedDict()
+
+    def get(self, key: str):
+        """Stored value of `key`, or None if missing or expired."""
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> int:
+        """Store `value` for `ttl` seconds.
+
+        :return: Number of evicted entries
+        """
+        with self.lock:
+            self.items[key] = (time.time() + ttl, value)
+            self.items.move_to_end(key)
+            evicted = 0
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class SQLiteCache:
+    """On-disk storage for :class:`ResponseCache`, shared between processes using the same file."""
+
+    def __init__(self, path: str, maxsize: int = 10000) -> None:
+        """SQLiteCache constructor
+
+        :param path: Database file path
+        :param maxsize: Maximum number of stored responses, least recently used are evicted first, defaults to 10000
+        """
+        import sqlite3
+        self.path = path
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, expires REAL, accessed REAL, value TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str):
+        """Stored value of `key`, or None if missing or expired."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT expires, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[0] < now:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[1]
+
+    def set(self, key: str, value: str, ttl: float) -> int:
+        """Store `value` for `ttl` seconds.
+
+        :return: Number of evicted entries
+        """
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, expires, accessed, value) VALUES (?, ?, ?, ?)",
+                (key, now + ttl, now, value),
+            )
+            self.db.execute("DELETE FROM responses WHERE expires < ?", (now,))
+            size = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if size <= self.maxsize:
+                return 0
+            self.db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (size - self.maxsize,),
+            )
+            return size - self.maxsize
+
+    def clear(self) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Opt-in cache of Netlas API responses for :class:`netlas.client.Netlas`.
+
+    Responses of `count`, `stat`, `host`, `mapping`, `indices`, `datasets` and
+    `dataset_info` are cached by endpoint and normalized request parameters.
+    Each method has its own TTL in seconds; a TTL of 0 disables caching for it.
+    Errors are never cached.
+    """
+
+    DEFAULT_TTLS = {
+        "count": 60,
+        "stat": 60,
+        "host": 300,
+        "mapping": 86400,
+        "indices": 3600,
+        "datasets": 3600,
+        "dataset_info": 3600,
+    }
+
+    def __init__(self, backend=None, ttls: dict = None) -> None:
+        """ResponseCache constructor
+
+        :param backend: `MemoryCache` or `SQLiteCache` instance, defaults to `MemoryCache()`
+        :param ttls: TTLs in seconds overriding `DEFAULT_TTLS`, e.g. `{"count": 30, "host": 0}`
+        """
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttls = self.DEFAULT_TTLS | (ttls or {})
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.evictions = 0
+
+    @staticmethod
+    def key(scope: str, endpoint: str, params: dict = None) -> str:
+        """Cache key of a request, independent of parameter order and unset (None) parameters."""
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        raw = json.dumps([scope, endpoint, params], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def ttl(self, name: str) -> float:
+        return self.ttls.get(name, 0)
+
+    def _count(self, name: str, counter: str) -> None:
+        with self.lock:
+            counters = self.counters.setdefault(name, {"hits": 0, "misses": 0})
+            counters[counter] += 1
+
+    def get(self, name: str, key: str):
+        """Cached response for `key`, or None on a miss."""
+        value = self.backend.get(key)
+        self._count(name, "misses" if value is None else "hits")
+        return None if value is None else jsonlib.loads(value)
+
+    def set(self, name: str, key: str, value) -> None:
+        evicted = self.backend.set(key, jsonlib.dumps(value), self.ttl(name))
+        if evicted:
+            with self.lock:
+                self.evictions += evicted
+
+    def clear(self) -> None:
+        """Drop all cached responses, statistics are kept."""
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters, total and per method, plus size and eviction count."""
+        with self.lock:
+            methods = {name: dict(counters) for name, counters in self.counters.items()}
+            evictions = self.evictions
+        hits = sum(c["hits"] for c in methods.values())
+        misses = sum(c["misses"] for c in methods.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "size": len(self.backend),
+            "evictions": evictions,
+            "methods": methods,
+        }
+
+
+class MetadataCache:
+    """On-disk cache of rarely changing API metadata: field mappings and data indices.
+
+    Entries are kept under the `appdirs` user cache directory and reused without a
+    request while younger than `max_age`. Stale entries are revalidated with
+    `If-None-Match`/`If-Modified-Since`, so an unchanged response costs a
+    `304 Not Modified` instead of a full download.
+    """
+
+    def __init__(self, directory: str = None, max_age: float = 3600) -> None:
+        """MetadataCache constructor
+
+        :param directory: Cache directory, defaults to `metadata` in the user cache dir of netlas
+        :param max_age: Seconds an entry is used without revalidation, defaults to 3600
+        """
+        if directory is None:
+            import appdirs
+            directory = os.path.join(appdirs.user_cache_dir(appname="netlas"), "metadata")
+        self.directory = directory
+        self.max_age = max_age
+
+    def _path(self, scope: str, endpoint: str) -> str:
+        name = hashlib.sha256(f"{scope} {endpoint}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self, scope: str, endpoint: str):
+        """Cached entry `{"data", "etag", "last_modified", "fetched"}`, or None."""
+        try:
+            with open(self._path(scope, endpoint), "rb") as entry_file:
+                entry = jsonlib.loads(entry_file.read())
+        except (OSError, ValueError):
+            return None
+        return entry if isinstance(entry, dict) and "data" in entry else None
+
+    def save(self, scope: str, endpoint: str, data, headers: dict = {}) -> dict:
+        """Store response `data` with validators from response `headers`."""
+        entry = {
+            "data": data,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched": time.time(),
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as entry_file:
+                entry_file.write(jsonlib.dumps(entry))
+            os.replace(tmp_path, self._path(scope, endpoint))
+        except OSError:
+            # cache is an optimization, read-only or full disk must not break requests
+            pass
+        return entry
+
+    def touch(self, scope: str, endpoint: str, entry: dict) -> dict:
+        """Mark `entry` as revalidated now."""
+        return self.save(scope, endpoint, entry["data"],
+                         {"ETag": entry.get("etag"), "Last-Modified": entry.get("last_modified")})
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry.get("fetched", 0) < self.max_age
+
+    @staticmethod
+    def validators(entry: dict) -> dict:
+        """Conditional request headers for revalidation of `entry`."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
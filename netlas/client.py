@@ -1,9 +1,18 @@
 import requests
-import json
+import requests.adapters
+import collections
+import concurrent.futures
+import fnmatch
+import os
 import time
+import urllib.parse
 
+from netlas import jsonlib
+from netlas.cache import MetadataCache, ResponseCache
 from netlas.exception import APIError, ThrottlingError
-from netlas.helpers import check_status_code
+from netlas.helpers import check_status_code, datatype_endpoint, decode_response, mapping_endpoint, stat_endpoint
+from netlas.ratelimit import RateLimiter, TokenBucket, endpoint_class
+from netlas.retry import RetryPolicy
 
 class Netlas:
     def __init__(
@@ -11,12 +20,30 @@ class Netlas:
         api_key: str = "",
         apibase: str = "https://app.netlas.io",
         debug: bool = False,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        rate_limiter: RateLimiter = None,
+        retry_policy: RetryPolicy = None,
+        timeout: float = None,
+        stream_timeout: float = 60.0,
+        cache: ResponseCache = None,
+        metadata_cache: MetadataCache = None,
     ) -> None:
         """Netlas class constructor
 
         :param api_key: Personal API key
         :param apibase: Netlas API server address
         :param debug: Debug flag
+        :param pool_connections: Number of per-host connection pools to keep, defaults to 10
+        :param pool_maxsize: Maximum number of keep-alive connections per host, defaults to 10
+        :param pool_block: Block when all connections to a host are busy instead of opening extra ones, defaults to False
+        :param rate_limiter: Client-side rate limiter, may be shared between clients (e.g. `RateLimiter.shared()`), disabled by default
+        :param retry_policy: Retry policy for connection errors and gateway errors, defaults to `RetryPolicy()`
+        :param timeout: Timeout in seconds for regular requests, no timeout by default
+        :param stream_timeout: Timeout in seconds between received bytes of download streams, defaults to 60.0
+        :param cache: Cache of `count`, `stat`, `host`, `mapping`, `indices`, `datasets` and `dataset_info` responses, disabled by default
+        :param metadata_cache: On-disk cache of `mapping` and `indices` responses with revalidation, disabled by default
         """
         self.api_key: str = api_key
         self.apibase: str = apibase.rstrip("/")
@@ -26,8 +53,111 @@ class Netlas:
             self.verify_ssl = False
         self.headers = {"Content-Type": "application/json",
                         "X-Api-Key": self.api_key}
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.cache = cache
+        self.metadata_cache = metadata_cache
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self) -> None:
+        """Close pooled connections of the client session."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _send(self, method: str, endpoint: str, params: object = {}, ext_headers: dict = {}, url: str = None, headers: dict = None, **kwargs) -> requests.Response:
+        """Send a single HTTP request through the client session.
+
+        `url` and `headers` replace the API server address and the client headers,
+        e.g. for file links outside of the API server; such requests are not rate limited.
+        """
+        method = method.lower()
+        if method in ['get', 'delete']:
+            kwargs["params"] = params
+        elif method in ['patch', 'post']:
+            kwargs["json"] = params
+        else:
+            raise APIError(f"HTTP method '{method}' is not supported")
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("verify", self.verify_ssl)
+        limited = self.rate_limiter is not None and url is None
+        if limited:
+            self.rate_limiter.acquire(endpoint_class(endpoint))
+        r = self.session.request(
+            method,
+            url or f"{self.apibase}{endpoint}",
+            headers=(self.headers if headers is None else headers) | ext_headers,
+            **kwargs
+        )
+        if limited:
+            self.rate_limiter.update_from_headers(endpoint_class(endpoint), r.headers, r.status_code)
+        return r
+
+    def _send_with_retries(self, method: str, endpoint: str, params: object = {}, ext_headers: dict = {}, throttling: bool = True, retry: int = 1, idempotent: bool = None, **kwargs) -> requests.Response:
+        """Send a request, retrying transient failures according to `retry_policy`
+        and throttled requests according to `throttling` and `retry`.
 
-    def _request(self, endpoint: str = "/api/", params: object = {}, throttling: bool = True, retry: int = 1, method: str = 'get', ext_headers: dict = {}, return_headers: bool = False) -> dict:
+        :raises APIError: HTTP error returned by API
+        :raises ThrottlingError: Request throttled, rate-limit exceeded
+        :raises RequestException: Connection error after all attempts
+        :return: Response with successful status code
+        """
+        policy = self.retry_policy
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                r = self._send(method, endpoint, params=params, ext_headers=ext_headers, **kwargs)
+            except requests.exceptions.RequestException as ex:
+                delay = policy.next_delay(attempt, started, method, idempotent) if policy.is_retryable(error=ex) else None
+                if delay is None:
+                    raise
+                if self.debug:
+                    print(f"Request failed ({ex}), retrying in {delay:.1f} seconds", flush=True)
+                time.sleep(delay)
+                continue
+
+            if policy.is_retryable(status_code=r.status_code):
+                retry_after = r.headers.get('Retry-After')
+                delay = policy.next_delay(attempt, started, method, idempotent,
+                                          retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+                if delay is not None:
+                    if self.debug:
+                        print(f"Server returned {r.status_code}, retrying in {delay:.1f} seconds", flush=True)
+                    r.close()
+                    time.sleep(delay)
+                    continue
+
+            try:
+                check_status_code(response=r, debug=self.debug)
+            except APIError as api_ex:
+                if api_ex.type != "request_was_throttled":
+                    raise api_ex
+                throttling_time = int(r.headers.get('Retry-after', 0))
+                if throttling == True and retry > 0:
+                    if self.debug:
+                        print(f"Throttling request for {throttling_time} seconds", flush=True)
+                    retry -= 1
+                    time.sleep(throttling_time)
+                    continue
+                raise ThrottlingError(retry_after=throttling_time)
+            return r
+
+    def _request(self, endpoint: str = "/api/", params: object = {}, throttling: bool = True, retry: int = 1, method: str = 'get', ext_headers: dict = {}, return_headers: bool = False, idempotent: bool = None, cache_name: str = None) -> dict:
         """Private requests wrapper.
         Sends a request to Netlas API endpoint and process result.
 
@@ -36,85 +166,24 @@ class Netlas:
         :param throttling: Wait and retry request if 429 error (Too many requests) occured, defaults to True
         :param retry: Retry count, defaults to 1
         :param method: HTTP method, defaults to GET
+        :param idempotent: Allow retries of transient failures regardless of HTTP method
+        :param cache_name: Name of the method in `cache` TTLs, the response is not cached if not set
         :raises APIError: Failed to parse JSON response
         :raises APIError: Other HTTP error
-        :raises HTTPError: Error of HTTP
+        :raises RequestException: Connection error after all retry attempts
         :raises ThrottlingError: Request throttled, rate-limit exceeded
         :return: parsed JSON response
         """
         ret: dict = {}
-        try:
-            if method.lower() == 'get':
-                r = requests.get(
-                    f"{self.apibase}{endpoint}",
-                    params=params,
-                    headers=self.headers | ext_headers,
-                    verify=self.verify_ssl,
-                )
-            elif method.lower() == 'patch':
-                r = requests.patch(
-                    f"{self.apibase}{endpoint}",
-                    json=params,
-                    headers=self.headers | ext_headers,
-                    verify=self.verify_ssl,
-                )
-            elif method.lower() == 'delete':
-                r = requests.delete(
-                    f"{self.apibase}{endpoint}",
-                    params=params,
-                    headers=self.headers | ext_headers,
-                    verify=self.verify_ssl,
-                )
-            elif method.lower() == 'post':
-                r = requests.post(
-                    f"{self.apibase}{endpoint}",
-                    json=params,
-                    headers=self.headers | ext_headers,
-                    verify=self.verify_ssl
-                )
-            else:
-                raise APIError(f"HTTP method '{method.lower}' is not supported")
-        except requests.HTTPError as ex:
-            ret["error"] = f"{r.status_code}: {r.reason}"
-            if self.debug:
-                ret["error"] += "\nDescription: " + r.reason
-                ret["error"] += "\nData: " + r.text
-            raise ex
-
-        try:
-            check_status_code(response=r, debug=self.debug, ret=ret)
-        except APIError as api_ex:
-            if api_ex.type == "request_was_throttled":
-                if throttling == True and retry > 0:
-                    throttling_time = int(r.headers.get('Retry-after', 0))
-                    if self.debug:
-                        print(f"Throttling request for {throttling_time} seconds", flush=True)
-                    time.sleep(throttling_time)
-                    return self._request(endpoint=endpoint, params=params, throttling=throttling, retry=retry-1, method=method, return_headers=return_headers)
-                else:
-                    throttling_time = int(r.headers.get('Retry-after', 0))
-                    raise ThrottlingError(retry_after=throttling_time)
-            else:
-                raise api_ex
-        try:
-            content_type = r.headers.get("Content-Type", "")
-            if not r.text:
-                response_data = {}
-            elif "application/x-ndjson" in content_type:
-                response_data = [
-                    json.loads(line)
-                    for line in r.text.splitlines()
-                    if line.strip()
-                ]
-            else:
-                response_data = json.loads(r.text)
-
-        except json.JSONDecodeError:
-            ret["error"] = "Failed to parse response data to JSON"
-            if self.debug:
-                ret["error"] += "\nDescription: " + r.reason
-                ret["error"] += "\nData: " + r.text
-            raise APIError(ret["error"])
+        cache_key = None
+        if cache_name and self.cache is not None and self.cache.ttl(cache_name) > 0:
+            cache_key = self.cache.key(f"{self.apibase} {self.api_key}", endpoint, params)
+            cached = self.cache.get(cache_name, cache_key)
+            if cached is not None:
+                return cached
+        r = self._send_with_retries(method, endpoint, params=params, ext_headers=ext_headers,
+                                    throttling=throttling, retry=retry, idempotent=idempotent)
+        response_data = self._decode(r)
 
         if return_headers:
             return {
@@ -122,8 +191,63 @@ class Netlas:
                 "headers": dict(r.headers),
             }
         ret = response_data
+        if cache_key is not None:
+            self.cache.set(cache_name, cache_key, ret)
         return ret
 
+    def _decode(self, r: requests.Response):
+        """Parse JSON response body.
+
+        :raises APIError: Failed to parse JSON response
+        """
+        try:
+            return decode_response(r.content, r.headers.get("Content-Type", ""))
+        except ValueError:
+            error = "Failed to parse response data to JSON"
+            if self.debug:
+                error += "\nDescription: " + r.reason
+                error += "\nData: " + r.text
+            raise APIError(error)
+
+    def _metadata_request(self, endpoint: str, cache_name: str, offline: bool = False):
+        """GET rarely changing metadata through `metadata_cache`.
+
+        A fresh cached entry is returned without a request, a stale one is revalidated
+        with a conditional request.
+
+        :param endpoint: API endpoint
+        :param cache_name: Name of the method in `cache` TTLs, used when `metadata_cache` is disabled
+        :param offline: Return a cached entry of any age if there is one
+        :return: parsed JSON response
+        """
+        if self.metadata_cache is None:
+            return self._request(endpoint=endpoint, cache_name=cache_name)
+        scope = f"{self.apibase} {self.api_key}"
+        entry = self.metadata_cache.load(scope, endpoint)
+        if entry is not None and (offline or self.metadata_cache.is_fresh(entry)):
+            return entry["data"]
+        r = self._send_with_retries("get", endpoint, ext_headers=self.metadata_cache.validators(entry))
+        if r.status_code == 304 and entry is not None:
+            return self.metadata_cache.touch(scope, endpoint, entry)["data"]
+        data = self._decode(r)
+        self.metadata_cache.save(scope, endpoint, data, r.headers)
+        return data
+
+    def _open_stream(self, endpoint: str = "/api/", params: object = {}, ext_headers: dict = {}, method: str = 'post', idempotent: bool = True) -> requests.Response:
+        """Open streamed response of Netlas API endpoint.
+        Connection and status errors are retried before any data is read.
+        Compressed transfer is requested, the body is decompressed incrementally while reading.
+
+        :raises APIError: HTTP or connection error
+        :return: Response with unread body, must be closed by caller
+        """
+        ext_headers = {"Accept-Encoding": "gzip, deflate"} | ext_headers
+        try:
+            return self._send_with_retries(method, endpoint, params=params, ext_headers=ext_headers,
+                                           idempotent=idempotent, stream=True, timeout=self.stream_timeout)
+        except requests.exceptions.RequestException as ex:
+            raise APIError(str(ex) or "Unexpected Stream error")
+
     def _stream_request(self, endpoint: str = "/api/", params: object = {}, ext_headers: dict = {}) -> bytes:
         """Private stream requests wrapper.
         Sends a request to Netlas API endpoint and yield data from stream.
@@ -135,26 +259,37 @@ class Netlas:
         :return: Iterator of raw bytes from response
         """
         ret: dict = {}
-        try:
-            with requests.post(
-                f"{self.apibase}{endpoint}",
-                json=params,
-                headers=self.headers | ext_headers,
-                verify=self.verify_ssl,
-                stream=True,
-                timeout=60.0
-            ) as r:
-                check_status_code(response=r, debug=self.debug, ret=ret)
+        with self._open_stream(endpoint=endpoint, params=params, ext_headers=ext_headers) as r:
+            try:
                 for chunk in r.iter_lines():
                     # skip keep-alive chunks
                     if chunk:
                         yield chunk
-        except requests.exceptions.RequestException as ex:
+            except requests.exceptions.RequestException as ex:
+                try:
+                    ret["error"] = str(ex)
+                except:
+                    ret["error"] = "Unexpected Stream error"
+                raise APIError(ret["error"])
+
+    def _stream_chunks(self, endpoint: str = "/api/", params: object = {}, ext_headers: dict = {}, chunk_size: int = 1 << 20, method: str = 'post') -> bytes:
+        """Private stream requests wrapper without line splitting.
+        Sends a request to Netlas API endpoint and yield response body as is.
+
+        :param endpoint: API endpoint
+        :param params: POST parameters for request
+        :param chunk_size: Maximum size of yielded blocks, defaults to 1 MiB
+        :param method: HTTP method, defaults to post
+        :raises APIError: HTTP or connection error
+        :return: Iterator of raw byte blocks from response
+        """
+        with self._open_stream(endpoint=endpoint, params=params, ext_headers=ext_headers, method=method) as r:
             try:
-                ret["error"] = str(ex)
-            except:
-                ret["error"] = "Unexpected Stream error"
-            raise APIError(ret["error"])
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        yield chunk
+            except requests.exceptions.RequestException as ex:
+                raise APIError(str(ex) or "Unexpected Stream error")
 
     def search(
         self,
@@ -182,15 +317,7 @@ class Netlas:
         :raises HTTPError: If an HTTP error occurs during the request.
         :return: Search query result.
         """
-        endpoint = "/api/responses/"
-        if datatype == "cert":
-            endpoint = "/api/certs/"
-        elif datatype == "domain":
-            endpoint = "/api/domains/"
-        elif datatype == "whois-ip":
-            endpoint = "/api/whois_ip/"
-        elif datatype == "whois-domain":
-            endpoint = "/api/whois_domains/"
+        endpoint = datatype_endpoint(datatype, "/")
         ret = self._request(
             endpoint=endpoint,
             params={
@@ -207,6 +334,72 @@ class Netlas:
 
     query = search  # for backward compatibility
 
+    def search_iter(
+        self,
+        query: str,
+        datatype: str = "response",
+        page: int = 0,
+        indices: str = "",
+        fields: str = None,
+        exclude_fields: bool = False,
+        max_results: int = None,
+        prefetch: int = 2,
+        throttling: bool = True,
+        retry: int = 1
+    ):
+        """Iterate over search results page by page.
+
+        While the caller processes the current page, the next `prefetch` pages are
+        requested in background threads. Iteration stops on the first page that is not full.
+
+        :param query: Search query string
+        :param datatype: Data type (choices: response, cert, domain, whois-ip, whois-domain)
+        :param page: First page number
+        :param indices: Comma-separated IDs of selected data indices (can be retrieved by `indices` method)
+        :param fields: Comma-separated list of fields to include/exclude
+        :param exclude_fields: Exclude fields from output (instead include)
+        :param max_results: Maximum number of items to yield, unlimited by default
+        :param prefetch: Number of pages requested ahead, 0 to fetch pages sequentially, defaults to 2
+        :param throttling: Wait and retry request if 429 error (Too many requests) occurred, defaults to True
+        :param retry: Retry count, defaults to 1
+        :raises APIError: If the API response contains an error or cannot be parsed.
+        :raises ThrottlingError: If the request is throttled and retry attempts are exhausted.
+        :return: Iterator of search result items.
+        """
+        page_size = 20
+        last_page = None
+        if max_results is not None:
+            if max_results <= 0:
+                return
+            last_page = page + (max_results - 1) // page_size
+
+        def fetch(page_number):
+            return self.search(query=query, datatype=datatype, page=page_number, indices=indices, fields=fields,
+                               exclude_fields=exclude_fields, throttling=throttling, retry=retry)
+
+        yielded = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(prefetch, 1)) as executor:
+            pending = collections.deque()
+            next_page = page
+            try:
+                while True:
+                    while len(pending) <= prefetch and (last_page is None or next_page <= last_page):
+                        pending.append(executor.submit(fetch, next_page))
+                        next_page += 1
+                    if not pending:
+                        return
+                    items = pending.popleft().result().get("items") or []
+                    for item in items:
+                        yield item
+                        yielded += 1
+                        if max_results is not None and yielded >= max_results:
+                            return
+                    if len(items) < page_size:
+                        return
+            finally:
+                for future in pending:
+                    future.cancel()
+
     def count(
         self,
         query: str,
@@ -227,15 +420,7 @@ class Netlas:
         :raises HTTPError: If an HTTP error occurs during the request.
         :return: JSON object with total count of query string results.
         """
-        endpoint = "/api/responses_count/"
-        if datatype == "cert":
-            endpoint = "/api/certs_count/"
-        elif datatype == "domain":
-            endpoint = "/api/domains_count/"
-        elif datatype == "whois-ip":
-            endpoint = "/api/whois_ip_count/"
-        elif datatype == "whois-domain":
-            endpoint = "/api/whois_domains_count/"
+        endpoint = datatype_endpoint(datatype, "_count/")
         ret = self._request(
             endpoint=endpoint,
             params={
@@ -243,7 +428,8 @@ class Netlas:
                 "indices": indices
             },
             throttling=throttling,
-            retry=retry
+            retry=retry,
+            cache_name="count"
         )
         return ret
 
@@ -271,13 +457,7 @@ class Netlas:
         :raises HTTPError: If an HTTP error occurs during the request.
         :return: JSON object with statistics of responses query string results.
         """
-        endpoint = "/api/responses_facet/"
-        if index_type == 'domain':
-            endpoint = "/api/domains_facet/"
-        elif index_type == 'whois-ip':
-            endpoint = "/api/whois_ip_facet/"
-        elif index_type == 'whois-domain':
-            endpoint = "/api/whois_domains_facet/"
+        endpoint = stat_endpoint(index_type)
         ret = self._request(
             endpoint=endpoint,
             params={
@@ -287,7 +467,8 @@ class Netlas:
                 "indices": indices,
             },
             throttling=throttling,
-            retry=retry
+            retry=retry,
+            cache_name="stat"
         )
         return ret
 
@@ -346,10 +527,70 @@ class Netlas:
                 "source_type": "exclude" if exclude_fields else "include"
             },
             throttling=throttling,
-            retry=retry
+            retry=retry,
+            cache_name="host"
         )
         return ret
 
+    def host_many(
+        self,
+        hosts,
+        workers: int = 8,
+        fields: str = None,
+        exclude_fields: bool = False,
+        ordered: bool = False,
+        rate_limit: float = None,
+        throttling: bool = True,
+        retry: int = 1
+    ):
+        """Get full information about many hosts concurrently.
+
+        Lookups run on a pool of `workers` threads sharing the client connection pool,
+        so keep `workers` not greater than `pool_maxsize`. `hosts` may be any iterable
+        (including a generator), only a bounded number of lookups is in flight at once.
+
+        :param hosts: Iterable of IP or domain strings
+        :param workers: Number of concurrent lookups, defaults to 8
+        :param fields: Comma-separated output fields. If empty, it will output all data.
+        :param exclude_fields: Exclude fields from output (instead include)
+        :param ordered: Yield results in input order instead of completion order, defaults to False
+        :param rate_limit: Maximum lookups per second shared by all workers, in addition to the client `rate_limiter`
+        :param throttling: Wait and retry request if 429 error (Too many requests) occurred, defaults to True
+        :param retry: Retry count, defaults to 1
+        :return: Iterator of `(host, result)` tuples, `result` is an exception if the lookup failed.
+        """
+        bucket = TokenBucket(rate_limit) if rate_limit else None
+
+        def lookup(host):
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                return host, self.host(host=host, fields=fields, exclude_fields=exclude_fields,
+                                       throttling=throttling, retry=retry)
+            except (APIError, ThrottlingError, requests.RequestException) as ex:
+                return host, ex
+
+        max_pending = max(workers, 1) * 2
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+            for host in hosts:
+                pending.append(executor.submit(lookup, host))
+                if len(pending) < max_pending:
+                    continue
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    done, not_done = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    pending = collections.deque(not_done)
+                    for future in done:
+                        yield future.result()
+            if ordered:
+                for future in pending:
+                    yield future.result()
+            else:
+                for future in concurrent.futures.as_completed(pending):
+                    yield future.result()
+
     def download(
         self,
         query: str,
@@ -372,15 +613,7 @@ class Netlas:
         :raises HTTPError: If an HTTP error occurs during the request.
         :return: Iterator of raw data.
         """
-        endpoint = "/api/responses/download/"
-        if datatype == "cert":
-            endpoint = "/api/certs/download/"
-        elif datatype == "domain":
-            endpoint = "/api/domains/download/"
-        elif datatype == "whois-ip":
-            endpoint = "/api/whois_ip/download/"
-        elif datatype == "whois-domain":
-            endpoint = "/api/whois_domains/download/"
+        endpoint = datatype_endpoint(datatype, "/download/")
 
         if fields == None:  # for non-params cli download
             fields = "*"
@@ -398,6 +631,51 @@ class Netlas:
         ):
             yield ret
 
+    def download_raw(
+        self,
+        query: str,
+        fields: str = None,
+        exclude_fields: bool = False,
+        datatype: str = "response",
+        size: int = 10,
+        indices: str = "",
+        chunk_size: int = 1 << 20,
+    ) -> bytes:
+        """Download data from Netlas as raw NDJSON blocks.
+
+        Unlike `download`, the stream is not split into documents, so blocks can be
+        written to disk as is. Use `netlas.download.copy_chunks` to write and count documents.
+
+        :param query: Search query string
+        :param fields: Comma-separated list of fields to include/exclude
+        :param exclude_fields: Exclude fields from output (instead include)
+        :param datatype: Data type (choices: response, cert, domain, whois-ip, whois-domain)
+        :param size: Number of documents to download
+        :param indices: Comma-separated IDs of selected data indices (can be retrieved by `indices` method)
+        :param chunk_size: Maximum size of yielded blocks, defaults to 1 MiB
+        :raises APIError: If the API response contains an error or cannot be parsed.
+        :raises ThrottlingError: If the request is throttled and retry attempts are exhausted.
+        :return: Iterator of raw byte blocks.
+        """
+        endpoint = datatype_endpoint(datatype, "/download/")
+
+        if fields == None:  # for non-params cli download
+            fields = "*"
+
+        for ret in self._stream_chunks(
+            endpoint=endpoint,
+            params={
+                "q": query,
+                "size": size,
+                "indices": indices,
+                "raw": True,
+                "fields": fields,
+                "source_type": "exclude" if exclude_fields else "include",
+            },
+            chunk_size=chunk_size,
+        ):
+            yield ret
+
     def download_all(
         self,
         query: str,
@@ -418,15 +696,7 @@ class Netlas:
         :raises HTTPError: If an HTTP error occurs during the request.
         :return: Iterator of raw data.
         """
-        endpoint = "/api/responses/download/"
-        if datatype == "cert":
-            endpoint = "/api/certs/download/"
-        elif datatype == "domain":
-            endpoint = "/api/domains/download/"
-        elif datatype == "whois-ip":
-            endpoint = "/api/whois_ip/download/"
-        elif datatype == "whois-domain":
-            endpoint = "/api/whois_domains/download/"
+        endpoint = datatype_endpoint(datatype, "/download/")
 
         if fields == None:  # for non-params cli download
             fields = "*"
@@ -454,6 +724,112 @@ class Netlas:
                 "error": "No data is available"
             })
 
+    def download_all_to_file(
+        self,
+        path: str,
+        query: str,
+        fields: str = None,
+        exclude_fields: bool = False,
+        datatype: str = "response",
+        indices: str = "",
+        checkpoint: str = None,
+        on_progress=None,
+        partitions: list = None,
+        parallel: int = 1,
+        compress: str = "auto",
+        compress_level: int = None,
+    ) -> int:
+        """Download all available data for a given query to NDJSON file.
+
+        The query is split into partitions (IPv4 ranges for responses by default, see
+        `netlas.download.ip_partitions`, `index_partitions` and `time_partitions`)
+        downloaded over `parallel` connections. With `checkpoint`, progress is saved after
+        each partition and a repeated call with the same arguments continues an interrupted
+        download instead of starting over.
+
+        :param path: Output file path
+        :param query: Search query string
+        :param fields: Comma-separated list of fields to include/exclude
+        :param exclude_fields: Exclude fields from output (instead include)
+        :param datatype: Data type (choices: response, cert, domain, whois-ip, whois-domain)
+        :param indices: Comma-separated IDs of selected data indices (can be retrieved by `indices` method)
+        :param checkpoint: Checkpoint file path, e.g. `f"{path}.checkpoint"`
+        :param on_progress: Callback `on_progress(partition_key, docs)` called with number of newly written documents
+        :param partitions: Custom list of disjoint partitions (`key`, `query` and optional `indices`)
+        :param parallel: Number of concurrent partition downloads, keep it not greater than `pool_maxsize`, defaults to 1
+        :param compress: Output compression: gzip, zstd, lz4, None, or `auto` to choose by file extension (.gz, .zst, .lz4)
+        :param compress_level: Compression level, codec default if None
+        :raises APIError: If the API response contains an error or cannot be parsed.
+        :return: Number of downloaded documents.
+        """
+        from netlas.download import PartitionedDownload, detect_compression
+
+        if fields == None:  # for non-params cli download
+            fields = "*"
+        if compress == "auto":
+            compress = detect_compression(path)
+        job = PartitionedDownload(self, query=query, fields=fields, exclude_fields=exclude_fields,
+                                  datatype=datatype, indices=indices, checkpoint=checkpoint,
+                                  partitions=partitions, parallel=parallel,
+                                  compress=compress, compress_level=compress_level)
+        return job.run(path, on_progress=on_progress)
+
+    def download_to_parquet(
+        self,
+        path: str,
+        query: str,
+        fields: str = None,
+        exclude_fields: bool = False,
+        datatype: str = "response",
+        size: int = None,
+        indices: str = "",
+        row_group_size: int = 50000,
+        compression: str = "zstd",
+        on_progress=None,
+    ) -> int:
+        """Download data and write it to Parquet file.
+
+        Columns are top-level document fields typed by `mapping` of the data type
+        (nested objects are stored as JSON strings). Documents are written in row groups,
+        so memory use is bounded by `row_group_size`. Requires `pyarrow`. If a field turns
+        out to be multi-valued after the first row group, the rest of the documents go to
+        `<name>.1.parquet` (see `netlas.export.ParquetExport`).
+
+        :param path: Output Parquet file path
+        :param query: Search query string
+        :param fields: Comma-separated list of fields to include/exclude
+        :param exclude_fields: Exclude fields from output (instead include)
+        :param datatype: Data type (choices: response, cert, domain, whois-ip, whois-domain)
+        :param size: Number of documents to download, all available data if None
+        :param indices: Comma-separated IDs of selected data indices (can be retrieved by `indices` method)
+        :param row_group_size: Rows per Parquet row group, defaults to 50000
+        :param compression: Parquet codec (zstd, gzip, lz4, snappy, none), defaults to zstd
+        :param on_progress: Callback `on_progress(docs)` called with number of newly written documents
+        :raises APIError: If the API response contains an error or cannot be parsed.
+        :return: Number of written documents.
+        """
+        from netlas.export import ParquetExport, mapping_columns
+
+        try:
+            columns = mapping_columns(self.mapping(datatype=datatype, is_facet=False),
+                                      fields=fields, exclude_fields=exclude_fields) or None
+        except APIError:
+            columns = None  # infer schema from documents
+        if size is None:
+            docs = self.download_all(query=query, fields=fields, exclude_fields=exclude_fields,
+                                     datatype=datatype, indices=indices)
+        else:
+            docs = self.download(query=query, fields=fields, exclude_fields=exclude_fields,
+                                 datatype=datatype, size=size, indices=indices)
+        with ParquetExport(path, columns=columns, row_group_size=row_group_size, compression=compression) as export:
+            for doc in docs:
+                export.write(doc)
+                if on_progress and export.count % 1000 == 0:
+                    on_progress(1000)
+            if on_progress and export.count % 1000:
+                on_progress(export.count % 1000)
+        return export.count
+
     def indices(self) -> list:
         """Get available data indices.
 
@@ -462,7 +838,7 @@ class Netlas:
         :return: List of available indices.
         """
         endpoint = "/api/indices/"
-        ret = self._request(endpoint=endpoint)
+        ret = self._metadata_request(endpoint=endpoint, cache_name="indices")
         return ret
 
     def datasets(self) -> list:
@@ -473,7 +849,7 @@ class Netlas:
         :return: List of available datasets with full information.
         """
         endpoint = "/api/datastore/products/"
-        ret = self._request(endpoint=endpoint)
+        ret = self._request(endpoint=endpoint, cache_name="datasets")
         return ret
 
     def dataset_info(self, id) -> list:
@@ -484,7 +860,7 @@ class Netlas:
         :return: JSON object containing information about dataset.
         """
         endpoint = f"/api/datastore/products/{id}/"
-        ret = self._request(endpoint=endpoint)
+        ret = self._request(endpoint=endpoint, cache_name="dataset_info")
         return ret
 
     def get_dataset_link(self, id) -> list:
@@ -499,6 +875,89 @@ class Netlas:
         ret = self._request(endpoint=endpoint)
         return ret
 
+    def download_dataset(
+        self,
+        id,
+        path: str = None,
+        parallel: int = 4,
+        segment_size: int = 64 << 20,
+        checksum: str = None,
+        on_progress=None,
+    ) -> str:
+        """Download a dataset file by its ID.
+
+        The file is fetched in segments over `parallel` HTTP Range requests into a
+        preallocated `<path>.partial` file, see `netlas.datastore.DatasetDownload`.
+        An interrupted download continues from completed segments on the next call.
+
+        :param id: Dataset ID
+        :param path: Output file or directory path, the dataset file name in the current directory by default
+        :param parallel: Number of concurrent Range requests, defaults to 4
+        :param segment_size: Segment size in bytes, defaults to 64 MiB
+        :param checksum: Expected checksum `algorithm:hexdigest`, by default taken from the link response
+                         or file server headers; the file is not verified if none is known
+        :param on_progress: Callback `on_progress(completed, total)` with byte counts
+        :raises APIError: Download failed or checksum mismatch (type `checksum_mismatch`)
+        :return: Path of the downloaded file.
+        """
+        from netlas.datastore import DatasetDownload, dataset_file_name
+
+        link = self.get_dataset_link(id=id)
+        url = link.get("link") or link.get("url") if isinstance(link, dict) else None
+        if not url:
+            raise APIError(f"No download link for dataset {id}", "dataset_download_error")
+        if path is None or os.path.isdir(path):
+            path = os.path.join(path or "", dataset_file_name(link, url))
+        if checksum is None:
+            for algorithm in ["sha256", "sha1", "md5"]:
+                if link.get(algorithm):
+                    checksum = f"{algorithm}:{link[algorithm]}"
+                    break
+            else:
+                checksum = link.get("checksum")
+        headers, verify = {}, True
+        if url.startswith("/"):
+            # link to the API server itself, the API key must not leak to external file hosts
+            url, headers, verify = f"{self.apibase}{url}", self.headers, self.verify_ssl
+        job = DatasetDownload(self, url, path, headers=headers, verify=verify, parallel=parallel,
+                              segment_size=segment_size, checksum=checksum, retry_policy=self.retry_policy,
+                              timeout=self.stream_timeout)
+        return job.run(on_progress=on_progress)
+
+    def sync_datastore(
+        self,
+        directory: str,
+        ids: list = None,
+        parallel: int = 2,
+        segment_parallel: int = 4,
+        prune: bool = False,
+        verify: bool = False,
+        dry_run: bool = False,
+        on_progress=None,
+        on_complete=None,
+    ) -> dict:
+        """Mirror datastore products to a local directory, fetching only new and changed datasets.
+
+        See `netlas.datastore.DatastoreSync` for the directory layout and manifest.
+
+        :param directory: Local mirror directory
+        :param ids: Dataset IDs to hold, all available datasets by default
+        :param parallel: Number of datasets downloaded concurrently, defaults to 2
+        :param segment_parallel: Number of concurrent Range requests per dataset, defaults to 4
+        :param prune: Remove datasets that are no longer available or selected, defaults to False
+        :param verify: Re-hash held files and download again on mismatch, defaults to False
+        :param dry_run: Only report what would be done
+        :param on_progress: Callback `on_progress(id, completed, total)` with byte counts
+        :param on_complete: Callback `on_complete(id, entry_or_exception)` called when a dataset is done
+        :raises APIError: Failed to list datasets
+        :return: `{"downloaded", "unchanged", "pruned", "failed"}`
+        """
+        from netlas.datastore import DatastoreSync
+
+        job = DatastoreSync(self, directory, ids=ids, parallel=parallel, segment_parallel=segment_parallel,
+                            prune=prune, verify=verify)
+        return job.run(dry_run=dry_run, on_progress=on_progress, on_complete=on_complete)
+
     def scans(self) -> list:
         endpoint = "/api/scanner/"
         ret = self._request(endpoint=endpoint)
@@ -553,6 +1012,268 @@ class Netlas:
         ret = self._request(endpoint=endpoint, method='get')
         return ret
 
+    def scan_report_raw(self, id: int, chunk_size: int = 1 << 20) -> bytes:
+        """Download scan report as raw JSON blocks, without loading it into memory.
+
+        :param id: Scan ID
+        :param chunk_size: Maximum size of yielded blocks, defaults to 1 MiB
+        :raises APIError: If the API response contains an error.
+        :return: Iterator of raw byte blocks.
+        """
+        endpoint = f"/api/scanner/{id}/report"
+        yield from self._stream_chunks(endpoint=endpoint, chunk_size=chunk_size, method='get')
+
+    def scan_report_iter(self, id: int, key: str = None, chunk_size: int = 1 << 20):
+        """Iterate over scan report records while downloading.
+
+        Records are the elements of the report array, or of its member `key` if the report
+        is an object (the first array member by default), see `netlas.jsonlib.iter_json_array`.
+        Memory use is bounded by the largest record.
+
+        :param id: Scan ID
+        :param key: Report member with records, if the report is an object
+        :param chunk_size: Maximum size of downloaded blocks, defaults to 1 MiB
+        :raises APIError: If the API response contains an error or cannot be parsed.
+        :return: Iterator of records.
+        """
+        try:
+            yield from jsonlib.iter_json_array(self.scan_report_raw(id, chunk_size=chunk_size), key=key)
+        except ValueError as ex:
+            raise APIError(f"Failed to parse scan report: {ex}")
+
+    def scan_report_to_file(
+        self,
+        id: int,
+        output,
+        format: str = "json",
+        key: str = None,
+        compress: str = "auto",
+        compress_level: int = None,
+        on_progress=None,
+    ) -> int:
+        """Download scan report to file, streaming it through without loading into memory.
+
+        :param id: Scan ID
+        :param output: Output file path or binary file object
+        :param format: `json` to write the report as is, or `ndjson` to write one record per line
+        :param key: Report member with records for `ndjson`, if the report is an object
+        :param compress: Output compression: gzip, zstd, lz4, None, or `auto` to choose by file extension (.gz, .zst, .lz4)
+        :param compress_level: Compression level, codec default if None
+        :param on_progress: Callback `on_progress(size)` called with number of newly downloaded bytes
+        :raises APIError: If the API response contains an error or cannot be parsed.
+        :return: Number of written records for `ndjson`, of downloaded bytes for `json`.
+        """
+        from netlas.download import compress_writer, detect_compression
+
+        if format not in ["json", "ndjson"]:
+            raise APIError(f"Unknown report format '{format}'")
+        if compress == "auto":
+            compress = detect_compression(output) if isinstance(output, str) else None
+        output_file = open(output, "wb") if isinstance(output, str) else output
+        writer = compress_writer(output_file, compress, compress_level) if compress else output_file
+        received = 0
+
+        def chunks():
+            nonlocal received
+            for chunk in self.scan_report_raw(id):
+                received += len(chunk)
+                if on_progress:
+                    on_progress(len(chunk))
+                yield chunk
+
+        try:
+            if format == "json":
+                for chunk in chunks():
+                    writer.write(chunk)
+                return received
+            records = 0
+            try:
+                for record in jsonlib.iter_json_array(chunks(), key=key):
+                    writer.write(jsonlib.dumps(record).encode() + b"\n")
+                    records += 1
+            except ValueError as ex:
+                raise APIError(f"Failed to parse scan report: {ex}")
+            return records
+        finally:
+            if writer is not output_file:
+                writer.close()
+            if output_file is not output:
+                output_file.close()
+
+    def _map_ordered(self, func, items, workers: int):
+        """Apply `func` to `items` on a thread pool.
+
+        :return: Iterator of `(item, result)` tuples in input order, `result` is an exception if the call failed.
+        """
+        def call(item):
+            try:
+                return item, func(item)
+            except (APIError, ThrottlingError, requests.RequestException) as ex:
+                return item, ex
+
+        max_pending = max(workers, 1) * 2
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            pending = collections.deque()
+            for item in items:
+                pending.append(executor.submit(call, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            for future in pending:
+                yield future.result()
+
+    def scan_create_many(self, targets, name: str, chunk_size: int = 1000, workers: int = 4):
+        """Create scans for any number of targets, split into scans of at most `chunk_size` targets.
+
+        Scans get `name` if there is a single chunk, otherwise `name (N/M)`.
+
+        :param targets: List or comma-separated string of targets
+        :param name: Name of new scans
+        :param chunk_size: Maximum number of targets in one scan, defaults to 1000
+        :param workers: Number of concurrent requests, defaults to 4
+        :return: Iterator of `(targets, result)` tuples, `result` is an exception if the scan was not created.
+        """
+        if isinstance(targets, str):
+            targets = targets.split(",")
+        targets = [t.strip() for t in targets if t.strip()]
+        chunk_size = max(int(chunk_size), 1)
+        chunks = [targets[i:i + chunk_size] for i in range(0, len(targets), chunk_size)]
+
+        def create(item):
+            index, chunk = item
+            chunk_name = name if len(chunks) == 1 else f"{name} ({index}/{len(chunks)})"
+            return self.scan_create(targets=",".join(chunk), name=chunk_name)
+
+        for (_, chunk), result in self._map_ordered(create, enumerate(chunks, 1), workers):
+            yield chunk, result
+
+    def scan_get_many(self, ids, workers: int = 8):
+        """Get info about many scans concurrently.
+
+        :param ids: Iterable of scan IDs
+        :param workers: Number of concurrent requests, defaults to 8
+        :return: Iterator of `(id, result)` tuples in input order, `result` is an exception if the request failed.
+        """
+        return self._map_ordered(lambda id: self.scan_get(id=id), ids, workers)
+
+    def scan_report_many(self, ids, workers: int = 4):
+        """Get reports of many scans concurrently.
+
+        :param ids: Iterable of scan IDs
+        :param workers: Number of concurrent requests, defaults to 4
+        :return: Iterator of `(id, report)` tuples in input order, `report` is an exception if the request failed.
+        """
+        return self._map_ordered(lambda id: self.get_scan_report(id=id), ids, workers)
+
+    def scan_priority_many(self, shifts, workers: int = 1):
+        """Change priority of many scans.
+
+        Priority shifts move scans in the queue relative to each other, so by default they
+        are applied one by one in the given order, reusing a single keep-alive connection.
+
+        :param shifts: Dict `{id: shift}` or iterable of `(id, shift)` tuples
+        :param workers: Number of concurrent requests, defaults to 1
+        :return: Iterator of `((id, shift), result)` tuples in input order, `result` is an exception if the request failed.
+        """
+        if isinstance(shifts, dict):
+            shifts = shifts.items()
+        return self._map_ordered(lambda item: self.scan_priority(id=item[0], shift=item[1]), shifts, workers)
+
+    SCAN_DONE = ["done", "finished", "completed", "success"]
+    SCAN_FAILED = ["failed", "error", "cancelled", "canceled", "stopped"]
+
+    def wait_scans(
+        self,
+        ids,
+        timeout: float = None,
+        on_complete=None,
+        reports: bool = False,
+        cancel=None,
+        min_interval: float = 2.0,
+        max_interval: float = 60.0,
+        backoff: float = 1.5,
+    ) -> dict:
+        """Wait until scans are finished.
+
+        All scans are tracked with one `scans` request per tick (following its pages)
+        instead of a `scan_get` per scan; only scans missing from the list are checked
+        with `scan_get`. The tick interval starts at `min_interval`, grows by `backoff`
+        while nothing changes and drops back when any tracked scan changes.
+
+        :param ids: Iterable of scan IDs
+        :param timeout: Maximum wait in seconds, unlimited by default
+        :param on_complete: Callback `on_complete(id, scan, report)` called as soon as a scan is finished or failed,
+                            `scan` is None if the scan no longer exists
+        :param reports: Get reports of finished scans for `on_complete`, `report` is None otherwise
+        :param cancel: `threading.Event`, waiting stops as soon as it is set
+        :param min_interval: Shortest delay between ticks in seconds, defaults to 2.0
+        :param max_interval: Longest delay between ticks in seconds, defaults to 60.0
+        :param backoff: Growth factor of the delay while nothing changes, defaults to 1.5
+        :raises APIError: Timed out (type `scan_timeout`) or cancelled (`scan_cancelled`)
+        :return: Final scan info by ID
+        """
+        pending = {str(scan_id): scan_id for scan_id in ids}
+        finished = {}
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        interval = min_interval
+        last_states = {}
+        while pending:
+            if cancel is not None and cancel.is_set():
+                raise APIError("Scan wait cancelled", "scan_cancelled")
+            by_id = self._scans_by_id()
+
+            changed = False
+            for key in list(pending):
+                scan = by_id.get(key)
+                if scan is None:
+                    try:
+                        scan = self.scan_get(id=pending[key])
+                    except APIError:
+                        scan = None  # deleted, `scan_get` has already retried transient errors
+                state = None if scan is None else (scan.get("status"), scan.get("progress"))
+                if last_states.get(key, ()) != state:
+                    changed = True
+                    last_states[key] = state
+                status = str((scan or {}).get("status") or "").lower()
+                if scan is not None and status not in self.SCAN_DONE and status not in self.SCAN_FAILED:
+                    continue
+                scan_id = pending.pop(key)
+                finished[scan_id] = scan
+                if on_complete is not None:
+                    report = None
+                    if reports and status in self.SCAN_DONE:
+                        report = self.get_scan_report(id=scan_id)
+                    on_complete(scan_id, scan, report)
+            if not pending:
+                break
+
+            interval = min_interval if changed else min(max_interval, interval * backoff)
+            delay = interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise APIError(f"Scans {', '.join(pending)} are not finished in {timeout} seconds", "scan_timeout")
+                delay = min(delay, remaining)
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
+        return finished
+
+    def _scans_by_id(self) -> dict:
+        """All scans by string ID, following `next` links of a paginated `scans` response."""
+        by_id = {}
+        page = self.scans()
+        while True:
+            next_page = None
+            if isinstance(page, dict):
+                next_page = page.get("next")
+                page = page.get("results") or page.get("items") or []
+            by_id.update((str(scan.get("id")), scan) for scan in page if isinstance(scan, dict))
+            if not next_page:
+                return by_id
+            parts = urllib.parse.urlsplit(next_page)
+            page = self._request(endpoint=parts.path + (f"?{parts.query}" if parts.query else ""))
+
     def mapping(self, datatype: str, is_facet: bool):
         """Get mapping of facet or default search.
 
@@ -560,20 +1281,31 @@ class Netlas:
         :raises HTTPError: If an HTTP error occurs during the request.
         :return: JSON object with all mapping for default search or facet.
         """
-        if datatype == 'response':
-            datatype = 'responses'
-        elif datatype == 'domain':
-            datatype = 'domains'
-        elif datatype == 'whois-domain':
-            datatype = 'whois_domains'
-        elif datatype == 'whois-ip':
-            datatype = 'whois_ip'
-        endpoint = f"/api/mapping/{datatype}/"
-        if is_facet == True:
-            endpoint = f"/api/mapping/{datatype}/facet/"
-        ret = self._request(endpoint=endpoint, method='get')
+        endpoint = mapping_endpoint(datatype, is_facet)
+        ret = self._metadata_request(endpoint=endpoint, cache_name="mapping")
         return ret
 
+    def unknown_fields(self, fields: str, datatype: str = "response") -> list:
+        """Check field names against the mapping of `datatype`.
+
+        With `metadata_cache` enabled, a previously cached mapping is used as is,
+        so repeated checks need no requests.
+
+        :param fields: Comma-separated list of fields, `*` wildcards are allowed
+        :param datatype: Data type (choices: response, cert, domain, whois-ip, whois-domain)
+        :raises APIError: If the mapping cannot be retrieved.
+        :return: Fields that match nothing in the mapping.
+        """
+        from netlas.export import mapping_fields
+
+        known = mapping_fields(self._metadata_request(endpoint=mapping_endpoint(datatype, False),
+                                                      cache_name="mapping", offline=True))
+        unknown = []
+        for field in [f.strip() for f in (fields or "").split(",") if f.strip()]:
+            if not any(fnmatch.fnmatchcase(path, field) or path.startswith(f"{field}.") for path in known):
+                unknown.append(field)
+        return unknown
+
     def discovery_node_count(self, node_type, node_value):
         params = {
             "node_type": node_type,
@@ -589,7 +1321,46 @@ class Netlas:
         }
         return ret
 
-    def discovery_node_result(self, x_count_id, node_type, node_value, search_field_id):
+    def _discovery_stream(self, endpoint: str, params: dict, ext_headers: dict) -> dict:
+        """Open streamed discovery result.
+
+        Response headers are read immediately, records are decoded one NDJSON line at a time
+        while `data` is iterated, so memory use does not depend on the result size.
+
+        :raises APIError: HTTP or connection error
+        :return: `{"x_stream_id": ..., "data": iterator of records}`, the connection is
+                 released when `data` is exhausted or closed
+        """
+        r = self._open_stream(endpoint=endpoint, params=params, ext_headers=ext_headers, method='post', idempotent=False)
+        headers = {k.lower(): v for k, v in r.headers.items()}
+
+        def records():
+            with r:
+                try:
+                    if "application/x-ndjson" in headers.get("content-type", ""):
+                        yield from jsonlib.iter_ndjson_lines(r.iter_lines(chunk_size=1 << 16))
+                        return
+                    data = self._decode(r)
+                    if isinstance(data, list):
+                        yield from data
+                    elif data:
+                        yield data
+                except requests.exceptions.RequestException as ex:
+                    raise APIError(str(ex) or "Unexpected Stream error")
+                except ValueError:
+                    raise APIError("Failed to parse response data to JSON")
+
+        return {
+            "x_stream_id": headers.get("x-stream-id"),
+            "data": records(),
+        }
+
+    def discovery_node_result(self, x_count_id, node_type, node_value, search_field_id, stream: bool = False):
+        """Get discovery search results for a node.
+
+        :param stream: Return records as an iterator decoded while they arrive instead of a list
+        :return: `{"x_stream_id": ..., "data": records}`
+        """
         params = {
             "node_type": node_type,
             "node_value": node_value,
@@ -599,6 +1370,8 @@ class Netlas:
         header = {
             'X-Count-Id': x_count_id
         }
+        if stream:
+            return self._discovery_stream(endpoint, params, header)
         resp = self._request(endpoint=endpoint, params=params, method='post', ext_headers=header, return_headers=True)
         headers = {k.lower(): v for k, v in resp.get("headers", {}).items()}
         ret = {
@@ -625,7 +1398,12 @@ class Netlas:
         }
         return ret
 
-    def discovery_group_result(self, x_count_id, node_type, node_value, search_field_id):
+    def discovery_group_result(self, x_count_id, node_type, node_value, search_field_id, stream: bool = False):
+        """Get discovery search results for a group of nodes.
+
+        :param stream: Return records as an iterator decoded while they arrive instead of a list
+        :return: `{"x_stream_id": ..., "data": records}`
+        """
         if isinstance(node_value, str):
             node_value = [v.strip() for v in node_value.split(",") if v.strip()]
 
@@ -638,6 +1416,8 @@ class Netlas:
             "X-Count-Id": x_count_id
         }
         endpoint = "/api/discovery/group_of_nodes_result/"
+        if stream:
+            return self._discovery_stream(endpoint, params, header)
         resp = self._request(endpoint=endpoint, params=params, method="post", ext_headers=header, return_headers=True)
         headers = {k.lower(): v for k, v in resp.get("headers", {}).items()}
         ret = {
@@ -650,3 +1430,133 @@ class Netlas:
         endpoint = f"/api/discovery/status/{x_stream_id}/"
         ret = self._request(endpoint=endpoint)
         return ret
+
+    def discovery_batch(
+        self,
+        seeds,
+        search_field_ids: list = None,
+        chunk_size: int = 100,
+        workers: int = 4,
+        timeout: float = None,
+    ):
+        """Run discovery for many seed nodes, see :class:`netlas.discovery.DiscoveryBatch`.
+
+        :param seeds: Iterable of `(node_type, node_value)` tuples, duplicates are skipped
+        :param search_field_ids: IDs of searches to run for every chunk, by default all searches with results
+        :param chunk_size: Maximum number of node values in one group request, defaults to 100
+        :param workers: Number of chunks processed concurrently, defaults to 4
+        :param timeout: Maximum wait in seconds for each discovery stage, unlimited by default
+        :return: Iterator of `(node_type, node_values, search_field_id, record)` tuples in completion order,
+                 `record` is an exception (and `search_field_id` None) if a chunk failed
+        """
+        from netlas.discovery import DiscoveryBatch
+
+        batch = DiscoveryBatch(self, seeds, search_field_ids=search_field_ids, chunk_size=chunk_size,
+                               workers=workers, timeout=timeout)
+        return batch.run()
+
+    def discovery_crawl(
+        self,
+        seeds,
+        max_depth: int = 2,
+        fanout: dict = None,
+        max_fanout: int = 100,
+        max_nodes: int = None,
+        follow: list = None,
+        extract=None,
+        state: str = None,
+        workers: int = 4,
+        timeout: float = None,
+        checkpoint_interval: float = 30.0,
+    ):
+        """Expand discovery results breadth-first into new nodes, see :class:`netlas.discovery.DiscoveryCrawler`.
+
+        :param seeds: Iterable of `(node_type, node_value)` tuples
+        :param max_depth: Nodes deeper than this are not expanded, defaults to 2
+        :param fanout: Maximum new nodes queued from one node, by node type of that node, e.g. `{"asn": 10}`
+        :param max_fanout: Fan-out limit of node types missing in `fanout`, defaults to 100
+        :param max_nodes: Maximum number of expanded nodes, unlimited by default
+        :param follow: Node types to queue, all types by default
+        :param extract: Callable returning `(node_type, node_value)` tuples found in a record,
+                        defaults to `netlas.discovery.extract_nodes`
+        :param state: Crawl state file path, an existing state is resumed
+        :param workers: Number of nodes expanded concurrently, defaults to 4
+        :param timeout: Maximum wait in seconds for each discovery stage, unlimited by default
+        :param checkpoint_interval: Minimum seconds between state file writes, defaults to 30
+        :return: Iterator of `(node_type, node_value, depth, search_field_id, record)` tuples,
+                 `record` is an exception (and `search_field_id` None) if the node failed
+        """
+        from netlas.discovery import DiscoveryCrawler, extract_nodes
+
+        crawler = DiscoveryCrawler(self, seeds, max_depth=max_depth, fanout=fanout, max_fanout=max_fanout,
+                                   max_nodes=max_nodes, follow=follow, extract=extract or extract_nodes, state=state,
+                                   workers=workers, timeout=timeout, checkpoint_interval=checkpoint_interval)
+        return crawler.run()
+
+    DISCOVERY_DONE = ["done", "completed", "success", "finished"]
+    DISCOVERY_FAILED = ["failed", "error"]
+
+    def wait_discovery(
+        self,
+        x_stream_id: str,
+        timeout: float = None,
+        deadline: float = None,
+        on_progress=None,
+        cancel=None,
+        min_interval: float = 0.5,
+        max_interval: float = 5.0,
+        backoff: float = 1.5,
+    ) -> dict:
+        """Wait until a discovery stage (`x_stream_id` of count or result requests) is finished.
+
+        Polling is adaptive: it starts at `min_interval` when the stage starts and the
+        interval grows by `backoff` while the progress stays the same, so long stages cost
+        few status requests. The interval never drops below `min_interval`, many stages
+        waited for in parallel do not poll faster than a fixed interval would.
+
+        :param x_stream_id: Stream ID returned by discovery count/result methods
+        :param timeout: Maximum wait in seconds from now, unlimited by default
+        :param deadline: Absolute `time.time()` limit, e.g. shared by several stages
+        :param on_progress: Callback `on_progress(percentage, message, status)` called when the progress changes
+        :param cancel: `threading.Event`, waiting stops as soon as it is set
+        :param min_interval: Shortest delay between status requests in seconds, defaults to 0.5
+        :param max_interval: Longest delay between status requests in seconds, defaults to 5.0
+        :param backoff: Growth factor of the delay while the progress does not change, defaults to 1.5
+        :raises APIError: Stage failed (type `discovery_failed`), timed out (`discovery_timeout`)
+                          or was cancelled (`discovery_cancelled`)
+        :return: Final status data
+        """
+        if timeout is not None:
+            deadline = min(deadline, time.time() + timeout) if deadline is not None else time.time() + timeout
+        interval = min_interval
+        last_percentage = None
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise APIError("Discovery wait cancelled", "discovery_cancelled")
+            status_data = self.discovery_status(x_stream_id=x_stream_id).get("data") or {}
+            percentage = status_data.get("percentage", 0) or 0
+            message = status_data.get("message", "Processing")
+            status = (status_data.get("status") or "").lower()
+
+            if percentage != last_percentage:
+                if on_progress is not None:
+                    on_progress(percentage, message, status_data)
+                last_percentage = percentage
+            else:
+                interval = min(max_interval, interval * backoff)
+
+            if status in self.DISCOVERY_DONE or percentage >= 100:
+                return status_data
+            if status in self.DISCOVERY_FAILED:
+                raise APIError(message, "discovery_failed")
+
+            delay = interval
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise APIError(f"Discovery stage {x_stream_id} timed out at {percentage}%", "discovery_timeout")
+                delay = min(delay, remaining)
+            if cancel is not None:
+                cancel.wait(delay)
+            else:
+                time.sleep(delay)
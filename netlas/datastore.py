@@ -0,0 +1,519 @@
+import base64
+import binascii
+import concurrent.futures
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+import warnings
+
+import requests
+
+from netlas.exception import APIError
+from netlas.retry import RetryPolicy
+
+CHECKSUM_ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+
+def parse_checksum(value: str) -> tuple:
+    """Split checksum `algorithm:hexdigest` (e.g. `sha256:9f86d0...`) into a pair.
+
+    The algorithm of a bare hex digest is guessed by its length.
+
+    :raises APIError: Unknown algorithm or malformed digest
+    """
+    algorithm, _, digest = value.rpartition(":")
+    digest = digest.strip().lower()
+    algorithm = algorithm.strip().lower().replace("-", "") or CHECKSUM_ALGORITHMS.get(len(digest))
+    try:
+        int(digest, 16)
+        hashlib.new(algorithm)
+    except (TypeError, ValueError):
+        raise APIError(f"Invalid checksum '{value}', expected algorithm:hexdigest")
+    return algorithm, digest
+
+
+def response_checksum(headers, partial: bool = False):
+    """Checksum of the whole file advertised by a file server, or None.
+
+    Recognized headers are `x-amz-checksum-sha256`, `x-goog-hash` (md5) and `Content-MD5`
+    (full responses only). ETags are not checksums, see :func:`etag_md5`.
+
+    :param headers: Response headers
+    :param partial: Headers of a `206 Partial Content` response
+    :return: `(algorithm, hexdigest)` or None
+    """
+    def b64hex(value):
+        try:
+            return binascii.hexlify(base64.b64decode(value)).decode()
+        except (ValueError, binascii.Error):
+            return None
+
+    if headers.get("x-amz-checksum-sha256") and not partial:
+        digest = b64hex(headers["x-amz-checksum-sha256"])
+        if digest:
+            return "sha256", digest
+    for item in headers.get("x-goog-hash", "").split(","):
+        name, _, value = item.strip().partition("=")
+        if name == "md5" and b64hex(value):
+            return "md5", b64hex(value)
+    if headers.get("Content-MD5") and not partial and b64hex(headers["Content-MD5"]):
+        return "md5", b64hex(headers["Content-MD5"])
+    return None
+
+
+def etag_md5(headers):
+    """Strong ETag that looks like an MD5 hex digest, or None.
+
+    S3 uses the MD5 of single-part objects as ETag, but not for SSE-KMS/SSE-C encrypted
+    objects, so a mismatch with it is only a hint of corruption.
+
+    :return: `("md5", hexdigest)` or None
+    """
+    etag = headers.get("ETag", "")
+    if etag.startswith("W/"):
+        return None
+    etag = etag.strip('"').lower()
+    if len(etag) == 32 and all(c in "0123456789abcdef" for c in etag):
+        return "md5", etag
+    return None
+
+
+def file_checksum(path: str, algorithm: str, block_size: int = 1 << 20) -> str:
+    """Hex digest of file `path`, read in blocks of `block_size`."""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def preallocate(output, size: int) -> None:
+    """Reserve `size` bytes for binary file object `output`, sparse if the file system can't allocate."""
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(output.fileno(), 0, size)
+            return
+        except OSError:
+            pass
+    output.truncate(size)
+
+
+class DatasetDownload:
+    """Download of a datastore file in segments over parallel HTTP Range requests.
+
+    Data is written in place to a preallocated `<path>.partial` file. Completed segments
+    are recorded in `<path>.partial.json`, so an interrupted download continues with the
+    missing segments as long as the remote file (size and `ETag`/`Last-Modified`) is the
+    same. Requests go through the retries of the client (`RetryPolicy`, `Retry-After`),
+    a segment broken while reading is resumed from its last received byte. The file is
+    moved to `path` once its checksum is verified.
+    """
+
+    def __init__(
+        self,
+        client,
+        url: str,
+        path: str,
+        headers: dict = {},
+        verify: bool = True,
+        parallel: int = 4,
+        segment_size: int = 64 << 20,
+        block_size: int = 1 << 20,
+        checksum: str = None,
+        retry_policy: RetryPolicy = None,
+        timeout: float = 60.0,
+    ) -> None:
+        """DatasetDownload constructor
+
+        :param client: :class:`netlas.client.Netlas` instance sending the requests
+        :param url: File URL
+        :param path: Output file path
+        :param headers: Request headers
+        :param verify: Verify TLS certificate, defaults to True
+        :param parallel: Number of concurrent segment requests, defaults to 4
+        :param segment_size: Segment size in bytes, unit of resume, defaults to 64 MiB
+        :param block_size: Read block size in bytes, bounds memory per request, defaults to 1 MiB
+        :param checksum: Expected checksum `algorithm:hexdigest`, by default advertised by the server if any
+        :param retry_policy: Retry policy of segments broken while reading, defaults to `RetryPolicy(max_attempts=5)`
+        :param timeout: Timeout in seconds between received bytes, defaults to 60.0
+        """
+        self.client = client
+        self.url = url
+        self.path = path
+        self.headers = headers
+        self.verify = verify
+        self.parallel = max(int(parallel), 1)
+        self.segment_size = max(int(segment_size), 1)
+        self.block_size = block_size
+        self.checksum = parse_checksum(checksum) if checksum else None
+        self.etag_checksum = None
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(max_attempts=5)
+        self.timeout = timeout
+        self.partial_path = f"{path}.partial"
+        self.state_path = f"{path}.partial.json"
+        self.size = None
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _get(self, start: int = 0, end: int = None) -> requests.Response:
+        headers = dict(self.headers)
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        try:
+            r = self.client._send_with_retries("get", self.url, url=self.url, headers=headers, stream=True,
+                                               verify=self.verify, timeout=self.timeout, idempotent=True)
+        except requests.exceptions.RequestException as ex:
+            raise APIError(str(ex) or "Dataset download failed", "dataset_download_error")
+        except APIError as ex:
+            raise APIError(f"Failed to download {self.url.split('?')[0]}: {ex}", "dataset_download_error")
+        if r.status_code not in [200, 206]:
+            r.close()
+            raise APIError(f"Failed to download {self.url.split('?')[0]}: HTTP {r.status_code}", "dataset_download_error")
+        return r
+
+    def probe(self) -> dict:
+        """Request the first byte to learn file size, validator and Range support.
+
+        :return: `{"size", "validator", "ranges"}`
+        """
+        with self._get(0, 0) as r:
+            ranges = r.status_code == 206 and "/" in r.headers.get("Content-Range", "")
+            size = r.headers.get("Content-Range", "").rpartition("/")[2] if ranges else r.headers.get("Content-Length")
+            if self.checksum is None:
+                self.checksum = response_checksum(r.headers, partial=ranges)
+            self.etag_checksum = etag_md5(r.headers)
+            return {
+                "size": int(size) if size and size.isdigit() else None,
+                "validator": r.headers.get("ETag") or r.headers.get("Last-Modified"),
+                "ranges": ranges and size.isdigit(),
+            }
+
+    def _load_state(self, remote: dict) -> dict:
+        state = {"size": remote["size"], "validator": remote["validator"],
+                 "segment_size": self.segment_size, "done": []}
+        try:
+            with open(self.state_path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return state
+        if remote["validator"] is None or not os.path.exists(self.partial_path) \
+                or os.path.getsize(self.partial_path) != remote["size"] \
+                or any(stored.get(k) != state[k] for k in ["size", "validator", "segment_size"]):
+            return state
+        return stored
+
+    def _save_state(self, state: dict) -> None:
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _advance(self, size: int, on_progress=None) -> None:
+        with self._lock:
+            self.completed += size
+            if on_progress:
+                on_progress(self.completed, self.size)
+
+    def _fetch(self, output, start: int, end: int = None, on_progress=None) -> None:
+        """Write bytes `start`-`end` to `output` at their offset, resuming responses broken while reading."""
+        position = start
+        started = time.monotonic()
+        attempt = 0
+        while end is None or position <= end:
+            attempt += 1
+            try:
+                with self._get(position, end) as r:
+                    if position > start and r.status_code != 206 and end is None:
+                        # retry of a single stream answered with the whole file
+                        self._advance(start - position, on_progress)
+                        position = start
+                    elif position and r.status_code != 206:
+                        raise APIError("Server does not support Range requests", "dataset_download_error")
+                    output.seek(position)
+                    for block in r.iter_content(chunk_size=self.block_size):
+                        if self._stop.is_set():
+                            raise APIError("Download cancelled", "dataset_download_cancelled")
+                        output.write(block)
+                        position += len(block)
+                        self._advance(len(block), on_progress)
+                if end is None:
+                    return
+                if position <= end:
+                    raise requests.exceptions.ChunkedEncodingError("Response ended prematurely")
+            except requests.exceptions.RequestException as ex:
+                delay = self.retry_policy.next_delay(attempt, started, "get") \
+                    if self.retry_policy.is_retryable(error=ex) else None
+                if delay is None or self._stop.is_set():
+                    raise APIError(str(ex) or "Dataset download failed", "dataset_download_error")
+                time.sleep(delay)
+
+    def _fetch_segment(self, index: int, state: dict, on_progress=None) -> None:
+        start = index * self.segment_size
+        end = min(start + self.segment_size, self.size) - 1
+        with open(self.partial_path, "r+b") as output:
+            self._fetch(output, start, end, on_progress)
+            output.flush()
+            os.fsync(output.fileno())
+        with self._lock:
+            state["done"].append(index)
+            self._save_state(state)
+
+    def run(self, on_progress=None) -> str:
+        """Download the file.
+
+        :param on_progress: Callback `on_progress(completed, total)` with byte counts, `total` is None if unknown
+        :raises APIError: Download failed or checksum mismatch (type `checksum_mismatch`)
+        :return: Output file path
+        """
+        remote = self.probe()
+        self.size = remote["size"]
+        self._stop.clear()
+        if not remote["ranges"]:
+            # no Range support: single stream, restarted from the beginning on failure
+            with open(self.partial_path, "wb") as output:
+                if self.size:
+                    preallocate(output, self.size)
+                self._fetch(output, 0, None, on_progress)
+                output.truncate()
+        else:
+            state = self._load_state(remote)
+            segments = range((self.size + self.segment_size - 1) // self.segment_size)
+            todo = [i for i in segments if i not in state["done"]]
+            self.completed = sum(min(self.segment_size, self.size - i * self.segment_size) for i in state["done"])
+            if on_progress:
+                on_progress(self.completed, self.size)
+            if not state["done"]:
+                with open(self.partial_path, "wb") as output:
+                    preallocate(output, self.size)
+            self._save_state(state)
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel)
+            try:
+                futures = [executor.submit(self._fetch_segment, i, state, on_progress) for i in todo]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            finally:
+                self._stop.set()
+                executor.shutdown(wait=True, cancel_futures=True)
+        self.verify_checksum()
+        os.replace(self.partial_path, self.path)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return self.path
+
+    def verify_checksum(self) -> None:
+        """Compare checksum of the downloaded data with the expected one, if known.
+
+        Without an explicit checksum, an MD5-like ETag is compared instead and a mismatch
+        only issues a warning, the file is kept.
+
+        :raises APIError: Checksum mismatch, the partial download is removed
+        """
+        if self.checksum is None:
+            if self.etag_checksum is not None:
+                algorithm, expected = self.etag_checksum
+                actual = file_checksum(self.partial_path, algorithm, self.block_size)
+                if actual != expected:
+                    warnings.warn(f"MD5 of {self.path} ({actual}) differs from its ETag {expected}, "
+                                  f"which may not be a checksum; the file is kept unverified")
+            return
+        algorithm, expected = self.checksum
+        actual = file_checksum(self.partial_path, algorithm, self.block_size)
+        if actual != expected:
+            for path in [self.partial_path, self.state_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise APIError(f"Checksum mismatch of {self.path}: {algorithm} {actual}, expected {expected}",
+                           "checksum_mismatch")
+
+
+def dataset_file_name(link: dict, url: str) -> str:
+    """File name of a dataset from its link response, or from the last URL path segment."""
+    name = link.get("name") if isinstance(link, dict) else None
+    if not name:
+        name = urllib.parse.unquote(urllib.parse.urlparse(url).path.rstrip("/").rpartition("/")[2])
+    return os.path.basename(name) or "dataset"
+
+
+class DatastoreSync:
+    """Mirror of datastore products in a local directory.
+
+    Each dataset is kept as `<directory>/<id>/<file name>`. A manifest
+    (`.netlas-manifest.json`) stores version, size and SHA-256 of every held dataset.
+    On sync, only new datasets and those whose version changed (or whose local file is
+    missing or has another size) are downloaded, concurrently. With `prune`, datasets no
+    longer offered or selected are removed.
+    """
+
+    MANIFEST = ".netlas-manifest.json"
+    VERSION_KEYS = ["version", "updated_at", "updated", "last_updated", "modified", "date"]
+
+    def __init__(
+        self,
+        client,
+        directory: str,
+        ids: list = None,
+        parallel: int = 2,
+        segment_parallel: int = 4,
+        prune: bool = False,
+        verify: bool = False,
+    ) -> None:
+        """DatastoreSync constructor
+
+        :param client: :class:`netlas.client.Netlas` instance
+        :param directory: Local mirror directory
+        :param ids: Dataset IDs to hold, all available datasets by default
+        :param parallel: Number of datasets downloaded concurrently, defaults to 2
+        :param segment_parallel: Number of concurrent Range requests per dataset, defaults to 4
+        :param prune: Remove datasets that are no longer available or selected, defaults to False
+        :param verify: Re-hash held files and download again on mismatch, defaults to False
+        """
+        self.client = client
+        self.directory = directory
+        self.ids = None if ids is None else {str(i) for i in ids}
+        self.parallel = max(int(parallel), 1)
+        self.segment_parallel = segment_parallel
+        self.prune = prune
+        self.verify = verify
+        self.manifest_path = os.path.join(directory, self.MANIFEST)
+        self._lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {"datasets": {}}
+        return manifest if isinstance(manifest.get("datasets"), dict) else {"datasets": {}}
+
+    def _save_manifest(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    @classmethod
+    def version(cls, product: dict) -> str:
+        """Version of product metadata: its first known version field, otherwise a hash of the metadata."""
+        for key in cls.VERSION_KEYS:
+            if product.get(key) is not None:
+                return str(product[key])
+        raw = json.dumps(product, sort_keys=True, separators=(",", ":"), default=str)
+        return "sha256:" + hashlib.sha256(raw.encode()).hexdigest()
+
+    def _is_current(self, entry: dict, product: dict) -> bool:
+        if entry is None or entry.get("version") != self.version(product):
+            return False
+        path = os.path.join(self.directory, entry["file"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry.get("size"):
+            return False
+        return not self.verify or file_checksum(path, "sha256") == entry.get("sha256")
+
+    def plan(self) -> dict:
+        """Compare the manifest with available products.
+
+        :raises APIError: Product listing is not a list of products, or is empty while pruning held datasets
+        :return: `{"download": [products], "unchanged": [ids], "prune": [ids]}`
+        """
+        listing = self.client.datasets()
+        products = listing
+        if isinstance(listing, dict):
+            products = listing.get("results", listing.get("items"))
+        if not isinstance(products, list) or not all(isinstance(p, dict) and p.get("id") is not None
+                                                     for p in products):
+            raise APIError("Unrecognized datastore product listing", "datastore_listing_error")
+        held = self.manifest["datasets"]
+        if not products and held and self.prune:
+            # an empty listing is more likely an API problem than a withdrawn datastore
+            raise APIError("Datastore product listing is empty, refusing to prune the local mirror",
+                           "datastore_listing_error")
+        products = [p for p in products if self.ids is None or str(p["id"]) in self.ids]
+        download = [p for p in products if not self._is_current(held.get(str(p["id"])), p)]
+        available = {str(p["id"]) for p in products}
+        return {
+            "download": download,
+            "unchanged": [str(p["id"]) for p in products if p not in download],
+            "prune": [i for i in held if i not in available] if self.prune else [],
+        }
+
+    def _remove(self, entry: dict) -> None:
+        path = os.path.join(self.directory, entry["file"])
+        for stale in [path, f"{path}.partial", f"{path}.partial.json"]:
+            if os.path.exists(stale):
+                os.remove(stale)
+        folder = os.path.dirname(path)
+        if folder != os.path.normpath(self.directory) and os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+
+    def _sync_one(self, product: dict, on_progress=None) -> dict:
+        id = str(product["id"])
+        folder = os.path.join(self.directory, id)
+        os.makedirs(folder, exist_ok=True)
+        try:
+            path = self.client.download_dataset(
+                product["id"],
+                path=folder,
+                parallel=self.segment_parallel,
+                on_progress=(lambda completed, total: on_progress(id, completed, total)) if on_progress else None,
+            )
+        except Exception:
+            if not os.listdir(folder):
+                os.rmdir(folder)
+            raise
+        entry = {
+            "id": product["id"],
+            "file": os.path.relpath(path, self.directory),
+            "version": self.version(product),
+            "size": os.path.getsize(path),
+            "sha256": file_checksum(path, "sha256"),
+            "synced": time.time(),
+        }
+        with self._lock:
+            old = self.manifest["datasets"].get(id)
+            if old is not None and old.get("file") != entry["file"]:
+                self._remove(old)
+            self.manifest["datasets"][id] = entry
+            self._save_manifest()
+        return entry
+
+    def run(self, dry_run: bool = False, on_progress=None, on_complete=None) -> dict:
+        """Download new and changed datasets and prune outdated ones.
+
+        A failed dataset does not stop the others, its previous copy is kept.
+
+        :param dry_run: Only report what would be done
+        :param on_progress: Callback `on_progress(id, completed, total)` with byte counts
+        :param on_complete: Callback `on_complete(id, entry_or_exception)` called when a dataset is done
+        :return: `{"downloaded", "unchanged", "pruned", "failed"}` lists of IDs (`failed` maps ID to error)
+        """
+        plan = self.plan()
+        result = {
+            "downloaded": [str(p["id"]) for p in plan["download"]] if dry_run else [],
+            "unchanged": plan["unchanged"],
+            "pruned": plan["prune"],
+            "failed": {},
+        }
+        if dry_run:
+            return result
+        with self._lock:
+            for id in plan["prune"]:
+                self._remove(self.manifest["datasets"].pop(id))
+            self._save_manifest()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            futures = {executor.submit(self._sync_one, p, on_progress): str(p["id"]) for p in plan["download"]}
+            for future in concurrent.futures.as_completed(futures):
+                id = futures[future]
+                try:
+                    entry = future.result()
+                    result["downloaded"].append(id)
+                except (APIError, OSError) as ex:
+                    entry = ex
+                    result["failed"][id] = str(ex)
+                if on_complete:
+                    on_complete(id, entry)
+        return result
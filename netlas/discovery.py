@@ -0,0 +1,427 @@
+import array
+import base64
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+from netlas.exception import APIError
+
+NODE_TYPES = ["address", "as_name", "asn", "dns_txt", "domain", "email", "favicon", "http_tracker",
+              "ip", "ip-range", "jarm", "network_name", "organization", "person", "phone", "text"]
+
+# node types compared case-insensitively when seeds are deduplicated
+CASE_INSENSITIVE_TYPES = ["domain", "email"]
+
+
+def normalize_seed(node_type: str, node_value: str) -> tuple:
+    """Canonical `(node_type, node_value)` used to detect duplicate seeds."""
+    node_type = node_type.strip().lower()
+    node_value = str(node_value).strip()
+    if node_type in CASE_INSENSITIVE_TYPES:
+        node_value = node_value.lower().rstrip(".")
+    return node_type, node_value
+
+
+def search_field_ids(count_data) -> list:
+    """IDs of searches with results from the data of a discovery count response."""
+    ids = []
+    for item in count_data if isinstance(count_data, list) else []:
+        if not isinstance(item, dict) or item.get("search_field_id") is None:
+            continue
+        if item.get("count", 1) == 0 or item["search_field_id"] in ids:
+            continue
+        ids.append(item["search_field_id"])
+    return ids
+
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put `item` into bounded `out`, waiting for free space until `stop` is set."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class DiscoveryBatch:
+    """Discovery over many seed nodes.
+
+    Seeds are deduplicated, grouped by node type and split into group requests of
+    `chunk_size` values. Chunks run concurrently on `workers` threads, each going through
+    count, wait and result stages, so count requests of some chunks overlap with result
+    downloads of others. Records of all chunks are merged into one stream through a
+    bounded buffer: workers pause while the consumer is behind.
+    """
+
+    def __init__(
+        self,
+        client,
+        seeds,
+        search_field_ids: list = None,
+        chunk_size: int = 100,
+        workers: int = 4,
+        timeout: float = None,
+        buffer: int = 1000,
+    ) -> None:
+        """DiscoveryBatch constructor
+
+        :param client: :class:`netlas.client.Netlas` instance
+        :param seeds: Iterable of `(node_type, node_value)` tuples
+        :param search_field_ids: IDs of searches to run for every chunk, by default all searches with results
+        :param chunk_size: Maximum number of node values in one group request, defaults to 100
+        :param workers: Number of chunks processed concurrently, defaults to 4
+        :param timeout: Maximum wait in seconds for each discovery stage, unlimited by default
+        :param buffer: Maximum number of records waiting for the consumer, defaults to 1000
+        """
+        self.client = client
+        self.seeds = seeds
+        self.search_field_ids = search_field_ids
+        self.chunk_size = max(int(chunk_size), 1)
+        self.workers = max(int(workers), 1)
+        self.timeout = timeout
+        self.buffer = buffer
+        self._stop = threading.Event()
+
+    def chunks(self) -> list:
+        """Deduplicated seeds as `(node_type, [node_value, ...])` group requests."""
+        groups = {}
+        for node_type, node_value in self.seeds:
+            node_type, node_value = normalize_seed(node_type, node_value)
+            if node_value:
+                groups.setdefault(node_type, {})[node_value] = None
+        chunks = []
+        for node_type, values in groups.items():
+            values = list(values)
+            for i in range(0, len(values), self.chunk_size):
+                chunks.append((node_type, values[i:i + self.chunk_size]))
+        return chunks
+
+    def _run_chunk(self, node_type: str, values: list, out: queue.Queue) -> None:
+        if len(values) > 1:
+            count = self.client.discovery_group_count(node_type=node_type, node_value=values)
+        else:
+            count = self.client.discovery_node_count(node_type=node_type, node_value=values[0])
+        if not count.get("x_count_id"):
+            raise APIError("X-Count-Id header was not returned by discovery count")
+        if count.get("x_stream_id"):
+            self.client.wait_discovery(count["x_stream_id"], timeout=self.timeout, cancel=self._stop)
+
+        ids = self.search_field_ids if self.search_field_ids is not None else search_field_ids(count.get("data"))
+        for search_field_id in ids:
+            if len(values) > 1:
+                result = self.client.discovery_group_result(x_count_id=count["x_count_id"], node_type=node_type,
+                                                            node_value=values, search_field_id=search_field_id,
+                                                            stream=True)
+            else:
+                result = self.client.discovery_node_result(x_count_id=count["x_count_id"], node_type=node_type,
+                                                           node_value=values[0], search_field_id=search_field_id,
+                                                           stream=True)
+            records = result["data"]
+            try:
+                for record in records:
+                    if not _put(out, (node_type, values, search_field_id, record), self._stop):
+                        return
+            finally:
+                records.close()
+
+    def run(self):
+        """Run the batch.
+
+        Stopping the iteration early cancels the remaining chunks.
+
+        :return: Iterator of `(node_type, node_values, search_field_id, record)` tuples,
+                 `record` is an exception (and `search_field_id` None) if a chunk failed
+        """
+        chunks = self.chunks()
+        out = queue.Queue(maxsize=self.buffer)
+        done = object()
+
+        def worker(node_type, values):
+            try:
+                self._run_chunk(node_type, values, out)
+            except Exception as ex:
+                if not self._stop.is_set():
+                    _put(out, (node_type, values, None, ex), self._stop)
+            finally:
+                _put(out, done, self._stop)
+
+        self._stop.clear()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for node_type, values in chunks:
+                executor.submit(worker, node_type, values)
+            remaining = len(chunks)
+            while remaining:
+                item = out.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            self._stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_nodes(record) -> list:
+    """Default node extractor of :class:`DiscoveryCrawler`.
+
+    Takes `node_type`/`node_value` of a record, or values of keys named after node
+    types (e.g. `{"ip": "1.1.1.1", "domain": ["a.com", "b.com"]}`).
+
+    :return: List of `(node_type, node_value)` tuples
+    """
+    if not isinstance(record, dict):
+        return []
+    if record.get("node_type") in NODE_TYPES and record.get("node_value") is not None:
+        return [(record["node_type"], str(record["node_value"]))]
+    nodes = []
+    for key, value in record.items():
+        node_type = key.replace("_", "-") if key == "ip_range" else key
+        if node_type not in NODE_TYPES:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, (str, int)) and not isinstance(item, bool):
+                nodes.append((node_type, str(item)))
+    return nodes
+
+
+class VisitedSet:
+    """Set of visited discovery nodes.
+
+    Nodes are stored as 64-bit digests instead of strings, 8 bytes per node in the
+    crawl state file. In memory the digests are a Python set of ints, about 70 bytes
+    per node (70 MB per million visited nodes) regardless of node value length.
+    """
+
+    def __init__(self) -> None:
+        self.digests = set()
+
+    @staticmethod
+    def digest(node_type: str, node_value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(f"{node_type}\0{node_value}".encode(), digest_size=8).digest(), "little")
+
+    def add(self, node_type: str, node_value: str) -> bool:
+        """Add node, return False if it was already visited."""
+        digest = self.digest(node_type, node_value)
+        if digest in self.digests:
+            return False
+        self.digests.add(digest)
+        return True
+
+    def __contains__(self, node) -> bool:
+        return self.digest(*node) in self.digests
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def dump(self) -> dict:
+        return {"digests": base64.b64encode(array.array("Q", sorted(self.digests)).tobytes()).decode()}
+
+    @classmethod
+    def load(cls, state: dict) -> "VisitedSet":
+        visited = cls()
+        digests = array.array("Q")
+        digests.frombytes(base64.b64decode(state["digests"]))
+        visited.digests = set(digests)
+        return visited
+
+
+class DiscoveryCrawler:
+    """Breadth-first expansion of discovery results into new nodes.
+
+    Every node is looked up with `discovery_node_count`/`discovery_node_result`, nodes
+    found in its results (see `extract_nodes`) are queued one level deeper. Each node
+    is requested once per crawl. Nodes are expanded concurrently and their records are
+    streamed through bounded buffers, so memory use does not grow with the number of
+    results of a node. With a `state` file the frontier and the visited set are saved
+    at most every `checkpoint_interval` seconds and when the crawl ends, and an
+    interrupted crawl continues from there.
+    """
+
+    def __init__(
+        self,
+        client,
+        seeds,
+        max_depth: int = 2,
+        fanout: dict = None,
+        max_fanout: int = 100,
+        max_nodes: int = None,
+        follow: list = None,
+        search_field_ids: dict = None,
+        extract=extract_nodes,
+        state: str = None,
+        workers: int = 4,
+        timeout: float = None,
+        checkpoint_interval: float = 30.0,
+        buffer: int = 1000,
+    ) -> None:
+        """DiscoveryCrawler constructor
+
+        :param client: :class:`netlas.client.Netlas` instance
+        :param seeds: Iterable of `(node_type, node_value)` tuples, depth 0
+        :param max_depth: Nodes deeper than this are not expanded, defaults to 2
+        :param fanout: Maximum new nodes queued from one node, by node type of that node, e.g. `{"asn": 10}`
+        :param max_fanout: Fan-out limit of node types missing in `fanout`, defaults to 100
+        :param max_nodes: Maximum number of expanded nodes, unlimited by default
+        :param follow: Node types to queue, all types by default
+        :param search_field_ids: IDs of searches to run by node type, by default all searches with results
+        :param extract: Callable returning `(node_type, node_value)` tuples found in a record
+        :param state: Crawl state file path for resuming, the crawl is not persisted if empty
+        :param workers: Number of nodes expanded concurrently, defaults to 4
+        :param timeout: Maximum wait in seconds for each discovery stage, unlimited by default
+        :param checkpoint_interval: Minimum seconds between state file writes, defaults to 30
+        :param buffer: Maximum number of records of one node waiting for the consumer, defaults to 1000
+        """
+        self.client = client
+        self.max_depth = max_depth
+        self.fanout = fanout or {}
+        self.max_fanout = max_fanout
+        self.max_nodes = max_nodes
+        self.follow = follow
+        self.search_field_ids = search_field_ids or {}
+        self.extract = extract
+        self.state = state
+        self.workers = max(int(workers), 1)
+        self.timeout = timeout
+        self.checkpoint_interval = checkpoint_interval
+        self.buffer = buffer
+        self.expanded = 0
+        self._stop = threading.Event()
+        if state and os.path.exists(state):
+            self._load()
+        else:
+            self.visited = VisitedSet()
+            self.frontier = collections.deque()
+            for node_type, node_value in seeds:
+                node = normalize_seed(node_type, node_value)
+                if node[1] and self.visited.add(*node):
+                    self.frontier.append([node[0], node[1], 0])
+
+    def _load(self) -> None:
+        try:
+            with open(self.state, "r") as f:
+                state = json.load(f)
+            self.visited = VisitedSet.load(state["visited"])
+        except (OSError, ValueError, KeyError) as ex:
+            raise APIError(f"Can't read crawl state {self.state}: {ex}")
+        self.frontier = collections.deque(state["frontier"])
+        self.expanded = state.get("expanded", 0)
+
+    def save(self) -> None:
+        """Write frontier and visited set to the state file atomically."""
+        if not self.state:
+            return
+        tmp_path = f"{self.state}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"frontier": list(self.frontier), "expanded": self.expanded, "visited": self.visited.dump()}, f)
+        os.replace(tmp_path, self.state)
+
+    def _expand(self, node_type: str, node_value: str, out: queue.Queue) -> None:
+        count = self.client.discovery_node_count(node_type=node_type, node_value=node_value)
+        if not count.get("x_count_id"):
+            raise APIError("X-Count-Id header was not returned by discovery count")
+        if count.get("x_stream_id"):
+            self.client.wait_discovery(count["x_stream_id"], timeout=self.timeout, cancel=self._stop)
+        ids = self.search_field_ids.get(node_type)
+        if ids is None:
+            ids = search_field_ids(count.get("data"))
+        for search_field_id in ids:
+            if self._stop.is_set():
+                return
+            result = self.client.discovery_node_result(x_count_id=count["x_count_id"], node_type=node_type,
+                                                       node_value=node_value, search_field_id=search_field_id,
+                                                       stream=True)
+            records = result["data"]
+            try:
+                for record in records:
+                    if not _put(out, (search_field_id, record), self._stop):
+                        return
+            finally:
+                records.close()
+
+    def _children(self, node_type: str, depth: int, record, children: list, seen: set) -> None:
+        """Append nodes found in `record` to `children` until the fan-out limit of `node_type`.
+
+        Nodes are checked against the visited set but added to it only when their batch is done,
+        so the saved state never holds visited nodes missing from the frontier.
+        """
+        limit = self.fanout.get(node_type, self.max_fanout)
+        for child_type, child_value in self.extract(record):
+            if len(children) >= limit:
+                return
+            if self.follow is not None and child_type not in self.follow:
+                continue
+            child = normalize_seed(child_type, child_value)
+            if child[1] and child not in seen and child not in self.visited:
+                seen.add(child)
+                children.append([child[0], child[1], depth + 1])
+
+    def run(self):
+        """Run the crawl.
+
+        Stopping the iteration early cancels the nodes being expanded, they are requested
+        again when the crawl is resumed.
+
+        :return: Iterator of `(node_type, node_value, depth, search_field_id, record)` tuples,
+                 `record` is an exception (and `search_field_id` None) if the node failed
+        """
+        done = object()
+
+        def worker(node_type, node_value, out):
+            try:
+                self._expand(node_type, node_value, out)
+            except Exception as ex:
+                if not self._stop.is_set():
+                    _put(out, (None, ex), self._stop)
+            finally:
+                _put(out, done, self._stop)
+
+        self._stop.clear()
+        saved = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                while self.frontier:
+                    if self.max_nodes is not None and self.expanded >= self.max_nodes:
+                        break
+                    size = self.workers
+                    if self.max_nodes is not None:
+                        size = min(size, self.max_nodes - self.expanded)
+                    # nodes leave the frontier only when their batch is done, a stopped crawl requests them again
+                    batch = list(itertools.islice(self.frontier, size))
+                    buffers = [queue.Queue(maxsize=self.buffer) for _ in batch]
+                    for (node_type, node_value, _), out in zip(batch, buffers):
+                        executor.submit(worker, node_type, node_value, out)
+                    children = []
+                    seen = set()
+                    for (node_type, node_value, depth), out in zip(batch, buffers):
+                        found = []
+                        while True:
+                            item = out.get()
+                            if item is done:
+                                break
+                            search_field_id, record = item
+                            yield node_type, node_value, depth, search_field_id, record
+                            if depth < self.max_depth and not isinstance(record, Exception):
+                                self._children(node_type, depth, record, found, seen)
+                        children.extend(found)
+                    for child_type, child_value, _ in children:
+                        self.visited.add(child_type, child_value)
+                    for _ in batch:
+                        self.frontier.popleft()
+                    # breadth-first: children go after the rest of the current level
+                    self.frontier.extend(children)
+                    self.expanded += len(batch)
+                    if time.monotonic() - saved >= self.checkpoint_interval:
+                        self.save()
+                        saved = time.monotonic()
+            finally:
+                self._stop.set()
+                self.save()
@@ -0,0 +1,615 @@
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import requests
+
+from netlas.exception import APIError
+
+
+def ip_partitions(query: str, parts: int = 16) -> list:
+    """Split query into disjoint sub-queries by IPv4 ranges.
+
+    The last partition matches documents without an IPv4 address (e.g. IPv6 hosts),
+    so together the partitions cover the whole result set of the query.
+
+    :param query: Search query string
+    :param parts: Number of IPv4 ranges, rounded down to a power of two (1-256)
+    :return: List of partitions (`key` and `query`)
+    """
+    parts = max(1, min(int(parts), 256))
+    parts = 1 << (parts.bit_length() - 1)
+    step = (1 << 32) // parts
+    partitions = []
+    for i in range(parts):
+        first = _ipv4(i * step)
+        last = _ipv4((i + 1) * step - 1)
+        partitions.append({
+            "key": f"ip:{first}-{last}",
+            "query": f"({query}) AND ip:[{first} TO {last}]",
+        })
+    partitions.append({
+        "key": "ip:other",
+        "query": f"({query}) AND NOT ip:[0.0.0.0 TO 255.255.255.255]",
+    })
+    return partitions
+
+
+def _ipv4(value: int) -> str:
+    return ".".join(str((value >> shift) & 0xFF) for shift in (24, 16, 8, 0))
+
+
+def index_partitions(query: str, indices) -> list:
+    """Split query into one sub-query per data index.
+
+    :param query: Search query string
+    :param indices: Index IDs, list or comma-separated string (can be retrieved by `Netlas.indices`)
+    :return: List of partitions (`key`, `query` and `indices`)
+    """
+    if isinstance(indices, str):
+        indices = [i.strip() for i in indices.split(",") if i.strip()]
+    return [{"key": f"index:{index}", "query": query, "indices": str(index)} for index in indices]
+
+
+def time_partitions(query: str, field: str, start, end, parts: int = 8) -> list:
+    """Split query into disjoint sub-queries by equal ranges of a time field.
+
+    The last partition matches documents outside of `start`-`end` range
+    (or without the field), so together the partitions cover the whole result set.
+
+    :param query: Search query string
+    :param field: Time field, e.g. `last_updated`
+    :param start: Range start, `datetime` or ISO 8601 string
+    :param end: Range end, `datetime` or ISO 8601 string
+    :param parts: Number of ranges
+    :return: List of partitions (`key` and `query`)
+    """
+    if isinstance(start, str):
+        start = datetime.datetime.fromisoformat(start)
+    if isinstance(end, str):
+        end = datetime.datetime.fromisoformat(end)
+    if end <= start:
+        raise APIError("Time range end must be after its start")
+    parts = max(int(parts), 1)
+    step = (end - start) / parts
+    bounds = [(start + step * i).isoformat() for i in range(parts)] + [end.isoformat()]
+    partitions = []
+    for i in range(parts):
+        closing = "]" if i == parts - 1 else "}"
+        partitions.append({
+            "key": f"{field}:{bounds[i]}-{bounds[i + 1]}",
+            "query": f'({query}) AND {field}:["{bounds[i]}" TO "{bounds[i + 1]}"{closing}',
+        })
+    partitions.append({
+        "key": f"{field}:other",
+        "query": f'({query}) AND NOT {field}:["{bounds[0]}" TO "{bounds[-1]}"]',
+    })
+    return partitions
+
+
+def prefix_partitions(query: str, field: str, alphabet: str) -> list:
+    """Split query into disjoint sub-queries by the first character of a keyword field.
+
+    The last partition matches documents whose field starts with another character
+    (or is missing), so together the partitions cover the whole result set of the query.
+
+    :param query: Search query string
+    :param field: Single-valued keyword field, e.g. `domain`
+    :param alphabet: First characters of one partition each, e.g. `0123456789abcdef`
+    :return: List of partitions (`key` and `query`)
+    """
+    partitions = [{"key": f"{field}:{char}*", "query": f"({query}) AND {field}:{char}*"} for char in alphabet]
+    partitions.append({
+        "key": f"{field}:other",
+        "query": f"({query}) AND NOT ({' OR '.join(f'{field}:{char}*' for char in alphabet)})",
+    })
+    return partitions
+
+
+def default_partitions(query: str, datatype: str) -> list:
+    """Partitions used by :class:`PartitionedDownload` when none are given.
+
+    Responses are split by IPv4 ranges, domains and WHOIS domains by the first character
+    of the domain name, certificates by the first digit of the SHA-256 fingerprint.
+    WHOIS networks may span any IP range, so `whois-ip` is downloaded as one partition.
+    """
+    if datatype == "response":
+        return ip_partitions(query)
+    if datatype in ["domain", "whois-domain"]:
+        return prefix_partitions(query, "domain", "0123456789abcdefghijklmnopqrstuvwxyz")
+    if datatype == "cert":
+        return prefix_partitions(query, "certificate.fingerprint_sha256", "0123456789abcdef")
+    return [{"key": "all", "query": query}]
+
+
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd", ".lz4": "lz4"}
+
+
+def detect_compression(path: str) -> str:
+    """Guess output compression (gzip, zstd, lz4) from file extension, None if uncompressed."""
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path or "")[1].lower())
+
+
+def compress_writer(output, compress: str, level: int = None, threads: int = -1):
+    """Wrap binary file object `output` into a streaming compressor.
+
+    Closing the returned writer finishes the compressed frame but keeps `output` open,
+    so frames written one after another form a valid multi-frame file.
+
+    :param output: Binary file object
+    :param compress: Codec: gzip, zstd (requires `zstandard`) or lz4 (requires `lz4`)
+    :param level: Compression level, codec default if None
+    :param threads: Compression threads for zstd, -1 for all CPUs, 0 to compress in the caller thread
+    :raises APIError: Unknown codec or codec package is not installed
+    :return: Writable binary file object
+    """
+    if compress == "gzip":
+        import gzip
+        return gzip.GzipFile(fileobj=output, mode="wb", compresslevel=9 if level is None else level)
+    if compress == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise APIError("zstd compression requires zstandard, install it with `pip install netlas[zstd]`")
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level, threads=threads)
+        return compressor.stream_writer(output, closefd=False)
+    if compress == "lz4":
+        try:
+            import lz4.frame
+        except ImportError:
+            raise APIError("lz4 compression requires lz4, install it with `pip install netlas[lz4]`")
+        return lz4.frame.LZ4FrameFile(output, mode="wb", compression_level=0 if level is None else level)
+    raise APIError(f"Unknown compression '{compress}'")
+
+
+class _WriteGuard:
+    """Write-through wrapper of a binary file object, writes are dropped once it is closed.
+
+    Lets a compress writer of a failed attempt be closed without writing its trailer
+    into the output, which is truncated and written again by the retry.
+    """
+
+    def __init__(self, output) -> None:
+        self.output = output
+        self.closed = False
+
+    def write(self, data) -> int:
+        if self.closed:
+            return len(data)
+        return self.output.write(data)
+
+    def flush(self) -> None:
+        if not self.closed:
+            self.output.flush()
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class _OrderChanged(Exception):
+    """Documents skipped to continue a partition do not end with the document of its cursor."""
+
+
+def _digest(line: bytes) -> str:
+    return hashlib.blake2b(line.rstrip(b"\r"), digest_size=16).hexdigest()
+
+
+def copy_chunks(chunks, output, on_progress=None) -> int:
+    """Write raw NDJSON blocks to `output` and count documents by newlines.
+
+    Empty lines are not expected in download streams and are counted as documents.
+    A missing newline after the last document is added.
+
+    :param chunks: Iterator of byte blocks, e.g. from `Netlas.download_raw`
+    :param output: Binary file object
+    :param on_progress: Callback `on_progress(docs)` called once per block with number of completed documents
+    :return: Number of written documents
+    """
+    docs = 0
+    last = b"\n"
+    for chunk in chunks:
+        output.write(chunk)
+        last = chunk
+        lines = chunk.count(b"\n")
+        if lines:
+            docs += lines
+            if on_progress:
+                on_progress(lines)
+    if not last.endswith(b"\n"):
+        output.write(b"\n")
+        docs += 1
+        if on_progress:
+            on_progress(1)
+    return docs
+
+
+class DownloadCheckpoint:
+    """Progress of a partitioned download, persisted as JSON next to the output file.
+
+    Stores counts of all partitions, completed partitions, the size of the output
+    file after the last completed partition and cursors of partially written ones.
+    """
+
+    def __init__(self, path: str, signature: dict) -> None:
+        """DownloadCheckpoint constructor
+
+        :param path: Checkpoint file path
+        :param signature: Download parameters; a stored checkpoint is reused only if they match
+        :raises APIError: Stored checkpoint belongs to another download
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {"signature": signature, "partitions": {}, "offset": 0, "docs": 0}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+            if state.get("signature") != signature:
+                raise APIError(f"Checkpoint {path} belongs to another download, remove it to start over")
+            self.state = state
+
+    @property
+    def offset(self) -> int:
+        return self.state["offset"]
+
+    @property
+    def docs(self) -> int:
+        return self.state["docs"]
+
+    def partition(self, key: str) -> dict:
+        partition = self.state["partitions"].setdefault(key, {"count": None, "done": False, "docs": 0})
+        partition.setdefault("cursor", None)
+        return partition
+
+    def save(self) -> None:
+        # partitions downloaded in parallel save their cursors from several threads
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def complete(self, key: str, docs: int, offset: int) -> None:
+        """Mark partition as completely written, output file ends at `offset`."""
+        partition = self.partition(key)
+        partition["done"] = True
+        partition["docs"] = docs
+        partition["cursor"] = None
+        self.state["offset"] = offset
+        self.state["docs"] += docs
+        self.save()
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PartitionedDownload:
+    """Download of all documents of a query, split into disjoint partitions.
+
+    Each partition is a separate download stream. With `parallel` > 1 partitions are
+    downloaded concurrently to temporary `<path>.part-N` files, which are appended to the
+    output as soon as they are complete.
+
+    Every `cursor_interval` seconds a partition records a cursor: the number of documents
+    written, the size of its data and a digest of the last document. When the stream
+    breaks, the partition is requested again, the documents already written are skipped
+    and writing continues after the cursor. The skipped stream must end with the same
+    document, otherwise the order of documents changed and the partition starts over.
+    With a checkpoint, completed partitions and cursors survive interruptions of `run`.
+    """
+
+    def __init__(
+        self,
+        client,
+        query: str,
+        fields: str = None,
+        exclude_fields: bool = False,
+        datatype: str = "response",
+        indices: str = "",
+        partitions: list = None,
+        checkpoint: str = None,
+        retries: int = 3,
+        parallel: int = 1,
+        compress: str = None,
+        compress_level: int = None,
+        compress_threads: int = -1,
+        cursor_interval: float = 10.0,
+    ) -> None:
+        """PartitionedDownload constructor
+
+        :param client: :class:`netlas.client.Netlas` instance
+        :param query: Search query string
+        :param fields: Comma-separated list of fields to include/exclude
+        :param exclude_fields: Exclude fields from output (instead include)
+        :param datatype: Data type (choices: response, cert, domain, whois-ip, whois-domain)
+        :param indices: Comma-separated IDs of selected data indices
+        :param partitions: Partitions (`key`, `query` and optional `indices`), see `default_partitions`
+        :param checkpoint: Checkpoint file path, progress is not persisted if empty
+        :param retries: Attempts to continue a partition after a stream failure, defaults to 3
+        :param parallel: Number of partitions downloaded concurrently, defaults to 1
+        :param compress: Output compression (gzip, zstd, lz4), a new frame starts at every cursor
+        :param compress_level: Compression level, codec default if None
+        :param compress_threads: Compression threads for zstd, defaults to all CPUs
+        :param cursor_interval: Seconds between cursors of a partition, defaults to 10
+        """
+        self.client = client
+        self.query = query
+        self.fields = fields
+        self.exclude_fields = exclude_fields
+        self.datatype = datatype
+        self.indices = indices or ""
+        if partitions is None:
+            partitions = default_partitions(query, datatype)
+        self.partitions = partitions
+        self.retries = retries
+        self.parallel = max(int(parallel), 1)
+        self.compress = compress
+        self.compress_level = compress_level
+        self.compress_threads = compress_threads
+        self.cursor_interval = cursor_interval
+        self._stop = threading.Event()
+        signature = {
+            "query": query,
+            "datatype": datatype,
+            "indices": self.indices,
+            "fields": fields,
+            "exclude_fields": exclude_fields,
+            "compress": compress,
+            "partitions": [p["key"] for p in partitions],
+        }
+        self.checkpoint = DownloadCheckpoint(checkpoint, signature) if checkpoint else None
+
+    def _state(self, key: str) -> dict:
+        if self.checkpoint is not None:
+            return self.checkpoint.partition(key)
+        if not hasattr(self, "_states"):
+            self._states = {}
+        return self._states.setdefault(key, {"count": None, "done": False, "docs": 0, "cursor": None})
+
+    def plan(self) -> list:
+        """Count documents of every partition (counts are cached in checkpoint).
+
+        :return: List of partitions with `count`, `done` and `docs` fields
+        """
+        for partition in self.partitions:
+            state = self._state(partition["key"])
+            if state["count"] is None:
+                res = self.client.count(query=partition["query"], datatype=self.datatype,
+                                        indices=partition.get("indices", self.indices))
+                state["count"] = res.get("count", 0)
+        if self.checkpoint is not None:
+            self.checkpoint.save()
+        return [dict(partition, **self._state(partition["key"])) for partition in self.partitions]
+
+    def reset(self) -> None:
+        """Forget completed and partially written partitions, e.g. when the output file is gone."""
+        for partition in self.partitions:
+            self._state(partition["key"]).update(done=False, docs=0, cursor=None)
+        if self.checkpoint is not None:
+            self.checkpoint.state.update(offset=0, docs=0)
+            self.checkpoint.save()
+
+    def _save_cursor(self, state: dict, cursor: dict) -> None:
+        state["cursor"] = cursor
+        if self.checkpoint is not None:
+            self.checkpoint.save()
+
+    def _download_partition(self, partition: dict, output, on_progress=None, location: str = "output") -> int:
+        """Write partition to `output` from its current position, continuing after its cursor.
+
+        :param location: Where the partition data is (`output` or `part`), cursors of the other one are dropped
+        """
+        state = self._state(partition["key"])
+        start = output.tell()
+        attempt = 0
+        while True:
+            cursor = state.get("cursor")
+            size = output.seek(0, os.SEEK_END)
+            if not cursor or cursor.get("location") != location or start + cursor["offset"] > size:
+                cursor = {"location": location, "docs": 0, "offset": 0, "last": None}
+            output.seek(start + cursor["offset"])
+            output.truncate()
+            counts = {"saved": cursor["docs"], "docs": cursor["docs"]}
+            try:
+                return self._copy_partition(partition, output, start, cursor, state, counts, on_progress)
+            except _OrderChanged:
+                # documents come in another order, what was written can't be continued
+                if on_progress and cursor["docs"]:
+                    on_progress(partition["key"], -cursor["docs"])
+                self._save_cursor(state, None)
+            except (APIError, requests.exceptions.RequestException):
+                lost = counts["docs"] - counts["saved"]
+                if on_progress and lost:
+                    on_progress(partition["key"], -lost)
+                attempt += 1
+                if attempt > self.retries or self._stop.is_set():
+                    raise
+
+    def _copy_partition(self, partition: dict, output, start: int, cursor: dict, state: dict, counts: dict,
+                        on_progress=None) -> int:
+        """Stream partition into `output` after `cursor`, skipping the documents it covers.
+
+        `counts` holds the number of written documents and of those covered by the last
+        saved cursor, so the caller knows how many are lost on failure.
+        """
+        skip = cursor["docs"]
+        docs = cursor["docs"]
+        last = None  # last complete document of the stream
+        partial = b""  # beginning of the current document
+        saved = time.monotonic()
+        guard = None
+        writer = output
+        try:
+            if self.compress:
+                guard = _WriteGuard(output)
+                writer = compress_writer(guard, self.compress, self.compress_level, self.compress_threads)
+            for chunk in self.client.download_raw(
+                query=partition["query"],
+                fields=self.fields,
+                exclude_fields=self.exclude_fields,
+                datatype=self.datatype,
+                size=partition["count"],
+                indices=partition.get("indices", self.indices),
+            ):
+                if self._stop.is_set():
+                    raise APIError("Download cancelled")
+                if skip:
+                    lines = chunk.count(b"\n")
+                    if lines < skip:
+                        skip -= lines
+                        partial = chunk[chunk.rfind(b"\n") + 1:] if lines else partial + chunk
+                        continue
+                    end = -1
+                    for _ in range(skip):
+                        end = chunk.find(b"\n", end + 1)
+                    prev = chunk.rfind(b"\n", 0, end)
+                    boundary = chunk[prev + 1:end] if prev >= 0 else partial + chunk[:end]
+                    if _digest(boundary) != cursor["last"]:
+                        raise _OrderChanged()
+                    skip = 0
+                    partial = b""
+                    chunk = chunk[end + 1:]
+                end = chunk.rfind(b"\n")
+                if end < 0:
+                    writer.write(chunk)
+                    partial += chunk
+                    continue
+                writer.write(chunk[:end + 1])
+                lines = chunk.count(b"\n", 0, end + 1)
+                prev = chunk.rfind(b"\n", 0, end)
+                last = chunk[prev + 1:end] if prev >= 0 else partial + chunk[:end]
+                docs += lines
+                counts["docs"] = docs
+                if on_progress:
+                    on_progress(partition["key"], lines)
+                if time.monotonic() - saved >= self.cursor_interval:
+                    if writer is not output:
+                        writer.close()
+                    output.flush()
+                    os.fsync(output.fileno())
+                    cursor = dict(cursor, docs=docs, offset=output.tell() - start, last=_digest(last))
+                    self._save_cursor(state, cursor)
+                    counts["saved"] = docs
+                    saved = time.monotonic()
+                    if writer is not output:
+                        writer = compress_writer(guard, self.compress, self.compress_level, self.compress_threads)
+                partial = chunk[end + 1:]
+                writer.write(partial)
+            if skip:
+                raise _OrderChanged()
+            if partial:
+                writer.write(b"\n")
+                docs += 1
+                counts["docs"] = docs
+                if on_progress:
+                    on_progress(partition["key"], 1)
+            if writer is not output:
+                writer.close()
+            return docs
+        finally:
+            if guard is not None:
+                guard.close()
+                if writer is not output and not writer.closed:
+                    try:
+                        writer.close()
+                    except Exception:
+                        pass
+
+    def _download_part(self, partition: dict, part_path: str, on_progress=None) -> int:
+        with open(part_path, "r+b" if os.path.exists(part_path) else "wb") as part:
+            return self._download_partition(partition, part, on_progress=on_progress, location="part")
+
+    def _can_resume(self, path: str) -> bool:
+        return self.checkpoint is not None and os.path.exists(path) \
+            and os.path.getsize(path) >= self.checkpoint.offset
+
+    def _part_path(self, path: str, key: str) -> str:
+        return f"{path}.part-{[p['key'] for p in self.partitions].index(key)}"
+
+    def _remove_parts(self, path: str) -> None:
+        for partition in self.partitions:
+            part_path = self._part_path(path, partition["key"])
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    def prepare(self, path: str) -> list:
+        """Validate checkpoint against output file `path` and count partitions.
+
+        :return: Partitions plan, see :meth:`plan`
+        """
+        if not self._can_resume(path):
+            self.reset()
+            self._remove_parts(path)
+        return self.plan()
+
+    def _complete(self, partition: dict, docs: int, output, on_complete=None) -> None:
+        output.flush()
+        os.fsync(output.fileno())
+        if self.checkpoint is not None:
+            self.checkpoint.complete(partition["key"], docs, output.tell())
+        else:
+            self._state(partition["key"]).update(done=True, docs=docs, cursor=None)
+        if on_complete:
+            on_complete(partition["key"], docs)
+
+    def run(self, path: str, on_progress=None, on_complete=None) -> int:
+        """Download all partitions to NDJSON file `path`.
+
+        :param path: Output file path
+        :param on_progress: Callback `on_progress(partition_key, docs)` called with number of newly written documents
+        :param on_complete: Callback `on_complete(partition_key, docs)` called when a partition is written to output
+        :raises APIError: If a partition could not be downloaded
+        :return: Total number of documents in the output file
+        """
+        plan = self.prepare(path)
+        resume = self._can_resume(path)
+        todo = [p for p in plan if not p["done"] and p["count"]]
+        self._stop.clear()
+        with open(path, "r+b" if resume else "wb") as output:
+            # a partition written directly to the output continues after its cursor
+            output.seek(self.checkpoint.offset if resume else 0)
+            if self.parallel == 1:
+                for partition in todo:
+                    docs = self._download_partition(partition, output, on_progress=on_progress)
+                    self._complete(partition, docs, output, on_complete)
+            else:
+                output.truncate()
+                self._run_parallel(todo, path, output, on_progress, on_complete)
+        self._remove_parts(path)
+        total = 0
+        for partition in self.partitions:
+            state = self._state(partition["key"])
+            total += state["docs"] if state["done"] else 0
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+        return total
+
+    def _run_parallel(self, todo: list, path: str, output, on_progress=None, on_complete=None) -> None:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel)
+        futures = {}
+        try:
+            for partition in todo:
+                part_path = self._part_path(path, partition["key"])
+                future = executor.submit(self._download_part, partition, part_path, on_progress)
+                futures[future] = (partition, part_path)
+            for future in concurrent.futures.as_completed(futures):
+                partition, part_path = futures[future]
+                docs = future.result()
+                with open(part_path, "rb") as part:
+                    shutil.copyfileobj(part, output, 1 << 20)
+                self._complete(partition, docs, output, on_complete)
+                os.remove(part_path)
+        finally:
+            self._stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            if self.checkpoint is None:
+                for _, part_path in futures.values():
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
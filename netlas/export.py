@@ -0,0 +1,273 @@
+import os
+
+from netlas import jsonlib
+from netlas.exception import APIError
+
+ARROW_TYPES = {
+    "boolean": "bool",
+    "byte": "int64",
+    "short": "int64",
+    "integer": "int64",
+    "long": "int64",
+    "unsigned_long": "int64",
+    "float": "float64",
+    "half_float": "float64",
+    "scaled_float": "float64",
+    "double": "float64",
+    "keyword": "string",
+    "text": "string",
+    "ip": "string",
+    "date": "string",
+    "wildcard": "string",
+    "constant_keyword": "string",
+}
+
+OBJECT_TYPES = ["object", "nested", "flattened", "geo_point", "geo_shape", "binary"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise APIError("Parquet export requires pyarrow, install it with `pip install netlas[parquet]`")
+    return pyarrow
+
+
+def mapping_fields(mapping, prefix: str = "") -> dict:
+    """Flatten Netlas mapping (see `Netlas.mapping`) into `{"dotted.field.path": "type"}`.
+
+    Both Elasticsearch-like nested `properties` and flat lists/dicts of fields are accepted.
+    """
+    fields = {}
+    if isinstance(mapping, list):
+        for item in mapping:
+            if isinstance(item, dict):
+                name = item.get("name") or item.get("field") or item.get("path")
+                if name:
+                    fields[f"{prefix}{name}"] = item.get("type", "object")
+        return fields
+    if not isinstance(mapping, dict):
+        return fields
+    if "mappings" in mapping:
+        return mapping_fields(mapping["mappings"], prefix)
+    if "properties" in mapping and isinstance(mapping["properties"], dict):
+        return mapping_fields(mapping["properties"], prefix)
+    for name, value in mapping.items():
+        if isinstance(value, str) and (value in ARROW_TYPES or value in OBJECT_TYPES):
+            fields[f"{prefix}{name}"] = value
+        elif isinstance(value, dict) and "properties" in value:
+            fields[f"{prefix}{name}"] = value.get("type", "object")
+            fields.update(mapping_fields(value["properties"], f"{prefix}{name}."))
+        elif isinstance(value, dict) and "type" in value:
+            fields[f"{prefix}{name}"] = value["type"]
+    return fields
+
+
+def mapping_columns(mapping, fields: str = None, exclude_fields: bool = False) -> dict:
+    """Top-level columns with Arrow type names (bool, int64, float64, string) from Netlas mapping.
+
+    Nested objects become `json` columns stored as JSON strings.
+
+    :param mapping: Result of `Netlas.mapping`
+    :param fields: Comma-separated list of fields to include/exclude
+    :param exclude_fields: Exclude `fields` from columns (instead include)
+    """
+    selected = [f.strip() for f in (fields or "").split(",") if f.strip() and f.strip() != "*"]
+    columns = {}
+    for path, es_type in mapping_fields(mapping).items():
+        name = path.split(".")[0]
+        if exclude_fields and name in selected:
+            continue
+        if not exclude_fields and selected and name not in [f.split(".")[0] for f in selected]:
+            continue
+        if "." in path or name in columns:
+            columns[name] = "json" if "." in path else columns[name]
+            continue
+        columns[name] = ARROW_TYPES.get(es_type, "json")
+    return columns
+
+
+SCALAR_TYPES = ["bool", "int64", "float64", "string"]
+
+
+def list_type(kind: str) -> str:
+    """Type name of a list column of scalar `kind`, e.g. `list<int64>`."""
+    return f"list<{kind}>"
+
+
+def element_type(kind: str):
+    """Scalar type name of list column `kind`, or None if it is not a list column."""
+    return kind[5:-1] if kind.startswith("list<") else None
+
+
+def _scalar_kind(value) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int64"
+    if isinstance(value, float):
+        return "float64"
+    if isinstance(value, str):
+        return "string"
+    return "json"
+
+
+def _merge_kinds(found: set) -> str:
+    if len(found) == 1:
+        return next(iter(found))
+    if found == {"int64", "float64"}:
+        return "float64"
+    return "json"
+
+
+def infer_columns(docs: list) -> dict:
+    """Top-level columns with Arrow type names inferred from sample documents.
+
+    Lists of scalars become list columns (e.g. `list<int64>`); a field holding both
+    scalars and lists of the same type is a list column too.
+    """
+    kinds = {}
+    lists = set()
+    for doc in docs:
+        for name, value in doc.items():
+            found = kinds.setdefault(name, set())
+            if value is None:
+                continue
+            if isinstance(value, list):
+                lists.add(name)
+                found.update(_scalar_kind(item) for item in value if item is not None)
+            else:
+                found.add(_scalar_kind(value))
+    columns = {}
+    for name, found in kinds.items():
+        kind = _merge_kinds(found)
+        columns[name] = list_type(kind) if name in lists and kind != "json" else kind
+    return columns
+
+
+def multi_valued(rows: list, columns: dict) -> list:
+    """Scalar columns of `columns` that hold lists of several values in `rows`."""
+    return [name for name, kind in columns.items()
+            if kind in SCALAR_TYPES
+            and any(isinstance(row.get(name), list) and len(row[name]) > 1 for row in rows)]
+
+
+def _convert(value, kind: str):
+    if value is None:
+        return None
+    if kind == "json":
+        return jsonlib.dumps(value)
+    if element_type(kind):
+        return [_convert(item, element_type(kind)) for item in (value if isinstance(value, list) else [value])]
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    if kind == "string":
+        return value if isinstance(value, str) else jsonlib.dumps(value)
+    try:
+        if kind == "bool":
+            return value if isinstance(value, bool) else None
+        if kind == "int64":
+            value = int(value)
+            return value if -(1 << 63) <= value < (1 << 63) else None
+        if kind == "float64":
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ParquetExport:
+    """Streaming NDJSON to Parquet writer.
+
+    Documents are buffered and written as row groups of `row_group_size` rows, so memory
+    use does not grow with the number of documents. Columns are the top-level fields of
+    documents: typed scalars, lists of scalars, nested objects as JSON strings. Values that
+    do not fit the column type are written as null; without `columns`, the schema is
+    inferred from the first row group and fields missing from it are skipped.
+
+    Mappings do not tell arrays from scalars, so list columns are inferred from the
+    buffered first row group before anything is written. A Parquet file has one schema:
+    if a scalar column holds several values later, it is promoted to a list column and
+    the following row groups go to a new file `<name>.1.parquet` (`.2`, ... for further
+    promotions) instead of rewriting what is written. All file paths are in `paths`.
+    """
+
+    def __init__(self, path: str, columns: dict = None, row_group_size: int = 50000, compression: str = "zstd") -> None:
+        """ParquetExport constructor
+
+        :param path: Output Parquet file path
+        :param columns: `{"column": "bool|int64|float64|string|json"}` or list columns like `list<int64>`,
+                        see `mapping_columns`
+        :param row_group_size: Rows per row group, defaults to 50000
+        :param compression: Parquet codec (zstd, gzip, lz4, snappy, none), defaults to zstd
+        """
+        self.pa = _pyarrow()
+        self.path = path
+        self.paths = [path]
+        self.columns = dict(columns) if columns is not None else None
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.rows = []
+        self.writer = None
+        self.count = 0
+
+    def _type(self, kind: str):
+        if element_type(kind):
+            return self.pa.list_(self._type(element_type(kind)))
+        types = {"bool": self.pa.bool_(), "int64": self.pa.int64(), "float64": self.pa.float64()}
+        return types.get(kind, self.pa.string())
+
+    def _schema(self):
+        return self.pa.schema([(name, self._type(kind)) for name, kind in self.columns.items()])
+
+    def _promote(self, names: list) -> None:
+        """Turn scalar columns `names` into list columns, starting a new file if one is written."""
+        for name in names:
+            self.columns[name] = list_type(self.columns[name])
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        root, ext = os.path.splitext(self.path)
+        self.paths.append(f"{root}.{len(self.paths)}{ext or '.parquet'}")
+
+    def write(self, doc) -> None:
+        """Add document (dict or raw JSON bytes)."""
+        if not isinstance(doc, dict):
+            doc = jsonlib.loads(doc)
+        self.rows.append(doc)
+        self.count += 1
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        if self.columns is None:
+            self.columns = infer_columns(self.rows)
+        promoted = multi_valued(self.rows, self.columns)
+        if promoted:
+            self._promote(promoted)
+        schema = self._schema()
+        if self.writer is None:
+            self.writer = self.pa.parquet.ParquetWriter(self.paths[-1], schema, compression=self.compression)
+        arrays = [
+            self.pa.array([_convert(row.get(name), kind) for row in self.rows], type=schema.field(name).type)
+            for name, kind in self.columns.items()
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=schema))
+        self.rows = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.writer is None:
+            # no documents, still produce a valid file
+            self.columns = self.columns or {}
+            self.writer = self.pa.parquet.ParquetWriter(self.paths[-1], self._schema(), compression=self.compression)
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
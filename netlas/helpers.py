@@ -1,15 +1,11 @@
-import yaml
 import json
-import pygments
-import json
-import appdirs
 import os
 from click import Option, UsageError, Group
 
 from requests import Response
-from pygments.lexers.data import YamlLexer
-from pygments.formatters.terminal import TerminalFormatter
 
+from netlas import jsonlib
+from netlas.cache import MetadataCache
 from netlas.exception import APIError
 
 class bcolors:
@@ -135,9 +131,14 @@ def dump_object(data, format: str = "json", disable_colors: bool = False):
         else:
             return str(data)
     if format == "json":
-        return json.dumps(data)
+        return jsonlib.dumps(data, compact=False)
     elif format == "yaml":
+        # yaml and pygments are slow to import, load them only for YAML output
+        import yaml
         if not disable_colors:
+            import pygments
+            from pygments.lexers.data import YamlLexer
+            from pygments.formatters.terminal import TerminalFormatter
             return pygments.highlight(yaml.safe_dump(data), YamlLexer(),
                                       TerminalFormatter())
         else:
@@ -146,28 +147,88 @@ def dump_object(data, format: str = "json", disable_colors: bool = False):
         return "Unknown output format"
 
 
+def dump_records(records, format: str = "json", disable_colors: bool = False):
+    """Serialize records one by one, the joined pieces equal `dump_object(list(records), ...)`."""
+    empty = True
+    for record in records:
+        if format == "json":
+            yield ("[" if empty else ", ") + jsonlib.dumps(record, compact=False)
+        else:
+            yield dump_object(data=[record], format=format, disable_colors=disable_colors)
+        empty = False
+    if empty:
+        yield dump_object(data=[], format=format, disable_colors=disable_colors)
+    elif format == "json":
+        yield "]"
+
+
+def build_api_error(status_code: int, reason: str, text: str) -> APIError:
+    error = APIError()
+    if status_code in [1006, 1007, 1008, 1106]:
+        error.value = "Access Denied"
+        error.type = "ip_banned"
+        error.title = "Access Denied"
+        error.detail = "Your IP address has been temporary banned"
+    else:
+        try:
+            error_text = json.loads(text)
+            error.type = error_text.get('type')
+            error.title = error_text.get('title')
+            error.detail = error_text.get('detail')
+            error.value = error.title if error.title else error.detail
+        except:
+            error.value = f"{status_code}: {reason}"
+            error.detail = text
+    return error
+
+
 def check_status_code(response: Response, debug: bool = False, ret: dict = {}):
     if response.status_code >= 400:
-        error = APIError()
-        if response.status_code in [1006, 1007, 1008, 1106]:
-            error.value = "Access Denied"
-            error.type = "ip_banned"
-            error.title = "Access Denied"
-            error.detail = "Your IP address has been temporary banned"
-        else:
-            try:
-                error_text = json.loads(response.text)
-                error.type = error_text.get('type')
-                error.title = error_text.get('title')
-                error.detail = error_text.get('detail')
-                error.value = error.title if error.title else error.detail
-            except:
-                error.value = f"{response.status_code}: {response.reason}"
-                error.detail = response.text
-        raise error
+        raise build_api_error(response.status_code, response.reason, response.text)
+
+
+def decode_response(content: bytes, content_type: str = ""):
+    """Parse API response body: JSON object or list of NDJSON records.
+
+    :raises ValueError: Invalid JSON
+    """
+    if not content:
+        return {}
+    if "application/x-ndjson" in content_type:
+        return list(jsonlib.iter_ndjson(content))
+    return jsonlib.loads(content)
+
+
+DATATYPE_PATHS = {
+    "response": "responses",
+    "cert": "certs",
+    "domain": "domains",
+    "whois-ip": "whois_ip",
+    "whois-domain": "whois_domains",
+}
+
+
+def datatype_endpoint(datatype: str, suffix: str = "/") -> str:
+    """Build search/count/download endpoint for a data type, e.g. `/api/certs_count/`."""
+    return f"/api/{DATATYPE_PATHS.get(datatype, 'responses')}{suffix}"
+
+
+def stat_endpoint(index_type: str) -> str:
+    if index_type in ["domain", "whois-ip", "whois-domain"]:
+        return f"/api/{DATATYPE_PATHS[index_type]}_facet/"
+    return "/api/responses_facet/"
+
+
+def mapping_endpoint(datatype: str, is_facet: bool = False) -> str:
+    if datatype in ["response", "domain", "whois-ip", "whois-domain"]:
+        datatype = DATATYPE_PATHS[datatype]
+    if is_facet == True:
+        return f"/api/mapping/{datatype}/facet/"
+    return f"/api/mapping/{datatype}/"
 
 
 def get_api_key():
+    import appdirs
     key_file_name = "netlas.key"
     key_file_path = f'{appdirs.user_config_dir(appname="netlas")}{os.path.sep}{key_file_name}'
     try:
@@ -179,3 +240,32 @@ def get_api_key():
     except:
         return None
     return None
+
+
+def complete_fields(ctx, param, incomplete: str) -> list:
+    """Shell completion of `--include`/`--exclude` fields from the cached mapping.
+
+    The mapping is requested once, on the first completion with an empty cache.
+    """
+    from click.shell_completion import CompletionItem
+    from netlas.export import mapping_fields
+    apibase = (ctx.params.get("server") or "https://app.netlas.io").rstrip("/")
+    api_key = ctx.params.get("apikey") or get_api_key()
+    datatype = ctx.params.get("datatype") or "response"
+    entry = MetadataCache().load(f"{apibase} {api_key}", mapping_endpoint(datatype, False))
+    if entry is not None:
+        mapping = entry["data"]
+    else:
+        from netlas.client import Netlas
+        from netlas.retry import RetryPolicy
+        try:
+            mapping = Netlas(api_key=api_key, apibase=apibase, timeout=5,
+                             retry_policy=RetryPolicy(max_attempts=1),
+                             metadata_cache=MetadataCache()).mapping(datatype=datatype, is_facet=False)
+        except Exception:
+            # completion must never break the shell, e.g. without network or API key
+            return []
+    done, _, current = incomplete.rpartition(",")
+    prefix = f"{done}," if done else ""
+    return [CompletionItem(f"{prefix}{field}") for field in sorted(mapping_fields(mapping))
+            if field.startswith(current)]
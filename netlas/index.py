@@ -0,0 +1,242 @@
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+from netlas import jsonlib
+from netlas.download import detect_compression
+from netlas.exception import APIError
+
+MAGIC = b"NETLASIX"
+VERSION = 1
+# magic, version, field length, data file size, data file mtime, entry count, entries offset
+HEADER = struct.Struct(">8sIIQQQQ")
+# key hash, line offset; big-endian, so byte order of entries is their numeric order
+ENTRY = struct.Struct(">QQ")
+
+
+def key_hash(key) -> int:
+    """64-bit hash of an index key, non-string keys are indexed by their `str()`."""
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big")
+
+
+def field_values(doc, field: str) -> list:
+    """Scalar values of dotted `field` in `doc`, lists at any level are flattened."""
+    values = [doc]
+    for name in field.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, list):
+                found.extend(item.get(name) for item in value if isinstance(item, dict))
+            elif isinstance(value, dict):
+                found.append(value.get(name))
+        values = [v for v in found if v is not None]
+    flat = []
+    for value in values:
+        flat.extend(value if isinstance(value, list) else [value])
+    return [v for v in flat if not isinstance(v, (dict, list))]
+
+
+def _read_run(path: str, block_entries: int = 65536):
+    with open(path, "rb") as run:
+        while True:
+            block = run.read(ENTRY.size * block_entries)
+            if not block:
+                return
+            yield from ENTRY.iter_unpack(block)
+
+
+class NDJSONIndex:
+    """Sidecar offset index of an NDJSON file for lookups by a document field.
+
+    The index file (`<file>.idx` by default) holds `(hash of key, line offset)` entries
+    sorted by hash. Both files are memory-mapped; a lookup is a binary search over the
+    entries followed by reading the matching lines, so neither file is loaded into memory.
+    Hash collisions are resolved by comparing the field of found documents with the key.
+    Several documents may share a key, e.g. responses of one IP on different ports.
+
+    Build an index with :meth:`build`::
+
+        NDJSONIndex.build("responses.json", "ip")
+        with NDJSONIndex("responses.json") as index:
+            docs = index.get("1.1.1.1")
+    """
+
+    def __init__(self, path: str, index_path: str = None) -> None:
+        """NDJSONIndex constructor
+
+        :param path: Indexed NDJSON file path
+        :param index_path: Index file path, defaults to `<path>.idx`
+        :raises APIError: Index is missing, invalid or older than the data file
+        """
+        self.path = path
+        self.index_path = index_path or f"{path}.idx"
+        try:
+            self._index_file = open(self.index_path, "rb")
+        except OSError as ex:
+            raise APIError(f"Failed to open index {self.index_path}: {ex.strerror}, build it first")
+        self._data_file = None
+        self._index = self._data = None
+        try:
+            self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, field_len, size, mtime, count, entries = HEADER.unpack_from(self._index, 0)
+            if magic != MAGIC or version != VERSION:
+                raise APIError(f"{self.index_path} is not a netlas index")
+            self.field = self._index[HEADER.size:HEADER.size + field_len].decode()
+            self.count = count
+            self._entries = entries
+            stat = os.stat(path)
+            if stat.st_size != size or stat.st_mtime_ns != mtime:
+                raise APIError(f"Index {self.index_path} is outdated, rebuild it")
+            self._data_file = open(path, "rb")
+            if size:
+                self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (struct.error, ValueError, OSError) as ex:
+            self.close()
+            raise APIError(f"Failed to open index {self.index_path}: {ex}")
+        except APIError:
+            self.close()
+            raise
+
+    @classmethod
+    def build(cls, path: str, field: str, index_path: str = None, run_size: int = 1 << 20, on_progress=None) -> int:
+        """Index NDJSON file `path` by `field`.
+
+        Documents with several values of the field (lists) are indexed under each of them,
+        documents without it are skipped. Entries are sorted in runs of `run_size` and
+        merged from temporary files, so memory use does not depend on the file size.
+
+        :param path: NDJSON file path, e.g. output of `netlas download`
+        :param field: Dotted document field, e.g. `ip`, `domain` or `certificate.fingerprint_sha256`
+        :param index_path: Index file path, defaults to `<path>.idx`
+        :param run_size: Entries sorted in memory at once, defaults to 1048576 (about 100 MiB)
+        :param on_progress: Callback `on_progress(position, size)` with bytes read
+        :raises APIError: Compressed or invalid NDJSON file
+        :return: Number of index entries
+        """
+        if detect_compression(path):
+            raise APIError(f"Compressed file {path} can't be indexed, decompress it first")
+        index_path = index_path or f"{path}.idx"
+        stat = os.stat(path)
+        directory = os.path.dirname(os.path.abspath(index_path))
+        runs = []
+        count = 0
+        tmp_path = None
+        try:
+            entries = []
+            with open(path, "rb") as data:
+                offset = 0
+                for line in data:
+                    if line.strip():
+                        try:
+                            doc = jsonlib.loads(line)
+                        except ValueError:
+                            raise APIError(f"Invalid JSON document at offset {offset} of {path}")
+                        for value in field_values(doc, field):
+                            entries.append((key_hash(value) << 64) | offset)
+                    offset += len(line)
+                    if len(entries) >= run_size:
+                        runs.append(cls._write_run(entries, directory))
+                        count += len(entries)
+                        entries = []
+                        if on_progress:
+                            on_progress(offset, stat.st_size)
+            count += len(entries)
+            if runs and entries:
+                runs.append(cls._write_run(entries, directory))
+                entries = []
+            if on_progress:
+                on_progress(stat.st_size, stat.st_size)
+
+            field_bytes = field.encode()
+            start = -(-(HEADER.size + len(field_bytes)) // ENTRY.size) * ENTRY.size
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as output:
+                output.write(HEADER.pack(MAGIC, VERSION, len(field_bytes), stat.st_size, stat.st_mtime_ns, count, start))
+                output.write(field_bytes)
+                output.write(b"\0" * (start - HEADER.size - len(field_bytes)))
+                if runs:
+                    merged = heapq.merge(*[_read_run(run) for run in runs])
+                else:
+                    merged = ((entry >> 64, entry & 0xFFFFFFFFFFFFFFFF) for entry in sorted(entries))
+                block = bytearray()
+                for entry in merged:
+                    block += ENTRY.pack(*entry)
+                    if len(block) >= 1 << 20:
+                        output.write(block)
+                        block.clear()
+                output.write(block)
+            os.replace(tmp_path, index_path)
+            tmp_path = None
+        finally:
+            for run in runs:
+                os.remove(run)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return count
+
+    @staticmethod
+    def _write_run(entries: list, directory: str) -> str:
+        entries.sort()
+        fd, run_path = tempfile.mkstemp(dir=directory, suffix=".run")
+        with os.fdopen(fd, "wb") as run:
+            block = bytearray()
+            for entry in entries:
+                block += ENTRY.pack(entry >> 64, entry & 0xFFFFFFFFFFFFFFFF)
+            run.write(block)
+        return run_path
+
+    def _hash_at(self, position: int) -> int:
+        return struct.unpack_from(">Q", self._index, self._entries + position * ENTRY.size)[0]
+
+    def offsets(self, key) -> list:
+        """Line offsets of documents with hash of `key`, including rare hash collisions."""
+        target = key_hash(key)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._hash_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        offsets = []
+        while lo < self.count:
+            entry_hash, offset = ENTRY.unpack_from(self._index, self._entries + lo * ENTRY.size)
+            if entry_hash != target:
+                break
+            offsets.append(offset)
+            lo += 1
+        return offsets
+
+    def line(self, offset: int) -> bytes:
+        """Raw document line at `offset` of the data file."""
+        end = self._data.find(b"\n", offset)
+        return self._data[offset:end if end != -1 else len(self._data)].rstrip(b"\r")
+
+    def get(self, key) -> list:
+        """Documents whose field equals `key` (compared as strings), in file order."""
+        docs = []
+        for offset in sorted(set(self.offsets(key))):
+            doc = jsonlib.loads(self.line(offset))
+            if str(key) in [str(value) for value in field_values(doc, self.field)]:
+                docs.append(doc)
+        return docs
+
+    def __contains__(self, key) -> bool:
+        return bool(self.get(key))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        for handle in [self._data, self._data_file, self._index, self._index_file]:
+            if handle is not None:
+                handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
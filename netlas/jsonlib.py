@@ -0,0 +1,210 @@
+"""JSON backend of the package.
+
+API responses, caches and CLI output are decoded and encoded with the fastest
+installed library: `orjson`, then `simdjson` (pysimdjson), then the standard
+`json` module. Set `NETLAS_JSON=orjson|simdjson|json` or call :func:`use` to
+choose a backend explicitly. Note that orjson reads integers beyond 64 bits as floats.
+"""
+import codecs
+import json
+import os
+
+BACKENDS = ["orjson", "simdjson", "json"]
+
+_backend = None
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+def _stdlib_dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def _load(name: str):
+    if name == "orjson":
+        import orjson
+
+        def dumps(obj) -> str:
+            try:
+                return orjson.dumps(obj).decode()
+            except TypeError:
+                # non-string keys, integers beyond 64 bits and other types orjson rejects
+                return _stdlib_dumps(obj)
+
+        return name, orjson.loads, dumps
+    if name == "simdjson":
+        import simdjson
+        return name, simdjson.loads, _stdlib_dumps
+    if name == "json":
+        return name, _stdlib_loads, _stdlib_dumps
+    raise ValueError(f"Unknown JSON backend '{name}', choices: {', '.join(BACKENDS)}")
+
+
+def use(name: str = None) -> str:
+    """Select JSON backend by name, or the fastest installed one if `name` is None.
+
+    :raises ValueError: Unknown backend name
+    :raises ImportError: Backend library is not installed
+    :return: Name of the selected backend
+    """
+    global _backend
+    if name is not None:
+        _backend = _load(name)
+        return name
+    for candidate in BACKENDS:
+        try:
+            _backend = _load(candidate)
+            return candidate
+        except ImportError:
+            continue
+
+
+def _get():
+    if _backend is None:
+        use(os.environ.get("NETLAS_JSON") or None)
+    return _backend
+
+
+def backend() -> str:
+    """Name of the JSON backend in use."""
+    return _get()[0]
+
+
+def loads(data):
+    """Decode JSON document from `bytes` or `str`.
+
+    :raises ValueError: Invalid JSON (`json.JSONDecodeError` or its backend equivalent)
+    """
+    return _get()[1](data)
+
+
+def dumps(obj, compact: bool = True) -> str:
+    """Encode `obj` to JSON string.
+
+    :param compact: Compact output of the selected backend. Otherwise the output keeps the
+                    layout of `json.dumps` defaults (`", "`/`": "` separators, escaped non-ASCII),
+                    which fast encoders cannot produce, so the standard module is used.
+    """
+    if not compact:
+        return json.dumps(obj)
+    return _get()[2](obj)
+
+
+def iter_ndjson(data: bytes):
+    """Decode NDJSON body one record at a time, without splitting it into a list of lines first."""
+    decode = _get()[1]
+    start = 0
+    end = len(data)
+    while start < end:
+        stop = data.find(b"\n", start)
+        if stop == -1:
+            stop = end
+        line = data[start:stop]
+        if line.strip():
+            yield decode(line)
+        start = stop + 1
+
+
+def iter_ndjson_lines(lines):
+    """Decode NDJSON records from an iterable of lines (e.g. `Response.iter_lines()`)."""
+    decode = _get()[1]
+    for line in lines:
+        if line and line.strip():
+            yield decode(line)
+
+
+_WHITESPACE = " \t\r\n"
+
+
+class _ChunkReader:
+    """Text buffer over an iterator of byte blocks, trimmed as values are consumed."""
+
+    def __init__(self, chunks) -> None:
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, min_size: int = 1) -> bool:
+        """Read blocks until `min_size` characters are available after `pos`, False at the end of input."""
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        while len(self.buffer) < min_size and not self.eof:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                self.buffer += self.decoder.decode(b"", final=True)
+            else:
+                self.buffer += self.decoder.decode(chunk)
+        return len(self.buffer) >= min_size
+
+    def peek(self) -> str:
+        """Next non-whitespace character, empty at the end of input."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON stream")
+        self.pos += 1
+
+    def value(self, decoder: json.JSONDecoder):
+        """Decode one complete JSON value, reading more blocks while it is truncated."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # at least double the buffer, so a large value is not re-parsed per block
+                self.fill(2 * (len(self.buffer) - self.pos) + 1)
+                continue
+            if (not self.eof and self.buffer[self.pos] in "-0123456789"
+                    and (end == len(self.buffer) or self.buffer[end] not in _WHITESPACE + ",]}")):
+                # a number may continue in the next block, e.g. `1.5e` + `3`
+                self.fill(len(self.buffer) - self.pos + 1)
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks, key: str = None):
+    """Decode elements of a JSON array one at a time from an iterator of byte blocks.
+
+    Memory use is bounded by the largest element, not by the document. The array is
+    either the document itself or, for an object, the member `key` (the first
+    array-valued member if `key` is None). Members before it are decoded and skipped,
+    members after it are not read.
+
+    :raises ValueError: Invalid JSON or no matching array
+    """
+    reader = _ChunkReader(chunks)
+    decoder = json.JSONDecoder()
+    if reader.peek() == "{":
+        reader.pos += 1
+        while True:
+            if reader.peek() == "}":
+                raise ValueError(f"No array member '{key}' in JSON object" if key else "No array member in JSON object")
+            name = reader.value(decoder)
+            reader.expect(":")
+            if reader.peek() == "[" and (key is None or name == key):
+                break
+            reader.value(decoder)
+            if reader.peek() == ",":
+                reader.pos += 1
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value(decoder)
+        if reader.peek() == "]":
+            return
+        reader.expect(",")
@@ -0,0 +1,156 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Tokens are refilled continuously at `rate` per second up to `capacity`.
+    `acquire` blocks until a token is available. A bucket without a rate is
+    unlimited, but still honours pauses (e.g. from `Retry-After`).
+    """
+
+    def __init__(self, rate: float = None, capacity: float = None) -> None:
+        """TokenBucket constructor
+
+        :param rate: Refill rate, tokens per second, unlimited if None
+        :param capacity: Maximum burst size, defaults to `rate` (one second of tokens)
+        """
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate, capacity)
+
+    def set_rate(self, rate: float = None, capacity: float = None) -> None:
+        """Change refill rate and burst size of the bucket."""
+        with self.lock:
+            was_limited = getattr(self, "rate", None) is not None
+            self.rate = float(rate) if rate else None
+            if self.rate is None:
+                self.capacity = self.tokens = 0.0
+                return
+            self.capacity = float(capacity if capacity is not None else max(self.rate, 1.0))
+            self.tokens = min(self.tokens, self.capacity) if was_limited else self.capacity
+
+    def pause(self, seconds: float) -> None:
+        """Hold all `acquire` calls for `seconds` from now."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens` from the bucket, sleeping until they are available.
+
+        :return: Total time spent waiting, in seconds
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.rate is None:
+                    return waited
+                else:
+                    self._refill(now)
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return waited
+                    delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def endpoint_class(endpoint: str) -> str:
+    """Map API endpoint to its rate-limit budget: search, count, download, host or default."""
+    if endpoint.startswith("/api/host"):
+        return "host"
+    if endpoint.endswith("/download/"):
+        return "download"
+    if endpoint.endswith("_count/"):
+        return "count"
+    if endpoint in ["/api/responses/", "/api/certs/", "/api/domains/", "/api/whois_ip/", "/api/whois_domains/"]:
+        return "search"
+    return "default"
+
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(str(value).split(",")[0].split(";")[0].strip())
+            except ValueError:
+                pass
+    return None
+
+
+class RateLimiter:
+    """Proactive client-side rate limiter with separate budgets per endpoint class.
+
+    One limiter may be shared by any number of threads and :class:`netlas.client.Netlas`
+    instances (see :meth:`RateLimiter.shared`). Budgets are adjusted from
+    `X-RateLimit-*`/`RateLimit-*` and `Retry-After` response headers.
+    """
+
+    CLASSES = ["search", "count", "download", "host", "default"]
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rates: dict = None) -> None:
+        """RateLimiter constructor
+
+        :param rates: Requests per second for each endpoint class, e.g. `{"search": 1, "host": 5}`.
+                      Classes that are not listed are unlimited until response headers say otherwise.
+        """
+        rates = rates or {}
+        self.buckets = {name: TokenBucket(rates.get(name)) for name in self.CLASSES}
+
+    @classmethod
+    def shared(cls) -> "RateLimiter":
+        """Process-wide limiter instance."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def acquire(self, name: str = "default") -> float:
+        """Wait for the budget of endpoint class `name`.
+
+        :return: Time spent waiting, in seconds
+        """
+        return self.buckets.get(name, self.buckets["default"]).acquire()
+
+    def update_from_headers(self, name: str, headers, status_code: int = 200) -> None:
+        """Learn limits of endpoint class `name` from response headers."""
+        bucket = self.buckets.get(name, self.buckets["default"])
+        retry_after = _header(headers, "Retry-After")
+        if status_code == 429 and retry_after is not None:
+            bucket.pause(retry_after)
+            return
+
+        limit = _header(headers, "X-RateLimit-Limit", "RateLimit-Limit")
+        window = _header(headers, "X-RateLimit-Window")
+        policy = headers.get("RateLimit-Policy")
+        if window is None and policy and "w=" in policy:
+            try:
+                window = float(policy.split("w=")[1].split(";")[0].split(",")[0])
+            except ValueError:
+                window = None
+        if limit and window:
+            rate = limit / window
+            if bucket.rate is None or abs(bucket.rate - rate) > 1e-9:
+                bucket.set_rate(rate, limit)
+
+        remaining = _header(headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+        reset = _header(headers, "X-RateLimit-Reset", "RateLimit-Reset")
+        if remaining is not None and remaining <= 0 and reset is not None:
+            if reset > 1e9:  # epoch timestamp instead of delta seconds
+                reset -= time.time()
+            if reset > 0:
+                bucket.pause(reset)
@@ -0,0 +1,82 @@
+import random
+import time
+
+import requests
+
+
+class RetryPolicy:
+    """Retry policy for transient failures of Netlas API requests.
+
+    Applies to connection errors, timeouts and gateway errors (502/503/504).
+    Throttling (429) is handled separately by the `throttling`/`retry` arguments
+    of API methods. Only idempotent requests are retried unless a request is
+    explicitly marked as safe to repeat.
+    """
+
+    IDEMPOTENT_METHODS = ["get", "head", "options", "put", "delete"]
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        jitter: bool = True,
+        deadline: float = None,
+        status_codes: list = [502, 503, 504],
+        exceptions: tuple = (requests.exceptions.ConnectionError,
+                             requests.exceptions.Timeout,
+                             requests.exceptions.ChunkedEncodingError),
+        methods: list = IDEMPOTENT_METHODS,
+    ) -> None:
+        """RetryPolicy constructor
+
+        :param max_attempts: Total number of attempts including the first one, 1 disables retries, defaults to 3
+        :param backoff_factor: Delay before the first retry in seconds, doubled on each next one, defaults to 0.5
+        :param max_backoff: Upper bound of a single delay in seconds, defaults to 30.0
+        :param jitter: Randomize delays ("full jitter") to spread retries of concurrent clients, defaults to True
+        :param deadline: Total time budget in seconds for all attempts, unlimited by default
+        :param status_codes: HTTP status codes to retry
+        :param exceptions: Exception classes to retry
+        :param methods: HTTP methods considered safe to retry
+        """
+        self.max_attempts = max(int(max_attempts), 1)
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.status_codes = list(status_codes)
+        self.exceptions = tuple(exceptions)
+        self.methods = [m.lower() for m in methods]
+
+    def backoff(self, attempt: int) -> float:
+        """Delay in seconds after failed attempt number `attempt` (starting from 1)."""
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def is_retryable(self, error=None, status_code: int = None) -> bool:
+        """Check if an exception or HTTP status code is a transient failure."""
+        if error is not None:
+            return isinstance(error, self.exceptions)
+        return status_code in self.status_codes
+
+    def next_delay(self, attempt: int, started: float, method: str = "get", idempotent: bool = None, retry_after: float = None):
+        """Delay before the next attempt, or None if the request must not be retried.
+
+        :param attempt: Number of the failed attempt, starting from 1
+        :param started: `time.monotonic()` value at the first attempt
+        :param method: HTTP method of the request
+        :param idempotent: Override method-based idempotency check
+        :param retry_after: Minimal delay requested by the server
+        """
+        if idempotent is None:
+            idempotent = method.lower() in self.methods
+        if not idempotent or attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        if self.deadline is not None and time.monotonic() - started + delay > self.deadline:
+            return None
+        return delay
@@ -22,6 +22,14 @@ setup(
     ],
     entry_points={"console_scripts": ["netlas=netlas.__main__:main"]},
     install_requires=DEPENDENCIES,
+    extras_require={
+        "async": ["aiohttp>=3.8"],
+        "zstd": ["zstandard>=0.15"],
+        "lz4": ["lz4>=3.0"],
+        "parquet": ["pyarrow>=8.0"],
+        "orjson": ["orjson>=3.6"],
+        "simdjson": ["pysimdjson>=5.0"],
+    },
     keywords=["security", "network"],
     python_requires=">=3.6",
 )
@@ -1,5 +1,14 @@
+import asyncio
+import gzip
+import os
+import tempfile
 import unittest
 import netlas
+from netlas import jsonlib
+from netlas.datastore import DatastoreSync
+from netlas.discovery import DiscoveryBatch, DiscoveryCrawler
+from netlas.download import PartitionedDownload
+from netlas.export import ParquetExport
 from dotenv import dotenv_values
 
 config = dotenv_values(".env")
@@ -36,6 +45,17 @@ class NetlasTests(unittest.TestCase):
         self.assertIn('items', results)
         self.assertIn('data', results['items'][0])
 
+    def test_search_iter(self):
+        items = list(self.netlas.search_iter(query=self.RESPONSE_QUERIES['empty'],
+                                             datatype="response"))
+        self.assertCountEqual([], items)
+
+        items = list(self.netlas.search_iter(query="port:443",
+                                             datatype="response",
+                                             max_results=45))
+        self.assertEqual(45, len(items))
+        self.assertIn('data', items[0])
+
     def test_cert_query(self):
         results = self.netlas.query(query=self.CERT_QUERIES['empty'],
                                     datatype="cert")
@@ -88,10 +108,493 @@ class NetlasTests(unittest.TestCase):
             bin_results += results
         self.assertLess(b'', bin_results)
 
+    def test_resumable_download_all(self):
+        query = 'host:1.1.1.1'
+        expected = self.netlas.count(query=query)['count']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'out.json')
+            checkpoint = f'{path}.checkpoint'
+            written = self.netlas.download_all_to_file(path, query=query, checkpoint=checkpoint)
+            self.assertEqual(expected, written)
+            with open(path, 'rb') as f:
+                self.assertEqual(expected, len(f.read().splitlines()))
+            self.assertFalse(os.path.exists(checkpoint))
+
+    def test_parallel_download_all(self):
+        query = 'host:1.1.1.1'
+        expected = self.netlas.count(query=query)['count']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'out.json')
+            written = self.netlas.download_all_to_file(path, query=query, parallel=4)
+            self.assertEqual(expected, written)
+            self.assertEqual(['out.json'], os.listdir(tmp_dir))
+
+    def test_compressed_download_all(self):
+        query = 'host:1.1.1.1'
+        expected = self.netlas.count(query=query)['count']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'out.json.gz')
+            written = self.netlas.download_all_to_file(path, query=query, parallel=2)
+            self.assertEqual(expected, written)
+            with gzip.open(path, 'rb') as f:
+                self.assertEqual(expected, len(f.read().splitlines()))
+
+    def test_compressed_partition_retry(self):
+        class FlakyClient:
+            calls = 0
+
+            def count(self, query, datatype, indices):
+                return {"count": 3}
+
+            def download_raw(self, **kwargs):
+                FlakyClient.calls += 1
+                yield b'{"n": 1}\n{"n": 2}\n'
+                if FlakyClient.calls == 1:
+                    raise netlas.APIError("Stream broken")
+                yield b'{"n": 3}\n'
+
+        codecs = {"gzip": gzip.open}
+        try:
+            import lz4.frame
+            codecs["lz4"] = lz4.frame.open
+        except ImportError:
+            pass
+        for codec, open_compressed in codecs.items():
+            FlakyClient.calls = 0
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, f'out.{codec}')
+                job = PartitionedDownload(FlakyClient(), "q", datatype="cert", retries=1, compress=codec,
+                                          partitions=[{"key": "all", "query": "q"}])
+                self.assertEqual(3, job.run(path))
+                with open_compressed(path, 'rb') as f:
+                    self.assertEqual(3, len(f.read().splitlines()))
+
+    def test_partition_cursor(self):
+        class BrokenClient:
+            calls = 0
+
+            def count(self, query, datatype, indices):
+                return {"count": 10}
+
+            def download_raw(self, **kwargs):
+                BrokenClient.calls += 1
+                data = b"".join(b'{"n": %d}\n' % i for i in range(10))
+                for i in range(0, len(data), 7):
+                    if BrokenClient.calls == 1 and i >= 50:
+                        raise netlas.APIError("Stream broken")
+                    yield data[i:i + 7]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'out.json')
+            checkpoint = f'{path}.checkpoint'
+            job = PartitionedDownload(BrokenClient(), "q", datatype="whois-ip", retries=0, checkpoint=checkpoint,
+                                      cursor_interval=0)
+            self.assertRaises(netlas.APIError, job.run, path)
+            job = PartitionedDownload(BrokenClient(), "q", datatype="whois-ip", retries=0, checkpoint=checkpoint,
+                                      cursor_interval=0)
+            cursor = job.prepare(path)[0]["cursor"]
+            self.assertGreater(cursor["docs"], 0)
+            self.assertLessEqual(cursor["offset"], os.path.getsize(path))
+            written = []
+            self.assertEqual(10, job.run(path, on_progress=lambda key, docs: written.append(docs)))
+            # the resumed run only writes documents after the cursor
+            self.assertEqual(10 - cursor["docs"], sum(written))
+            with open(path, 'rb') as f:
+                self.assertEqual([{"n": i} for i in range(10)], [jsonlib.loads(line) for line in f])
+
+    def test_parquet_download(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'out.parquet')
+            written = self.netlas.download_to_parquet(path, query=self.RESPONSE_QUERIES['small'], size=10)
+            self.assertEqual(10, written)
+            table = pyarrow.parquet.read_table(path)
+            self.assertEqual(10, table.num_rows)
+            self.assertIn('ip', table.column_names)
+
     def test_profile(self):
         results = self.netlas.profile()
         self.assertIn('email', results)
 
+    def test_parquet_multi_valued(self):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        docs = [{'ip': '1.1.1.1', 'port': 80}, {'ip': '1.1.1.2', 'port': [80, 443]}, {'ip': '1.1.1.3', 'port': [22]}]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'out.parquet')
+            with ParquetExport(path, columns={'ip': 'string', 'port': 'int64'}, row_group_size=2) as writer:
+                for doc in docs:
+                    writer.write(doc)
+            # lists in the first row group are found before it is written
+            table = pyarrow.parquet.read_table(path)
+            self.assertEqual([[80], [80, 443], [22]], table.column('port').to_pylist())
+            self.assertEqual(['1.1.1.1', '1.1.1.2', '1.1.1.3'], table.column('ip').to_pylist())
+
+            # a late promotion continues in a new file instead of rewriting the written one
+            path = os.path.join(tmp_dir, 'late.parquet')
+            with ParquetExport(path, columns={'ip': 'string', 'port': 'int64'}, row_group_size=1) as writer:
+                for doc in docs:
+                    writer.write(doc)
+            self.assertEqual([path, os.path.join(tmp_dir, 'late.1.parquet')], writer.paths)
+            self.assertEqual([80], pyarrow.parquet.read_table(writer.paths[0]).column('port').to_pylist())
+            self.assertEqual([[80, 443], [22]], pyarrow.parquet.read_table(writer.paths[1]).column('port').to_pylist())
+
+    def test_host_many(self):
+        hosts = ['1.1.1.1', '8.8.8.8', 'netlas.io']
+        results = list(self.netlas.host_many(hosts, workers=2, ordered=True))
+        self.assertEqual(hosts, [host for host, _ in results])
+        for _, result in results:
+            self.assertIsInstance(result, dict)
+
+    def test_shared_rate_limiter(self):
+        limiter = netlas.RateLimiter({"count": 2})
+        connection = netlas.Netlas(api_key=config['TEST_API_KEY'],
+                                   apibase=config['TEST_API_SERVER'],
+                                   rate_limiter=limiter)
+        other_connection = netlas.Netlas(api_key=config['TEST_API_KEY'],
+                                         apibase=config['TEST_API_SERVER'],
+                                         rate_limiter=limiter)
+        for conn in [connection, other_connection, connection]:
+            results = conn.count(query=self.RESPONSE_QUERIES['small'])
+            self.assertIn('count', results)
+
+    def test_retry_policy(self):
+        connection = netlas.Netlas(api_key=config['TEST_API_KEY'],
+                                   apibase=config['TEST_API_SERVER'],
+                                   retry_policy=netlas.RetryPolicy(max_attempts=5, deadline=30))
+        self.assertIn('email', connection.profile())
+
+    def test_response_cache(self):
+        cache = netlas.ResponseCache(netlas.MemoryCache(maxsize=16))
+        connection = netlas.Netlas(api_key=config['TEST_API_KEY'],
+                                   apibase=config['TEST_API_SERVER'],
+                                   cache=cache)
+        first = connection.count(query=self.RESPONSE_QUERIES['small'])
+        second = connection.count(query=self.RESPONSE_QUERIES['small'])
+        self.assertEqual(first, second)
+        stats = cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+
+    def test_metadata_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            connection = netlas.Netlas(api_key=config['TEST_API_KEY'],
+                                       apibase=config['TEST_API_SERVER'],
+                                       metadata_cache=netlas.MetadataCache(tmp))
+            mapping = connection.mapping(datatype="response", is_facet=False)
+            self.assertEqual(mapping, connection.mapping(datatype="response", is_facet=False))
+            self.assertEqual(["no_such_field"], connection.unknown_fields("no_such_field"))
+
+    def test_json_backends(self):
+        body = b'{"ip": "1.1.1.1", "ports": [80, 443]}\n\n{"ip": "8.8.8.8"}\n'
+        expected = [{"ip": "1.1.1.1", "ports": [80, 443]}, {"ip": "8.8.8.8"}]
+        selected = jsonlib.backend()
+        try:
+            for name in jsonlib.BACKENDS:
+                try:
+                    jsonlib.use(name)
+                except ImportError:
+                    continue
+                self.assertEqual(expected, list(jsonlib.iter_ndjson(body)))
+                self.assertEqual(expected[0], jsonlib.loads(jsonlib.dumps(expected[0])))
+        finally:
+            jsonlib.use(selected)
+
+    def test_json_array_stream(self):
+        body = b'{"scan": {"id": 1}, "items": [{"ip": "1.1.1.1"}, 1.5e3, "x\\"]", null]}'
+        expected = [{"ip": "1.1.1.1"}, 1500.0, 'x"]', None]
+        for size in [1, 3, len(body)]:
+            chunks = [body[i:i + size] for i in range(0, len(body), size)]
+            self.assertEqual(expected, list(jsonlib.iter_json_array(chunks)))
+            self.assertEqual(expected, list(jsonlib.iter_json_array(chunks, key="items")))
+
+    def test_discovery_result_stream(self):
+        count = self.netlas.discovery_node_count(node_type="domain", node_value="netlas.io")
+        search_field_id = count["data"][0]["search_field_id"]
+        result = self.netlas.discovery_node_result(x_count_id=count["x_count_id"],
+                                                   node_type="domain",
+                                                   node_value="netlas.io",
+                                                   search_field_id=search_field_id,
+                                                   stream=True)
+        for record in result["data"]:
+            self.assertIsInstance(record, dict)
+
+    def test_wait_discovery(self):
+        count = self.netlas.discovery_node_count(node_type="domain", node_value="netlas.io")
+        progress = []
+        status = self.netlas.wait_discovery(count["x_stream_id"],
+                                            timeout=120,
+                                            on_progress=lambda percentage, message, data: progress.append(percentage))
+        self.assertIsInstance(status, dict)
+        self.assertTrue(progress)
+
+    def test_wait_discovery_polling(self):
+        class Clock:
+            delays = []
+
+            def is_set(self):
+                return False
+
+            def wait(self, delay):
+                self.delays.append(delay)
+
+        client = netlas.Netlas(api_key="key", apibase="http://127.0.0.1:1")
+        statuses = iter([10, 20, 30, 30, 30, 40, 100])
+        calls = []
+
+        def discovery_status(x_stream_id):
+            calls.append(x_stream_id)
+            return {"data": {"percentage": next(statuses)}}
+
+        client.discovery_status = discovery_status
+        clock = Clock()
+        status = client.wait_discovery("stream", cancel=clock)
+        self.assertEqual(100, status["percentage"])
+        self.assertEqual(7, len(calls))
+        # steady progress keeps the starting interval, a stall backs off and progress does not speed it up
+        self.assertEqual([0.5, 0.5, 0.5, 0.75, 1.125, 1.125], clock.delays)
+        self.assertGreaterEqual(min(clock.delays), 0.5)
+
+    def test_discovery_batch(self):
+        seeds = [("domain", "netlas.io"), ("domain", "NETLAS.IO"), ("domain", "app.netlas.io")]
+        records = 0
+        for node_type, node_values, search_field_id, record in self.netlas.discovery_batch(seeds, chunk_size=1, timeout=120):
+            self.assertNotIsInstance(record, Exception)
+            self.assertIn(node_values, [["netlas.io"], ["app.netlas.io"]])
+            records += 1
+        self.assertGreater(records, 0)
+
+    def test_discovery_batch_failure(self):
+        class BrokenClient:
+            def discovery_node_count(self, node_type, node_value):
+                if node_value == "broken.io":
+                    raise ValueError("Malformed count response")
+                return {"x_count_id": "1", "data": [{"search_field_id": 1, "count": 1}]}
+
+            def discovery_node_result(self, x_count_id, node_type, node_value, search_field_id, stream):
+                return {"data": (record for record in [{"domain": node_value}])}
+
+        seeds = [("domain", "netlas.io"), ("domain", "broken.io")]
+        records = {values[0]: record for _, values, _, record in DiscoveryBatch(BrokenClient(), seeds, chunk_size=1).run()}
+        self.assertEqual({"domain": "netlas.io"}, records["netlas.io"])
+        self.assertIsInstance(records["broken.io"], ValueError)
+
+    def test_discovery_crawl(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            state = os.path.join(tmp, "crawl.json")
+            nodes = set()
+            for node_type, node_value, depth, _, record in self.netlas.discovery_crawl([("domain", "netlas.io")],
+                                                                                       max_depth=1,
+                                                                                       max_nodes=3,
+                                                                                       state=state,
+                                                                                       timeout=120):
+                self.assertLessEqual(depth, 1)
+                nodes.add((node_type, node_value))
+            self.assertIn(("domain", "netlas.io"), nodes)
+            self.assertLessEqual(len(nodes), 3)
+            self.assertTrue(os.path.exists(state))
+
+    def test_discovery_crawl_state(self):
+        class GraphClient:
+            graph = {"a.com": ["b.com", "c.com"], "b.com": ["d.com"], "c.com": ["d.com", "e.com"]}
+            produced = 0
+
+            def discovery_node_count(self, node_type, node_value):
+                return {"x_count_id": "1", "data": [{"search_field_id": 1, "count": 1}]}
+
+            def discovery_node_result(self, x_count_id, node_type, node_value, search_field_id, stream):
+                def records():
+                    for child in self.graph.get(node_value, []):
+                        GraphClient.produced += 1
+                        yield {"domain": child}
+                    for i in range(200):
+                        GraphClient.produced += 1
+                        yield {"ip": f"10.0.0.{i}"}
+                return {"data": records()}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            state = os.path.join(tmp, "crawl.json")
+            crawler = DiscoveryCrawler(GraphClient(), [("domain", "a.com")], max_nodes=2, follow=["domain"],
+                                       state=state, workers=1, buffer=10)
+            crawl = crawler.run()
+            next(crawl)
+            # records are streamed, not collected per node
+            self.assertLessEqual(GraphClient.produced, 12)
+            nodes = {(t, v) for t, v, _, _, _ in crawl}
+            self.assertEqual({"a.com", "b.com"}, {v for _, v in nodes})
+            self.assertLess(os.path.getsize(state), 1024)
+
+            resumed = DiscoveryCrawler(GraphClient(), [], follow=["domain"], state=state, workers=2)
+            nodes = {v for _, v, _, _, _ in resumed.run()}
+            self.assertEqual({"c.com", "d.com", "e.com"}, nodes)
+            self.assertEqual(5, resumed.expanded)
+
+    def test_dataset_checksum(self):
+        from netlas.datastore import etag_md5, parse_checksum, response_checksum
+        digest = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+        self.assertEqual(("sha256", digest), parse_checksum(f"SHA-256:{digest.upper()}"))
+        self.assertEqual(("sha256", digest), parse_checksum(digest))
+        self.assertRaises(netlas.APIError, parse_checksum, "sha256:xyz")
+        etag = '"d41d8cd98f00b204e9800998ecf8427e"'
+        self.assertIsNone(response_checksum({"ETag": etag}))
+        self.assertEqual(("md5", etag.strip('"')), etag_md5({"ETag": etag}))
+        self.assertIsNone(etag_md5({"ETag": f"W/{etag}"}))
+        self.assertIsNone(etag_md5({"ETag": '"d41d8cd98f00b204e9800998ecf8427e-4"'}))
+        self.assertEqual(("md5", "1b2cf535f27731c974343645a3985328"),
+                         response_checksum({"Content-MD5": "Gyz1NfJ3Mcl0NDZFo5hTKA=="}))
+
+    def test_datastore_sync_plan(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = self.netlas.sync_datastore(tmp_dir, dry_run=True)
+            self.assertEqual([], result['unchanged'])
+            self.assertEqual([], result['pruned'])
+            self.assertEqual([], os.listdir(tmp_dir))
+
+    def test_dataset_segments_retried(self):
+        from netlas.datastore import DatasetDownload
+        data = bytes(range(256)) * 40
+
+        class Response:
+            def __init__(self, start, end):
+                self.status_code = 206
+                self.headers = {'Content-Range': f'bytes {start}-{end}/{len(data)}', 'ETag': '"v1"'}
+                self.body = data[start:end + 1]
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def iter_content(self, chunk_size):
+                return iter([self.body])
+
+        class Client:
+            calls = []
+
+            def _send_with_retries(self, method, endpoint, url, headers, **kwargs):
+                start, _, end = headers['Range'][6:].partition('-')
+                self.calls.append((url, headers['Range']))
+                return Response(int(start), int(end))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'd.bin')
+            DatasetDownload(Client(), 'https://files/d.bin', path, segment_size=4096).run()
+            with open(path, 'rb') as f:
+                self.assertEqual(data, f.read())
+        self.assertEqual(['bytes=0-0', 'bytes=0-4095', 'bytes=4096-8191', 'bytes=8192-10239'],
+                         sorted(header for _, header in Client.calls))
+
+    def test_datastore_sync_keeps_unselected(self):
+        class Listing:
+            def datasets(self):
+                return [{'id': 7, 'updated_at': '2024-01-01'}, {'id': 9, 'updated_at': '2024-01-01'}]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, '.netlas-manifest.json'), 'w') as f:
+                f.write('{"datasets": {"9": {"file": "9/b.bin", "version": "2024-01-01", "size": 1}}}')
+            self.assertEqual([], DatastoreSync(Listing(), tmp_dir, ids=[7]).plan()['prune'])
+            self.assertEqual(['9'], DatastoreSync(Listing(), tmp_dir, ids=[7], prune=True).plan()['prune'])
+
+    def test_scan_get_many(self):
+        scans = self.netlas.scans()
+        ids = [scan["id"] for scan in scans[:3]] if isinstance(scans, list) else []
+        results = list(self.netlas.scan_get_many(ids, workers=2))
+        self.assertEqual(ids, [scan_id for scan_id, _ in results])
+        for _, result in results:
+            self.assertIsInstance(result, dict)
+
+    def test_scan_report_stream(self):
+        scans = self.netlas.scans()
+        if not isinstance(scans, list) or not scans:
+            self.skipTest('no scans available')
+        scan_id = scans[0]["id"]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'report.json.gz')
+            self.netlas.scan_report_to_file(scan_id, path)
+            with gzip.open(path, 'rb') as f:
+                self.assertEqual(self.netlas.get_scan_report(id=scan_id), jsonlib.loads(f.read()))
+
+    def test_wait_scans(self):
+        scans = self.netlas.scans()
+        done = [scan["id"] for scan in scans
+                if str(scan.get("status")).lower() in netlas.Netlas.SCAN_DONE][:2] if isinstance(scans, list) else []
+        completed = []
+        result = self.netlas.wait_scans(done, timeout=60,
+                                        on_complete=lambda scan_id, scan, report: completed.append(scan_id))
+        self.assertEqual(sorted(done), sorted(completed))
+        self.assertEqual(sorted(done), sorted(result))
+
+    def test_wait_scans_pages(self):
+        connection = netlas.Netlas(api_key='', apibase='http://127.0.0.1:1')
+        ticks = []
+        connection.scans = lambda: ticks.append(1) or {
+            'results': [{'id': 1, 'status': 'done'}], 'next': 'http://127.0.0.1:1/api/scanner/?page=2'}
+        pages = []
+        connection._request = lambda endpoint: pages.append(endpoint) or {
+            'results': [{'id': 2, 'status': 'done' if len(ticks) > 1 else 'running'}], 'next': None}
+
+        def scan_get(id):
+            if id == 4:
+                raise netlas.APIError('Not found')
+            return {'id': id, 'status': 'done' if len(ticks) > 2 else 'running'}
+        connection.scan_get = scan_get
+        result = connection.wait_scans([1, 2, 3, 4], min_interval=0)
+        self.assertEqual(3, len(ticks))
+        self.assertEqual(['/api/scanner/?page=2'] * 3, pages)
+        self.assertEqual({1: 'done', 2: 'done', 3: 'done'},
+                         {key: scan['status'] for key, scan in result.items() if scan is not None})
+        self.assertIsNone(result[4])
+
+    def test_ndjson_index(self):
+        docs = [{"ip": f"10.0.0.{i % 10}", "port": i, "domain": [f"a{i}.com", f"b{i}.com"]} for i in range(100)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'out.json')
+            with open(path, 'w') as f:
+                f.write("\n".join(jsonlib.dumps(doc) for doc in docs))
+            self.assertEqual(100, netlas.NDJSONIndex.build(path, "ip", run_size=30))
+            with netlas.NDJSONIndex(path) as index:
+                self.assertEqual([doc for doc in docs if doc["ip"] == "10.0.0.3"], index.get("10.0.0.3"))
+                self.assertEqual([], index.get("10.0.0.10"))
+            domain_index = os.path.join(tmp_dir, 'domain.idx')
+            self.assertEqual(200, netlas.NDJSONIndex.build(path, "domain", index_path=domain_index))
+            with netlas.NDJSONIndex(path, index_path=domain_index) as index:
+                self.assertEqual([docs[42]], index.get("b42.com"))
+
+    def test_session_context_manager(self):
+        with netlas.Netlas(api_key=config['TEST_API_KEY'],
+                           apibase=config['TEST_API_SERVER']) as connection:
+            self.assertIn('email', connection.profile())
+            self.assertIn('email', connection.profile())
+
+
+class AsyncNetlasTests(unittest.TestCase):
+
+    def setUp(self):
+        self.netlas = netlas.AsyncNetlas(api_key=config['TEST_API_KEY'],
+                                         apibase=config['TEST_API_SERVER'],
+                                         debug=True)
+
+    def test_profile(self):
+        async def run():
+            async with self.netlas as connection:
+                return await connection.profile()
+        self.assertIn('email', asyncio.run(run()))
+
+    def test_response_download(self):
+        async def run():
+            async with self.netlas as connection:
+                return [doc async for doc in connection.download(
+                    query=NetlasTests.RESPONSE_QUERIES['small'],
+                    datatype="response",
+                    size=1)]
+        self.assertEqual(1, len(asyncio.run(run())))
+
 
 if __name__ == '__main__':
     unittest.main()